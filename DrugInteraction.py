@@ -1,44 +1,86 @@
 import os
-import groq
-from typing import Dict, List, Optional, Tuple
-from dotenv import load_dotenv
+import threading
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from llm import chat_completion, chat_completion_async
+from model_router import primary_model
+from drug_db import DictInteractionStore, SQLiteInteractionStore
+from drug_names import DrugNameIndex, BUILTIN_SYNONYMS, load_synonyms
+from metrics import timed
+from singleflight import SingleFlight
+from ttl_cache import TieredCache
+
+# Model and prompt version are part of the cache key, so changing either one
+# naturally invalidates previously cached analyses
+AI_INTERACTION_MODEL = primary_model('drug_interaction')
+AI_INTERACTION_PROMPT_VERSION = "2"
+
+ai_interaction_cache = TieredCache(
+    'drug_interactions',
+    ttl=float(os.getenv('DRUG_INTERACTION_CACHE_TTL', str(7 * 24 * 3600))),
+    max_memory_entries=int(os.getenv('DRUG_INTERACTION_CACHE_MEMORY_SIZE', '512')),
+    max_disk_entries=int(os.getenv('DRUG_INTERACTION_CACHE_DISK_SIZE', '50000')),
+)
+
+# Concurrent requests for the same uncached pair share one Groq call
+ai_interaction_flight = SingleFlight('drug_interactions')
+
+# Sample database of known drug interactions, used when no DRUG_INTERACTION_DB is configured
+SAMPLE_INTERACTIONS = {
+    ('aspirin', 'warfarin'): {
+        'severity': 'High',
+        'effect': 'Increased risk of bleeding',
+        'recommendation': 'Avoid combination'
+    },
+    ('ibuprofen', 'aspirin'): {
+        'severity': 'Moderate',
+        'effect': 'Decreased effectiveness of aspirin',
+        'recommendation': 'Space doses apart'
+    },
+    ('omeprazole', 'clopidogrel'): {
+        'severity': 'High',
+        'effect': 'Reduced effectiveness of clopidogrel',
+        'recommendation': 'Consider alternative medications'
+    },
+    ('simvastatin', 'erythromycin'): {
+        'severity': 'High',
+        'effect': 'Increased risk of muscle damage',
+        'recommendation': 'Avoid combination'
+    }
+}
+
+# Sort order for interaction severities, most severe first
+SEVERITY_RANK = {'High': 0, 'Moderate': 1, 'Low': 2}
 
 class DrugInteractionChecker:
-    def __init__(self):
-        """Initialize the drug interaction checker with a basic database."""
-        # Sample database of known drug interactions
-        self._interaction_db = {
-            ('aspirin', 'warfarin'): {
-                'severity': 'High',
-                'effect': 'Increased risk of bleeding',
-                'recommendation': 'Avoid combination'
-            },
-            ('ibuprofen', 'aspirin'): {
-                'severity': 'Moderate',
-                'effect': 'Decreased effectiveness of aspirin',
-                'recommendation': 'Space doses apart'
-            },
-            ('omeprazole', 'clopidogrel'): {
-                'severity': 'High',
-                'effect': 'Reduced effectiveness of clopidogrel',
-                'recommendation': 'Consider alternative medications'
-            },
-            ('simvastatin', 'erythromycin'): {
-                'severity': 'High',
-                'effect': 'Increased risk of muscle damage',
-                'recommendation': 'Avoid combination'
-            }
-        }
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the drug interaction checker.
+        Uses the SQLite database at db_path (or DRUG_INTERACTION_DB) when it exists,
+        otherwise the built-in sample interactions.
+        """
+        db_path = db_path or os.getenv('DRUG_INTERACTION_DB')
+        if db_path and os.path.exists(db_path):
+            self._interaction_db = SQLiteInteractionStore(db_path)
+        else:
+            if db_path:
+                print(f"Drug interaction database {db_path} not found; using sample interactions")
+            self._interaction_db = DictInteractionStore(SAMPLE_INTERACTIONS)
+
+        # Brand names and salt forms resolve to the generic names the store uses
+        synonyms = dict(BUILTIN_SYNONYMS)
+        synonyms.update(load_synonyms(os.getenv('DRUG_SYNONYMS_PATH')))
+        self._names = DrugNameIndex(self._interaction_db.all_drugs(), synonyms)
 
     def _normalize_drug_name(self, drug: str) -> str:
-        """Normalize drug name for consistent comparison."""
-        return drug.lower().strip()
+        """Normalize drug name for consistent comparison (brand names and salt forms map to the generic)."""
+        return self._names.normalize(drug)
 
     def _get_interaction_key(self, drug1: str, drug2: str) -> Tuple[str, str]:
         """Create a sorted tuple of drug names for consistent dictionary lookup."""
         drugs = sorted([self._normalize_drug_name(drug1), self._normalize_drug_name(drug2)])
         return (drugs[0], drugs[1])
 
+    @timed('db_lookup')
     def check_interaction(self, drug1: str, drug2: str) -> Optional[Dict]:
         """
         Check for known interactions between two drugs.
@@ -50,30 +92,62 @@ class DrugInteractionChecker:
         interaction_key = self._get_interaction_key(drug1, drug2)
         return self._interaction_db.get(interaction_key)
 
+    @timed('db_lookup')
+    def check_interactions_among(self, drugs: List[str]) -> List[Dict]:
+        """
+        Check every pair in a medication list in one pass.
+        Returns the known interactions sorted by severity (highest first), each with
+        'drug1' and 'drug2' set to the names as given.
+        """
+        names: Dict[str, str] = {}
+        for drug in drugs:
+            if drug and drug.strip():
+                names.setdefault(self._normalize_drug_name(drug), drug.strip())
+
+        interactions = [
+            {'drug1': names[drug_a], 'drug2': names[drug_b], **details}
+            for drug_a, drug_b, details in self._interaction_db.interactions_among(names)
+        ]
+        interactions.sort(key=lambda i: (SEVERITY_RANK.get(i['severity'], len(SEVERITY_RANK)),
+                                         i['drug1'].lower(), i['drug2'].lower()))
+        return interactions
+
     def get_all_known_drugs(self) -> List[str]:
         """Return a list of all drugs in the database."""
-        drugs = set()
-        for drug_pair in self._interaction_db.keys():
-            drugs.update(drug_pair)
-        return sorted(list(drugs))
-
-def setup_groq_client() -> Optional[groq.Client]:
-    """Set up and return Groq client with API key."""
-    load_dotenv()
-    api_key = os.getenv('GROQ_API_KEY')
-    if not api_key:
-        print("\nError: GROQ_API_KEY not found in environment variables")
-        return None
-    return groq.Client(api_key=api_key)
+        return self._interaction_db.all_drugs()
 
-def get_ai_drug_interaction(drug1: str, drug2: str) -> Optional[str]:
-    """Query Groq API for additional drug interaction information with structured output."""
-    client = setup_groq_client()
-    if not client:
-        return None
+    def spelling_suggestions(self, drugs: List[str]) -> Dict[str, str]:
+        """Map each unknown drug name in drugs to the known name it may be a misspelling of."""
+        suggestions = {}
+        for drug in drugs:
+            if drug and drug.strip():
+                match = self._names.did_you_mean(drug)
+                if match:
+                    suggestions[drug.strip()] = match
+        return suggestions
 
-    try:
-        system_prompt = """You are a pharmaceutical expert providing structured information about drug interactions. 
+    def suggest_drug_names(self, prefix: str, limit: int = 8) -> List[Dict[str, str]]:
+        """Return autocomplete suggestions ({'name', 'generic'}) for a partly typed drug name."""
+        return self._names.suggest(prefix, limit)
+
+_default_checker: Optional[DrugInteractionChecker] = None
+_default_checker_lock = threading.Lock()
+
+def get_interaction_checker() -> DrugInteractionChecker:
+    """Return the process-wide DrugInteractionChecker, building it on first use."""
+    global _default_checker
+    if _default_checker is None:
+        with _default_checker_lock:
+            if _default_checker is None:
+                _default_checker = DrugInteractionChecker()
+    return _default_checker
+
+def _ai_interaction_cache_key(drug1: str, drug2: str) -> str:
+    """Cache key for an AI analysis: order-independent drug pair plus model and prompt version."""
+    pair = get_interaction_checker()._get_interaction_key(drug1, drug2)
+    return f"{AI_INTERACTION_MODEL}:v{AI_INTERACTION_PROMPT_VERSION}:{pair[0]}|{pair[1]}"
+
+AI_INTERACTION_SYSTEM_PROMPT = """You are a pharmaceutical expert providing structured information about drug interactions. 
         Format your response in clear, well-organized sections with markdown formatting. For each interaction, include:
         
         ## Severity Level
@@ -102,27 +176,119 @@ def get_ai_drug_interaction(drug1: str, drug2: str) -> Optional[str]:
         
         Always include disclaimers about consulting healthcare providers.
         """
-        
-        user_prompt = f"""Please provide a detailed analysis of potential interactions between {drug1} and {drug2}.
+
+def _build_interaction_messages(drug1: str, drug2: str) -> List[Dict[str, str]]:
+    """Build the chat messages for an AI drug interaction analysis."""
+    user_prompt = f"""Please provide a detailed analysis of potential interactions between {drug1} and {drug2}.
         Include specific details about severity, mechanism, effects, and clinical recommendations.
         Format your response in clear, well-organized sections with markdown formatting."""
+    return [
+        {"role": "system", "content": AI_INTERACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def _store_ai_interaction(cache_key: str, result: Optional[str], answered_by: Optional[str]) -> None:
+    """
+    Cache an analysis under the primary model's key, unless another model answered it:
+    fallback answers are served once but not reused for days as the primary model's.
+    """
+    if result and answered_by == AI_INTERACTION_MODEL:
+        ai_interaction_cache.set(cache_key, result)
+
+def get_ai_drug_interaction(drug1: str, drug2: str) -> Optional[str]:
+    """Query Groq API for additional drug interaction information with structured output."""
+    cache_key = _ai_interaction_cache_key(drug1, drug2)
+    cached = ai_interaction_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return ai_interaction_flight.do(cache_key, lambda: _query_ai_drug_interaction(drug1, drug2, cache_key))
+
+def _query_ai_drug_interaction(drug1: str, drug2: str, cache_key: str) -> Optional[str]:
+    try:
+        response = chat_completion('drug_interaction', _build_interaction_messages(drug1, drug2))
         
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            model="llama3-70b-8192",
-            temperature=0.3,  # Lower temperature for more focused responses
-            max_tokens=1000,  # Increased for more detailed responses
-        )
-        
-        return chat_completion.choices[0].message.content
+        result = response.choices[0].message.content
+        _store_ai_interaction(cache_key, result, getattr(response, 'model', None))
+        return result
+
+    except Exception as e:
+        print(f"Error during AI analysis: {str(e)}")
+        return None
+
+def stream_ai_drug_interaction(drug1: str, drug2: str) -> Iterator[str]:
+    """
+    Stream an AI drug interaction analysis, yielding text chunks as they arrive.
+    Cached analyses are yielded in one piece; a completed stream is added to the cache.
+    Raises RuntimeError if the AI service is unavailable.
+    """
+    cache_key = _ai_interaction_cache_key(drug1, drug2)
+    cached = ai_interaction_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Identical requests already streaming replay that stream instead of calling Groq again
+    yield from ai_interaction_flight.stream(cache_key, lambda: _stream_ai_drug_interaction(drug1, drug2, cache_key))
+
+def _stream_ai_drug_interaction(drug1: str, drug2: str, cache_key: str) -> Iterator[str]:
+    stream = chat_completion('drug_interaction', _build_interaction_messages(drug1, drug2), stream=True)
+    parts = []
+    answered_by = None
+    for chunk in stream:
+        answered_by = answered_by or getattr(chunk, 'model', None)
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+
+    _store_ai_interaction(cache_key, ''.join(parts), answered_by)
+
+async def get_ai_drug_interaction_async(drug1: str, drug2: str) -> Optional[str]:
+    """Async version of get_ai_drug_interaction() sharing the same cache."""
+    cache_key = _ai_interaction_cache_key(drug1, drug2)
+    cached = ai_interaction_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return await ai_interaction_flight.do_async(
+        cache_key, lambda: _query_ai_drug_interaction_async(drug1, drug2, cache_key))
+
+async def _query_ai_drug_interaction_async(drug1: str, drug2: str, cache_key: str) -> Optional[str]:
+    try:
+        response = await chat_completion_async('drug_interaction', _build_interaction_messages(drug1, drug2))
+
+        result = response.choices[0].message.content
+        _store_ai_interaction(cache_key, result, getattr(response, 'model', None))
+        return result
 
     except Exception as e:
         print(f"Error during AI analysis: {str(e)}")
         return None
 
+async def stream_ai_drug_interaction_async(drug1: str, drug2: str) -> AsyncIterator[str]:
+    """Async version of stream_ai_drug_interaction()."""
+    cache_key = _ai_interaction_cache_key(drug1, drug2)
+    cached = ai_interaction_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    async for piece in ai_interaction_flight.stream_async(
+            cache_key, lambda: _stream_ai_drug_interaction_async(drug1, drug2, cache_key)):
+        yield piece
+
+async def _stream_ai_drug_interaction_async(drug1: str, drug2: str, cache_key: str) -> AsyncIterator[str]:
+    stream = await chat_completion_async('drug_interaction', _build_interaction_messages(drug1, drug2), stream=True)
+    parts = []
+    answered_by = None
+    async for chunk in stream:
+        answered_by = answered_by or getattr(chunk, 'model', None)
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+
+    _store_ai_interaction(cache_key, ''.join(parts), answered_by)
+
 def main():
     checker = DrugInteractionChecker()
     
@@ -1,22 +1,33 @@
-import os
-import groq
+import logging
 import time
-from typing import Optional, List, Dict
-from dotenv import load_dotenv
-from DrugInteraction import DrugInteractionChecker
+from typing import Optional, List, Dict, Tuple, Union
+from conversation import Conversation
+from DrugInteraction import get_interaction_checker
+from groq_client import get_groq_client
+from llm import chat_completion, chat_completion_async
+from model_router import get_site_config, primary_model
+from singleflight import SingleFlight, make_key
+from structured_logging import event, get_logger
 
-def setup_groq_client() -> Optional[groq.Client]:
-    """Set up and return Groq client with API key."""
-    load_dotenv()
-    api_key = os.getenv('GROQ_API_KEY')
-    if not api_key:
-        print("\nError: GROQ_API_KEY not found in environment variables")
-        return None
-    return groq.Client(api_key=api_key)
+log = get_logger(__name__)
+
+# Concurrent requests for the same condition, allergies and medications share one Groq call
+medication_flight = SingleFlight('personalized_medication')
+
+def _normalize_list(items: List[str]) -> List[str]:
+    return sorted({' '.join(item.lower().split()) for item in items if item and item.strip()})
+
+def _as_conversation(conversation: Union[Conversation, List[Dict[str, str]]]) -> Conversation:
+    if isinstance(conversation, Conversation):
+        return conversation
+    return Conversation.from_history(conversation)
 
-def get_followup_question(conversation_history: List[Dict[str, str]]) -> Optional[str]:
-    """Queries Groq API to generate a follow-up question based on conversation history."""
-    client = setup_groq_client()
+def get_followup_question(conversation: Union[Conversation, List[Dict[str, str]]]) -> Optional[str]:
+    """
+    Queries Groq API to generate a follow-up question based on the conversation so far.
+    Older turns are sent as a summary so the prompt stays within the conversation's token budget.
+    """
+    client = get_groq_client()
     if not client:
         return None
     
@@ -32,25 +43,20 @@ def get_followup_question(conversation_history: List[Dict[str, str]]) -> Optiona
     """
     
     try:
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history)
+        messages = _as_conversation(conversation).messages(system_prompt)
         
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="llama3-70b-8192",  # Using a more reliable model
-            temperature=0.4,
-            max_tokens=150,
-        )
+        # A single short question: routed to the fast model tier
+        response = chat_completion('followup_question', messages)
         
-        return chat_completion.choices[0].message.content
+        return response.choices[0].message.content
     
     except Exception as e:
-        print(f"Error during API call: {str(e)}")
+        event(log, "Follow-up question failed", logging.ERROR, error=str(e))
         return None
 
-def get_health_assessment(conversation_history: List[Dict[str, str]]) -> Optional[str]:
+def get_health_assessment(conversation: Union[Conversation, List[Dict[str, str]]]) -> Optional[str]:
     """Queries Groq API to analyze symptoms and provide a comprehensive health assessment."""
-    client = setup_groq_client()
+    client = get_groq_client()
     if not client:
         return None
     
@@ -73,52 +79,28 @@ def get_health_assessment(conversation_history: List[Dict[str, str]]) -> Optiona
     """
     
     try:
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history)
+        messages = _as_conversation(conversation).messages(system_prompt)
         
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="llama3-70b-8192",  # Using a more reliable model
-            temperature=0.3,
-            max_tokens=800,
-        )
+        response = chat_completion('health_assessment', messages)
         
-        return chat_completion.choices[0].message.content
+        return response.choices[0].message.content
     
     except Exception as e:
-        print(f"Error during API call: {str(e)}")
+        event(log, "Health assessment failed", logging.ERROR, error=str(e))
         return None
 
-def get_personalized_medication(condition: str, patient_allergies: List[str] = None, current_medications: List[str] = None) -> Optional[Dict[str, any]]:
-    """
-    Get personalized medication recommendations based on condition and patient factors.
-    Returns a dictionary with 'recommendations' and 'recommended_medications' keys.
-    """
-    print("\n=== Starting get_personalized_medication ===")
-    print(f"Condition: {condition}")
-    print(f"Allergies: {patient_allergies}")
-    print(f"Current Medications: {current_medications}")
-    
-    try:
-        client = setup_groq_client()
-        if not client:
-            raise Exception("Failed to initialize Groq client")
-
-        if not condition or not condition.strip():
-            raise ValueError("No medical condition provided")
+MEDICATION_SYSTEM_PROMPT = "You are a medical AI assistant specializing in personalized medication recommendations. Provide clear, structured, and professional advice."
 
-        # Convert None to empty lists for safety
-        patient_allergies = patient_allergies or []
-        current_medications = current_medications or []
+def _medication_request(condition: str, patient_allergies: List[str], current_medications: List[str]) -> Tuple[List[Dict[str, str]], str]:
+    """Build the chat messages and the single-flight key for a medication recommendation."""
+    if not condition or not condition.strip():
+        raise ValueError("No medical condition provided")
 
-        allergies_text = f"Patient has allergies to: {', '.join(patient_allergies)}" if patient_allergies else "No known allergies"
-        medications_text = f"Patient is currently taking: {', '.join(current_medications)}" if current_medications else "No current medications"
-        
-        print(f"Allergies text: {allergies_text}")
-        print(f"Medications text: {medications_text}")
+    allergies_text = f"Patient has allergies to: {', '.join(patient_allergies)}" if patient_allergies else "No known allergies"
+    medications_text = f"Patient is currently taking: {', '.join(current_medications)}" if current_medications else "No current medications"
 
-        # More structured prompt for better consistency
-        user_prompt = f"""
+    # More structured prompt for better consistency
+    user_prompt = f"""
         You are a medical professional providing medication recommendations.
         
         PATIENT INFORMATION:
@@ -140,92 +122,113 @@ def get_personalized_medication(condition: str, patient_allergies: List[str] = N
         
         IMPORTANT: Always include disclaimers about consulting healthcare providers.
         """
-        
-        print("\n=== Sending request to Groq API ===")
-        print(f"Model: llama3-70b-8192")
-        print(f"Prompt length: {len(user_prompt)} characters")
-        
-        # Make the API call with error handling
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a medical AI assistant specializing in personalized medication recommendations. Provide clear, structured, and professional advice."
-                },
-                {
-                    "role": "user",
-                    "content": user_prompt
-                }
-            ],
-            model="llama3-70b-8192",
-            temperature=0.3,  # Lower temperature for more focused responses
-            max_tokens=1500,  # Increased token limit for more detailed responses
-        )
-        
-        if not response or not response.choices or not response.choices[0].message.content:
-            raise ValueError("Empty or invalid response from API")
-        
-        # Extract the response content
-        response_text = response.choices[0].message.content
-        
-        print("\n=== Received response from API ===")
-        print(f"Response length: {len(response_text)} characters")
-        print("--- Start of response ---")
-        print(response_text[:500] + ("..." if len(response_text) > 500 else ""))
-        print("--- End of response ---")
-        
-        # Extract medication names for interaction checking
-        recommended_meds = []
-        in_meds_section = False
-        for line in response_text.split('\n'):
-            line = line.strip()
-            if 'RECOMMENDED MEDICATIONS:' in line.upper():
-                in_meds_section = True
-                continue
-            if in_meds_section and line.startswith('-'):
-                # Extract medication name (text between - and :)
-                med_name = line.split(':')[0].replace('-', '').strip()
-                if med_name and len(med_name) < 50:  # Basic validation
-                    recommended_meds.append(med_name)
-            elif line == '':  # Empty line might indicate end of section
-                in_meds_section = False
-        
-        print(f"\nExtracted recommended medications: {recommended_meds}")
-        
-        return {
-            'recommendations': response_text,
-            'recommended_medications': recommended_meds
-        }
-        
+
+    site = 'personalized_medication'
+    config = get_site_config(site)
+    event(log, "Requesting medication recommendations", model=primary_model(site),
+          prompt_chars=len(user_prompt), allergy_count=len(patient_allergies),
+          medication_count=len(current_medications))
+
+    # Identical requests already in flight share one call's response
+    flight_key = make_key(primary_model(site), config['temperature'], config['max_tokens'],
+                          ' '.join(condition.lower().split()),
+                          _normalize_list(patient_allergies), _normalize_list(current_medications))
+    messages = [
+        {"role": "system", "content": MEDICATION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+    return messages, flight_key
+
+def _response_text(response) -> str:
+    if not response or not response.choices or not response.choices[0].message.content:
+        raise ValueError("Empty or invalid response from API")
+    return response.choices[0].message.content
+
+def _parse_recommendations(condition: str, response_text: str) -> Dict[str, any]:
+    """Extract the recommended medication names and build the result dictionary."""
+    recommended_meds = []
+    in_meds_section = False
+    for line in response_text.split('\n'):
+        line = line.strip()
+        if 'RECOMMENDED MEDICATIONS:' in line.upper():
+            in_meds_section = True
+            continue
+        if in_meds_section and line.startswith('-'):
+            # Extract medication name (text between - and :)
+            med_name = line.split(':')[0].replace('-', '').strip()
+            if med_name and len(med_name) < 50:  # Basic validation
+                recommended_meds.append(med_name)
+        elif line == '':  # Empty line might indicate end of section
+            in_meds_section = False
+
+    event(log, "Medication recommendations received", response_chars=len(response_text),
+          recommended_count=len(recommended_meds))
+    # Full payload for debugging prompts; PHI fields are redacted unless LOG_REDACT=0
+    event(log, "Medication recommendations payload", logging.DEBUG, sample=True,
+          condition=condition, response=response_text, recommended_medications=recommended_meds)
+
+    return {
+        'recommendations': response_text,
+        'recommended_medications': recommended_meds
+    }
+
+def get_personalized_medication(condition: str, patient_allergies: List[str] = None, current_medications: List[str] = None) -> Optional[Dict[str, any]]:
+    """
+    Get personalized medication recommendations based on condition and patient factors.
+    Returns a dictionary with 'recommendations' and 'recommended_medications' keys.
+    """
+    try:
+        client = get_groq_client()
+        if not client:
+            raise Exception("Failed to initialize Groq client")
+
+        messages, flight_key = _medication_request(condition, patient_allergies or [], current_medications or [])
+        response_text = medication_flight.do(
+            flight_key, lambda: _response_text(chat_completion('personalized_medication', messages)))
+        return _parse_recommendations(condition, response_text)
+
     except Exception as e:
         error_msg = f"Error in get_personalized_medication: {str(e)}"
-        print(f"\n!!! {error_msg}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Personalized medication failed")
         raise Exception(error_msg) from e
 
+async def get_personalized_medication_async(condition: str, patient_allergies: List[str] = None,
+                                            current_medications: List[str] = None) -> Optional[Dict[str, any]]:
+    """Async version of get_personalized_medication() using the AsyncGroq client."""
+    try:
+        messages, flight_key = _medication_request(condition, patient_allergies or [], current_medications or [])
+
+        async def complete() -> str:
+            return _response_text(await chat_completion_async('personalized_medication', messages))
+
+        response_text = await medication_flight.do_async(flight_key, complete)
+        return _parse_recommendations(condition, response_text)
+
     except Exception as e:
-        print(f"Error during API call: {str(e)}")
-        return None
+        error_msg = f"Error in get_personalized_medication: {str(e)}"
+        log.exception("Personalized medication failed")
+        raise Exception(error_msg) from e
 
 def check_medication_safety(recommended_meds: List[str], current_meds: List[str]) -> Dict[str, List[Dict]]:
     """
     Check safety of recommended medications against current medications.
+    All pairs are checked in one pass over the interaction index.
     """
-    checker = DrugInteractionChecker()
+    checker = get_interaction_checker()
+    normalize = checker._normalize_drug_name
+    recommended = {normalize(med) for med in recommended_meds if med}
+    current = {normalize(med) for med in current_meds if med}
     interactions = {}
-    
-    for new_med in recommended_meds:
-        med_interactions = []
-        for current_med in current_meds:
-            interaction = checker.check_interaction(new_med, current_med)
-            if interaction:
-                med_interactions.append({
+
+    for interaction in checker.check_interactions_among(list(recommended_meds) + list(current_meds)):
+        details = {k: v for k, v in interaction.items() if k not in ('drug1', 'drug2')}
+        for new_med, current_med in ((interaction['drug1'], interaction['drug2']),
+                                     (interaction['drug2'], interaction['drug1'])):
+            if normalize(new_med) in recommended and normalize(current_med) in current:
+                interactions.setdefault(new_med, []).append({
                     'with_drug': current_med,
-                    **interaction
+                    **details
                 })
-        if med_interactions:
-            interactions[new_med] = med_interactions
     
     return interactions
 
@@ -245,8 +248,8 @@ def main():
     print("I'll ask follow-up questions to better understand your situation.")
     print("Type 'exit' at any time to end the conversation.\n")
     
-    # Initialize conversation history
-    conversation_history = []
+    # Recent turns are sent verbatim, earlier ones as a running summary
+    conversation = Conversation()
     
     try:
         # Get initial symptoms
@@ -256,7 +259,7 @@ def main():
             return
         
         # Add initial user input to conversation history
-        conversation_history.append({"role": "user", "content": initial_input})
+        conversation.add("user", initial_input)
         
         # Conversation loop
         assessment_ready = False
@@ -266,7 +269,7 @@ def main():
         while question_count < max_questions and not assessment_ready:
             # Get follow-up question
             print("\nAnalyzing your information...")
-            followup_question = get_followup_question(conversation_history)
+            followup_question = get_followup_question(conversation)
             
             if not followup_question:
                 print("I'm having trouble processing your information. Let's proceed with what we have.")
@@ -280,19 +283,19 @@ def main():
                 if followup_question.strip():
                     # Display the final question if there is one
                     display_typing_effect(f"Assistant: {followup_question}")
-                    conversation_history.append({"role": "assistant", "content": followup_question})
+                    conversation.add("assistant", followup_question)
                     
                     user_response = input("You: ")
                     if user_response.lower() == 'exit':
                         print("Goodbye! Take care of your health.")
                         return
                     
-                    conversation_history.append({"role": "user", "content": user_response})
+                    conversation.add("user", user_response)
                 break
             
             # Display follow-up question with typing effect
             display_typing_effect(f"Assistant: {followup_question}")
-            conversation_history.append({"role": "assistant", "content": followup_question})
+            conversation.add("assistant", followup_question)
             
             # Get user response
             user_response = input("You: ")
@@ -300,14 +303,14 @@ def main():
                 print("Goodbye! Take care of your health.")
                 return
             
-            conversation_history.append({"role": "user", "content": user_response})
+            conversation.add("user", user_response)
             question_count += 1
         
         # Generate health assessment
         print("\nThank you for providing this information.")
         print("I'm now analyzing your symptoms to generate a health assessment...")
         
-        result = get_health_assessment(conversation_history)
+        result = get_health_assessment(conversation)
         
         if result:
             print("\n" + "-"*80)
@@ -322,6 +325,10 @@ def main():
             print("\nI apologize, but I couldn't generate a health assessment at this time.")
             print("This could be due to a technical issue or insufficient information.")
             print("Please consult a healthcare professional for medical advice.")
+        
+        event(log, "Conversation finished", **conversation.stats())
+        print(f"\n(Context: sent ~{conversation.sent_tokens} prompt tokens instead of "
+              f"~{conversation.full_tokens}, saving ~{conversation.tokens_saved})")
     
     except KeyboardInterrupt:
         print("\n\nConversation interrupted. Take care of your health!")
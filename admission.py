@@ -0,0 +1,164 @@
+"""
+Admission control for the slow (AI and upstream-bound) routes.
+
+Each route gets a concurrency limit and a small wait queue per worker. A
+request that finds both full, or waits longer than the maximum queue time,
+is refused at once with a 503 and a Retry-After estimate instead of holding
+a gunicorn thread until the worker timeout.
+
+All admitted and queued requests together may use at most the worker's
+threads minus ADMISSION_RESERVED_THREADS, so pages, static files and other
+cheap routes always have a thread free while the AI routes are saturated.
+"""
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Must match the gunicorn thread count (gunicorn_config.py reads the same variable)
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', '4'))
+# Threads per worker kept free for routes without admission control
+RESERVED_THREADS = int(os.getenv('ADMISSION_RESERVED_THREADS', '1'))
+# Longest a request waits for a slot before it is refused
+MAX_QUEUE_TIME = float(os.getenv('ADMISSION_MAX_QUEUE_TIME', '5'))
+
+# Per-worker (concurrency, queue size) for each endpoint; override with
+# ADMISSION_<ENDPOINT>_CONCURRENCY / ADMISSION_<ENDPOINT>_QUEUE
+ROUTE_DEFAULTS: Dict[str, Tuple[int, int]] = {
+    'symptom_checker': (2, 1),
+    'drug_interaction': (2, 1),
+    'personalized_medication': (1, 1),
+    'find_hospitals': (2, 1),
+}
+
+# Weight of the newest sample in each route's moving average service time
+_EWMA_WEIGHT = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; retry_after is a whole number of seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def route_limits(defaults: Dict[str, Tuple[int, int]] = ROUTE_DEFAULTS) -> Dict[str, Tuple[int, int]]:
+    """Apply ADMISSION_<ENDPOINT>_CONCURRENCY / _QUEUE overrides to the defaults."""
+    limits = {}
+    for endpoint, (concurrency, queue) in defaults.items():
+        env = endpoint.upper()
+        limits[endpoint] = (int(os.getenv(f'ADMISSION_{env}_CONCURRENCY', str(concurrency))),
+                            int(os.getenv(f'ADMISSION_{env}_QUEUE', str(queue))))
+    return limits
+
+
+class _Route:
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.running = 0
+        self.waiting = 0
+        self.service_time: Optional[float] = None
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'rejected_timeout': 0}
+
+
+class Ticket:
+    """An admitted request; release() once its response has been sent (safe to call twice)."""
+
+    def __init__(self, controller: 'AdmissionController', endpoint: str):
+        self._controller = controller
+        self._endpoint = endpoint
+        self._start = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self._endpoint, time.monotonic() - self._start)
+
+
+class AdmissionController:
+    def __init__(self, limits: Dict[str, Tuple[int, int]], lane_capacity: Optional[int] = None,
+                 max_queue_time: float = MAX_QUEUE_TIME):
+        self._routes = {endpoint: _Route(*limit) for endpoint, limit in limits.items()}
+        self.lane_capacity = lane_capacity
+        self.max_queue_time = max_queue_time
+        self._lane_used = 0
+        self._cond = threading.Condition()
+
+    def controls(self, endpoint: Optional[str]) -> bool:
+        return endpoint in self._routes
+
+    def _retry_after(self, route: _Route) -> int:
+        """Seconds until a slot is likely to free up: the route's average service time."""
+        return max(1, min(60, math.ceil(route.service_time or self.max_queue_time)))
+
+    def _reject(self, endpoint: str, route: _Route, reason: str) -> Overloaded:
+        route.stats[f'rejected_{reason}'] += 1
+        return Overloaded(f"Too many {endpoint} requests in progress", self._retry_after(route))
+
+    def enter(self, endpoint: str) -> Ticket:
+        """Admit a request to endpoint, waiting up to max_queue_time; raises Overloaded if it cannot be."""
+        with self._cond:
+            route = self._routes[endpoint]
+            if self.lane_capacity is not None and self._lane_used >= self.lane_capacity:
+                raise self._reject(endpoint, route, 'full')
+            if route.running < route.concurrency:
+                route.running += 1
+                route.stats['admitted'] += 1
+                self._lane_used += 1
+                return Ticket(self, endpoint)
+            if route.waiting >= route.queue_size:
+                raise self._reject(endpoint, route, 'full')
+
+            route.waiting += 1
+            route.stats['queued'] += 1
+            self._lane_used += 1
+            deadline = time.monotonic() + self.max_queue_time
+            admitted = False
+            try:
+                while route.running >= route.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject(endpoint, route, 'timeout')
+                    self._cond.wait(remaining)
+                route.running += 1
+                route.stats['admitted'] += 1
+                admitted = True
+                return Ticket(self, endpoint)
+            finally:
+                route.waiting -= 1
+                if not admitted:
+                    self._lane_used -= 1
+
+    def _release(self, endpoint: str, elapsed: float) -> None:
+        with self._cond:
+            route = self._routes[endpoint]
+            route.running -= 1
+            self._lane_used -= 1
+            route.service_time = (elapsed if route.service_time is None
+                                  else (1 - _EWMA_WEIGHT) * route.service_time + _EWMA_WEIGHT * elapsed)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'lane_capacity': self.lane_capacity,
+                'lane_used': self._lane_used,
+                'max_queue_time_s': self.max_queue_time,
+                'routes': {endpoint: {
+                    'concurrency': route.concurrency,
+                    'queue_size': route.queue_size,
+                    'running': route.running,
+                    'waiting': route.waiting,
+                    'service_time_s': round(route.service_time, 3) if route.service_time is not None else None,
+                    **route.stats,
+                } for endpoint, route in self._routes.items()},
+            }
+
+
+def heavy_lane_capacity() -> int:
+    """Threads per worker that admission-controlled routes may occupy in total."""
+    return max(1, WORKER_THREADS - RESERVED_THREADS)
@@ -1,23 +1,128 @@
+import logging
 import os
-from flask import Flask, render_template, request, jsonify
+import time
+from flask import Flask, Response, render_template, request, jsonify, g
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
-from symptom_checker import get_disease_from_symptoms
-from DrugInteraction import DrugInteractionChecker, get_ai_drug_interaction
-from Personalised_Medication import get_personalized_medication, check_medication_safety
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+from symptom_checker import get_disease_from_symptoms, stream_disease_from_symptoms, symptom_flight, symptom_cache
+from groq_health import get_health_status, start_health_monitor
+from llm import stats as llm_stats
+from DrugInteraction import get_interaction_checker, get_ai_drug_interaction, stream_ai_drug_interaction, ai_interaction_cache, ai_interaction_flight
+from concurrent_sources import gather_sources
+from Personalised_Medication import get_personalized_medication, check_medication_safety, medication_flight
 import overpy
-import html
+from geocoding import geocode_address, geocode_cache
+from hospital_locator import find_facilities, facility_tile_cache, DEFAULT_LIMIT as DEFAULT_FACILITY_LIMIT, MAX_LIMIT as MAX_FACILITY_LIMIT
+from sse import wants_event_stream, format_event, event_stream_response
+from admission import AdmissionController, Overloaded, heavy_lane_capacity, route_limits
+from deadlines import DeadlineExceeded, clear_deadline, start_deadline
+from metrics import observe_request, render as render_metrics, timed_json_provider
+from route_settings import (DB_LOOKUP_DEADLINE, AI_ANALYSIS_DEADLINE, MAX_BATCH_MEDICATIONS,
+                            DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS)
+from structured_logging import event, get_logger, stats as logging_stats
+import httpx
 
 app = Flask(__name__)
+log = get_logger(__name__)
+# jsonify() time is recorded as the json_serialization stage
+app.json = timed_json_provider(type(app.json))(app)
+start_health_monitor()
+
+@app.before_request
+def start_request_timer():
+    # Registered first so admission queueing counts towards the route latency
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def set_request_deadline():
+    # Every upstream call sizes its timeout from this, so requests end before gunicorn's timeout
+    start_deadline()
+
+# Slow POST routes get per-route concurrency limits; other routes keep a reserved thread
+admission = AdmissionController(route_limits(), lane_capacity=heavy_lane_capacity())
+
+@app.before_request
+def admit_request():
+    if request.method != 'POST' or not admission.controls(request.endpoint):
+        return None
+    try:
+        g.admission_ticket = admission.enter(request.endpoint)
+    except Overloaded as e:
+        print(f"Shedding {request.endpoint} request: {str(e)}")
+        return jsonify({
+            'error': f'The service is busy. Please try again in {e.retry_after} seconds.'
+        }), 503, {'Retry-After': str(e.retry_after)}
+    return None
+
+@app.after_request
+def hold_admission_until_sent(response):
+    # Streams keep their slot until the last event has been sent
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        response.call_on_close(ticket.release)
+    return response
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, status = request.method, response.status_code
+        # Measured when the last byte has been sent, so streams count in full
+        response.call_on_close(lambda: observe_request(route, method, status, start))
+    return response
+
+@app.teardown_request
+def release_admission(exc):
+    ticket = g.pop('admission_ticket', None)
+    if ticket is not None:
+        ticket.release()
+    clear_deadline()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/health')
+def health():
+    # Served from the background monitor's cache; never calls the Groq API
+    status = get_health_status()
+    return jsonify({
+        'groq': status,
+        'caches': {
+            'drug_interactions': ai_interaction_cache.stats(),
+            'geocode': geocode_cache.stats(),
+            'facility_tiles': facility_tile_cache.stats(),
+            'symptoms': symptom_cache.stats()
+        },
+        'singleflight': {
+            'drug_interactions': ai_interaction_flight.stats(),
+            'symptoms': symptom_flight.stats(),
+            'personalized_medication': medication_flight.stats()
+        },
+        'llm': llm_stats(),
+        'admission': admission.stats(),
+        'logging': logging_stats()
+    }), (503 if status['status'] == 'down' else 200)
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format, aggregated over all gunicorn workers
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+def _stream_text(chunks, error_message):
+    """Forward text chunks as 'token' events, ending with 'done' or 'error'."""
+    try:
+        for chunk in chunks:
+            yield format_event({'text': chunk}, event='token')
+        yield format_event({}, event='done')
+    except Exception as e:
+        print(f"Streaming error: {str(e)}")
+        yield format_event({'error': error_message}, event='error')
+
 @app.route('/symptom-checker', methods=['GET', 'POST'])
 def symptom_checker():
     if request.method == 'POST':
@@ -28,6 +133,12 @@ def symptom_checker():
             symptoms = request.json.get('symptoms')
             if not symptoms:
                 return jsonify({'error': 'No symptoms provided'}), 400
+
+            if wants_event_stream():
+                return event_stream_response(_stream_text(
+                    stream_disease_from_symptoms(symptoms),
+                    'Failed to analyze symptoms. Please check your API key and try again.'
+                ))
                 
             result = get_disease_from_symptoms(symptoms)
             if not result:
@@ -41,6 +152,24 @@ def symptom_checker():
             
     return render_template('symptom_checker.html')
 
+def _stream_drug_interaction(drug1, drug2):
+    """Send the database result first, then stream the AI analysis."""
+    checker = get_interaction_checker()
+    try:
+        db_result = checker.check_interaction(drug1, drug2)
+    except Exception as e:
+        print(f"Database check error: {str(e)}")
+        db_result = None
+    # Unknown names are looked up as typed; close known names are only offered as suggestions
+    did_you_mean = checker.spelling_suggestions([drug1, drug2])
+    if did_you_mean:
+        yield format_event(did_you_mean, event='did_you_mean')
+    yield format_event(db_result, event='database')
+    yield from _stream_text(
+        stream_ai_drug_interaction(drug1, drug2),
+        'AI analysis is unavailable at this time. Please try again later.'
+    )
+
 @app.route('/drug-interaction', methods=['GET', 'POST'])
 def drug_interaction():
     if request.method == 'POST':
@@ -57,31 +186,28 @@ def drug_interaction():
                 return jsonify({
                     'error': 'Both drug names are required'
                 }), 400
+
+            if wants_event_stream():
+                return event_stream_response(_stream_drug_interaction(drug1, drug2))
             
+            checker = get_interaction_checker()
+
+            # Query the local database and the AI analysis at the same time
+            sources = gather_sources({
+                'database_result': (lambda: checker.check_interaction(drug1, drug2), DB_LOOKUP_DEADLINE),
+                'ai_result': (lambda: get_ai_drug_interaction(drug1, drug2), AI_ANALYSIS_DEADLINE),
+            })
+            for name, error in sources['errors'].items():
+                # Continue even if one of the sources fails
+                print(f"Drug interaction source '{name}' error: {error}")
+
             result = {
-                'database_result': None,
-                'ai_result': None
+                'database_result': sources['results'].get('database_result'),
+                'ai_result': sources['results'].get('ai_result'),
+                'partial': sources['timed_out'],
+                'did_you_mean': checker.spelling_suggestions([drug1, drug2])
             }
             
-            # Get database results if available
-            try:
-                checker = DrugInteractionChecker()
-                db_result = checker.check_interaction(drug1, drug2)
-                if db_result:
-                    result['database_result'] = db_result
-            except Exception as e:
-                print(f"Database check error: {str(e)}")
-                # Continue even if database check fails
-            
-            # Get AI analysis
-            try:
-                ai_result = get_ai_drug_interaction(drug1, drug2)
-                if ai_result:
-                    result['ai_result'] = ai_result
-            except Exception as e:
-                print(f"AI analysis error: {str(e)}")
-                # Continue even if AI analysis fails
-            
             # If both checks failed, return an error
             if not result['database_result'] and not result['ai_result']:
                 return jsonify({
@@ -99,6 +225,52 @@ def drug_interaction():
     # Handle GET request - render the form
     return render_template('drug_interaction.html')
 
+@app.route('/drug-interaction/batch', methods=['POST'])
+def drug_interaction_batch():
+    """Check every pair in a medication list against the local interaction database."""
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    medications = data.get('medications')
+    if not isinstance(medications, list) or not all(isinstance(m, str) for m in medications):
+        return jsonify({'error': 'medications must be a list of drug names'}), 400
+
+    medications = [m.strip() for m in medications if m.strip()]
+    if len(medications) < 2:
+        return jsonify({'error': 'At least two medications are required'}), 400
+    if len(medications) > MAX_BATCH_MEDICATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_MEDICATIONS} medications can be checked at once'}), 400
+
+    try:
+        interactions = get_interaction_checker().check_interactions_among(medications)
+    except Exception as e:
+        print(f"Error in batch drug interaction check: {str(e)}")
+        return jsonify({'error': 'Unable to check interactions at this time. Please try again later.'}), 500
+
+    return jsonify({
+        'medications': medications,
+        'interactions': interactions,
+        'count': len(interactions),
+        'did_you_mean': get_interaction_checker().spelling_suggestions(medications)
+    })
+
+@app.route('/drug-interaction/suggest')
+def drug_interaction_suggest():
+    """Autocomplete drug names (generic and brand) for a partly typed query."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'suggestions': []})
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SUGGESTIONS)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    return jsonify({'suggestions': get_interaction_checker().suggest_drug_names(query, limit)})
+
 @app.route('/personalized-medication', methods=['GET', 'POST'])
 def personalized_medication():
     if request.method == 'GET':
@@ -106,55 +278,40 @@ def personalized_medication():
         
     # Handle POST request
     try:
-        # Log raw request data
-        raw_data = request.get_data()
-        print("\n=== Received raw request data ===")
-        print(f"Raw data: {raw_data}")
-        
         # Parse JSON data
         try:
             data = request.get_json()
             if not data:
                 raise ValueError("No JSON data in request")
         except Exception as e:
-            print(f"Error parsing JSON: {str(e)}")
+            event(log, "Invalid personalized medication request", logging.WARNING, error=str(e))
             return jsonify({
                 'error': 'Invalid request format',
                 'details': str(e)
             }), 400
         
-        print("\n=== Parsed request data ===")
-        print(f"Data type: {type(data)}")
-        print(f"Data content: {data}")
-        
         # Extract and validate required fields
         condition = data.get('condition', '').strip()
         allergies = data.get('allergies', [])
         current_medications = data.get('current_medications', [])
-        
-        print("\n=== Extracted data ===")
-        print(f"Condition: {condition}")
-        print(f"Allergies ({len(allergies)}): {allergies}")
-        print(f"Current Medications ({len(current_medications)}): {current_medications}")
+        # Request body for debugging the form; PHI fields are redacted unless LOG_REDACT=0
+        event(log, "Personalized medication request", logging.DEBUG, sample=True, body=data)
         
         if not condition:
             error_msg = 'Medical condition is required'
-            print(f"Validation error: {error_msg}")
+            event(log, "Personalized medication request rejected", logging.INFO, error=error_msg)
             return jsonify({
                 'error': error_msg,
                 'field': 'condition'
             }), 400
             
         # Get personalized medication recommendations
-        print("\n=== Calling get_personalized_medication ===")
         try:
             recommendations = get_personalized_medication(
                 condition=condition,
                 patient_allergies=allergies,
                 current_medications=current_medications
             )
-            print(f"Recommendations type: {type(recommendations)}")
-            print(f"Recommendations content (first 200 chars): {str(recommendations)[:200]}...")
             
             if not recommendations:
                 raise ValueError("No recommendations were generated")
@@ -165,7 +322,8 @@ def personalized_medication():
                 
             # Check if the response looks like an error
             if 'error' in recommendations.lower() or 'sorry' in recommendations.lower():
-                raise ValueError(f"API returned an error-like response: {recommendations[:200]}...")
+                # Only the size: the text is medical advice for the patient's condition and would reach the logs
+                raise ValueError(f"API returned an error-like response ({len(recommendations)} chars)")
                 
             return jsonify({
                 'recommendations': recommendations,
@@ -173,7 +331,7 @@ def personalized_medication():
             })
             
         except Exception as e:
-            print(f"Error in get_personalized_medication: {str(e)}")
+            event(log, "Personalized medication request failed", logging.ERROR, error=str(e))
             return jsonify({
                 'error': 'Failed to generate recommendations',
                 'details': str(e),
@@ -205,7 +363,7 @@ def personalized_medication():
         })
         
     except Exception as e:
-        print(f"Error in personalized medication: {str(e)}")
+        event(log, "Personalized medication request failed", logging.ERROR, error=str(e))
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
 @app.route('/hospital-locator')
@@ -225,7 +383,8 @@ def find_hospitals():
         if not data:
             return jsonify({'error': 'No data provided'})
         
-        print(f"Received request data: {data}")
+        # Request body for debugging the form; the address is redacted unless LOG_REDACT=0
+        event(log, "Facility search request", logging.DEBUG, sample=True, body=data)
         
         address = data.get('address')
         if not address:
@@ -235,162 +394,66 @@ def find_hospitals():
         if radius < 1000 or radius > 10000:
             radius = 5000
 
-        print(f"Searching for: {address} with radius {radius}m")
+        limit = int(data.get('limit', DEFAULT_FACILITY_LIMIT))
+        limit = max(1, min(limit, MAX_FACILITY_LIMIT))
+
+        event(log, "Searching for facilities", address=address, radius=radius, limit=limit)
 
         try:
-            # Initialize geocoder with a longer timeout and user agent
-            geolocator = Nominatim(
-                user_agent="chiron_healthcare_assistant",
-                timeout=10
-            )
-            
-            # Get user's location with more specific parameters
-            location = geolocator.geocode(
-                address,
-                exactly_one=True,
-                language="en",
-                country_codes="in"  # Limit to India
-            )
+            # Cached, rate-limited geocoding shared by all workers
+            location = geocode_address(address)
             
             if not location:
                 return jsonify({'error': 'Could not find the specified location. Please try a more specific address in India.'})
             
-            print(f"Found location: {location.address} at {location.latitude}, {location.longitude}")
-            
-            user_location = (location.latitude, location.longitude)
+            user_location = (location['lat'], location['lon'])
         except Exception as e:
-            print(f"Geocoding error: {str(e)}")
+            # Geocoder messages can quote the address, so only the error type is logged
+            event(log, "Geocoding failed", logging.WARNING, error_type=type(e).__name__)
             return jsonify({'error': 'Failed to find the location. Please try a more specific address.'})
         
         try:
-            # Get medical facilities using a simpler query
-            api = overpy.Overpass()
-            
-            # Split the query into two parts to avoid timeout
-            # First query: Hospitals
-            hospital_query = f"""
-            [out:json][timeout:25];
-            (
-              node["amenity"="hospital"](around:{radius},{user_location[0]},{user_location[1]});
-              way["amenity"="hospital"](around:{radius},{user_location[0]},{user_location[1]});
-            );
-            out body;
-            >;
-            out skel qt;
-            """
-            
-            # Second query: Pharmacies
-            pharmacy_query = f"""
-            [out:json][timeout:25];
-            (
-              node["amenity"="pharmacy"](around:{radius},{user_location[0]},{user_location[1]});
-              way["amenity"="pharmacy"](around:{radius},{user_location[0]},{user_location[1]});
-            );
-            out body;
-            >;
-            out skel qt;
-            """
-            
-            print("Querying hospitals...")
-            hospital_result = api.query(hospital_query)
-            print(f"Found {len(hospital_result.nodes)} hospital nodes and {len(hospital_result.ways)} hospital ways")
-            
-            print("Querying pharmacies...")
-            pharmacy_result = api.query(pharmacy_query)
-            print(f"Found {len(pharmacy_result.nodes)} pharmacy nodes and {len(pharmacy_result.ways)} pharmacy ways")
-            
-            facilities = []
-            hospitals_count = 0
-            pharmacies_count = 0
-            
-            # Process hospital nodes
-            for node in hospital_result.nodes:
-                name = node.tags.get('name', 'Hospital')
-                facility_coords = (node.lat, node.lon)
-                distance = round(geodesic(user_location, facility_coords).kilometers, 2)
-                
-                details = {
-                    'phone': node.tags.get('phone', 'Not available'),
-                    'emergency': node.tags.get('emergency', 'Unknown'),
-                    'healthcare': node.tags.get('healthcare', 'General'),
-                    'opening_hours': node.tags.get('opening_hours', 'Not specified'),
-                    'website': node.tags.get('website', ''),
-                    'wheelchair': node.tags.get('wheelchair', 'Unknown'),
-                    'address': node.tags.get('addr:full', node.tags.get('addr:street', 'Address not available'))
-                }
-                
-                facility = {
-                    'type': 'hospital',
-                    'name': html.escape(name),
-                    'lat': float(node.lat),
-                    'lon': float(node.lon),
-                    'distance': distance,
-                    'details': details,
-                    'directions_url': f"https://www.google.com/maps/dir/?api=1&origin={user_location[0]},{user_location[1]}&destination={node.lat},{node.lon}&travelmode=driving"
-                }
-                facilities.append(facility)
-                hospitals_count += 1
-            
-            # Process pharmacy nodes
-            for node in pharmacy_result.nodes:
-                name = node.tags.get('name', 'Pharmacy')
-                facility_coords = (node.lat, node.lon)
-                distance = round(geodesic(user_location, facility_coords).kilometers, 2)
-                
-                details = {
-                    'phone': node.tags.get('phone', 'Not available'),
-                    'opening_hours': node.tags.get('opening_hours', 'Not specified'),
-                    'website': node.tags.get('website', ''),
-                    'wheelchair': node.tags.get('wheelchair', 'Unknown'),
-                    'address': node.tags.get('addr:full', node.tags.get('addr:street', 'Address not available'))
-                }
-                
-                facility = {
-                    'type': 'pharmacy',
-                    'name': html.escape(name),
-                    'lat': float(node.lat),
-                    'lon': float(node.lon),
-                    'distance': distance,
-                    'details': details,
-                    'directions_url': f"https://www.google.com/maps/dir/?api=1&origin={user_location[0]},{user_location[1]}&destination={node.lat},{node.lon}&travelmode=driving"
-                }
-                facilities.append(facility)
-                pharmacies_count += 1
-            
-            # Sort facilities by distance
-            facilities.sort(key=lambda x: x['distance'])
+            # Served from cached geohash tiles; only missing tiles hit Overpass
+            facilities, counts, partial = find_facilities(user_location, radius, limit)
+            hospitals_count = counts['hospital']
+            pharmacies_count = counts['pharmacy']
+            clinics_count = counts['clinic']
             
             response_data = {
                 'user_location': {
                     'lat': float(user_location[0]),
                     'lon': float(user_location[1]),
-                    'address': location.address
+                    'address': location['address']
                 },
                 'facilities': facilities,
                 'stats': {
                     'hospitals': hospitals_count,
-                    'pharmacies': pharmacies_count
-                }
+                    'pharmacies': pharmacies_count,
+                    'clinics': clinics_count
+                },
+                # True when some areas could not be searched in time
+                'partial': partial
             }
             
-            print(f"Found {hospitals_count} hospitals and {pharmacies_count} pharmacies")
+            event(log, "Facilities found", hospitals=hospitals_count, pharmacies=pharmacies_count,
+                  clinics=clinics_count, partial=partial)
             return jsonify(response_data)
             
         except overpy.exception.OverpassTooManyRequests:
-            print("Overpass API rate limit exceeded")
+            event(log, "Overpass rate limit exceeded", logging.WARNING)
             return jsonify({'error': 'Too many requests. Please try again later.'})
-        except overpy.exception.OverpassGatewayTimeout:
-            print("Overpass API timeout")
+        except (overpy.exception.OverpassGatewayTimeout, DeadlineExceeded, httpx.TimeoutException) as e:
+            event(log, "Overpass timeout", logging.WARNING, error=str(e))
             return jsonify({'error': 'The search took too long. Please try with a smaller radius.'})
         except Exception as e:
-            print(f"Overpass API error: {str(e)}")
+            event(log, "Overpass query failed", logging.ERROR, error=str(e))
             return jsonify({'error': 'Failed to fetch medical facilities. Please try again.'})
             
     except ValueError as e:
-        print(f"ValueError: {str(e)}")
+        event(log, "Invalid facility search request", logging.WARNING, error=str(e))
         return jsonify({'error': f'Invalid input: {str(e)}'})
     except Exception as e:
-        print(f"Error in find_hospitals: {str(e)}")
+        event(log, "Facility search failed", logging.ERROR, error_type=type(e).__name__)
         return jsonify({'error': 'An error occurred while searching for medical facilities. Please try again.'})
 
 if __name__ == "__main__":
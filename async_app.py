@@ -0,0 +1,376 @@
+"""
+Async serving mode for Chiron.
+
+Serves the same pages and JSON/SSE endpoints as app.py, but the slow upstream
+calls (Groq, Nominatim, Overpass) are awaited on one event loop instead of
+holding a gunicorn thread each, so one worker can keep hundreds of requests
+in flight:
+
+    hypercorn async_app:app --bind 0.0.0.0:10000 --workers 4
+
+app.py and gunicorn_config.py remain the default (sync) deployment.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+import overpy
+from quart import Quart, Response, g, render_template, request, jsonify
+
+from metrics import observe_request, render as render_metrics, timed_json_provider
+from structured_logging import event, get_logger, stats as logging_stats
+from sse import STREAM_HEADERS, STREAM_OPEN, wants_event_stream, format_event
+from async_http import close_async_http_client
+from groq_client import close_async_groq_client
+from groq_health import get_health_status, start_health_monitor
+from llm import stats as llm_stats
+from symptom_checker import get_disease_from_symptoms_async, stream_disease_from_symptoms_async, symptom_flight, symptom_cache
+from DrugInteraction import (get_interaction_checker, get_ai_drug_interaction_async,
+                             stream_ai_drug_interaction_async, ai_interaction_cache, ai_interaction_flight)
+from concurrent_sources import gather_sources_async
+from deadlines import DeadlineExceeded, clear_deadline, start_deadline
+from Personalised_Medication import get_personalized_medication_async, medication_flight
+from geocoding import geocode_address_async, geocode_cache
+from hospital_locator import (find_facilities_async, facility_tile_cache,
+                              DEFAULT_LIMIT as DEFAULT_FACILITY_LIMIT, MAX_LIMIT as MAX_FACILITY_LIMIT)
+from route_settings import (DB_LOOKUP_DEADLINE, AI_ANALYSIS_DEADLINE, MAX_BATCH_MEDICATIONS,
+                            DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS)
+
+app = Quart(__name__)
+log = get_logger(__name__)
+app.json = timed_json_provider(type(app.json))(app)
+# Streams may run as long as the sync deployment's worker timeout allows
+app.config['RESPONSE_TIMEOUT'] = float(os.getenv('ASYNC_RESPONSE_TIMEOUT', '120'))
+
+@app.before_serving
+async def startup():
+    start_health_monitor()
+
+@app.after_serving
+async def shutdown():
+    await close_async_groq_client()
+    await close_async_http_client()
+
+@app.before_request
+async def set_request_deadline():
+    g.request_start = time.perf_counter()
+    start_deadline()
+
+@app.after_request
+async def record_request_latency(response):
+    # Quart has no close callback, so streams are measured until their headers are sent
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(route, request.method, response.status_code, g.request_start)
+    return response
+
+@app.teardown_request
+async def end_request_deadline(exc):
+    clear_deadline()
+
+def _event_stream_response(events):
+    """Wrap an async iterator of formatted events in a streaming, unbuffered response."""
+    async def generate():
+        yield STREAM_OPEN
+        async for sse_event in events:
+            yield sse_event
+
+    return Response(generate(), mimetype='text/event-stream', headers=STREAM_HEADERS)
+
+async def _stream_text(chunks, error_message):
+    """Forward text chunks as 'token' events, ending with 'done' or 'error'."""
+    try:
+        async for chunk in chunks:
+            yield format_event({'text': chunk}, event='token')
+        yield format_event({}, event='done')
+    except Exception as e:
+        print(f"Streaming error: {str(e)}")
+        yield format_event({'error': error_message}, event='error')
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/metrics')
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/health')
+async def health():
+    status = get_health_status()
+    return jsonify({
+        'groq': status,
+        'caches': {
+            'drug_interactions': ai_interaction_cache.stats(),
+            'geocode': geocode_cache.stats(),
+            'facility_tiles': facility_tile_cache.stats(),
+            'symptoms': symptom_cache.stats()
+        },
+        'singleflight': {
+            'drug_interactions': ai_interaction_flight.stats(),
+            'symptoms': symptom_flight.stats(),
+            'personalized_medication': medication_flight.stats()
+        },
+        'llm': llm_stats(),
+        'logging': logging_stats()
+    }), (503 if status['status'] == 'down' else 200)
+
+@app.route('/symptom-checker', methods=['GET', 'POST'])
+async def symptom_checker():
+    if request.method == 'POST':
+        try:
+            if not request.is_json:
+                return jsonify({'error': 'Request must be JSON'}), 400
+
+            symptoms = (await request.get_json()).get('symptoms')
+            if not symptoms:
+                return jsonify({'error': 'No symptoms provided'}), 400
+
+            if wants_event_stream(request):
+                return _event_stream_response(_stream_text(
+                    stream_disease_from_symptoms_async(symptoms),
+                    'Failed to analyze symptoms. Please check your API key and try again.'
+                ))
+
+            result = await get_disease_from_symptoms_async(symptoms)
+            if not result:
+                return jsonify({'error': 'Failed to analyze symptoms. Please check your API key and try again.'}), 500
+
+            return jsonify({'result': result})
+
+        except Exception as e:
+            print(f"Error in symptom checker: {str(e)}")
+            return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+    return await render_template('symptom_checker.html')
+
+async def _stream_drug_interaction(drug1, drug2):
+    """Send the database result first, then stream the AI analysis."""
+    checker = get_interaction_checker()
+    try:
+        db_result = checker.check_interaction(drug1, drug2)
+    except Exception as e:
+        print(f"Database check error: {str(e)}")
+        db_result = None
+    # Unknown names are looked up as typed; close known names are only offered as suggestions
+    did_you_mean = checker.spelling_suggestions([drug1, drug2])
+    if did_you_mean:
+        yield format_event(did_you_mean, event='did_you_mean')
+    yield format_event(db_result, event='database')
+    async for sse_event in _stream_text(
+        stream_ai_drug_interaction_async(drug1, drug2),
+        'AI analysis is unavailable at this time. Please try again later.'
+    ):
+        yield sse_event
+
+@app.route('/drug-interaction', methods=['GET', 'POST'])
+async def drug_interaction():
+    if request.method == 'POST':
+        try:
+            if not request.is_json:
+                return jsonify({'error': 'Request must be JSON'}), 400
+
+            data = await request.get_json()
+            drug1 = data.get('drug1', '').strip().lower()
+            drug2 = data.get('drug2', '').strip().lower()
+
+            if not drug1 or not drug2:
+                return jsonify({
+                    'error': 'Both drug names are required'
+                }), 400
+
+            if wants_event_stream(request):
+                return _event_stream_response(_stream_drug_interaction(drug1, drug2))
+
+            checker = get_interaction_checker()
+
+            # The local lookup is in-process and fast; the AI analysis awaits on the event loop
+            sources = await gather_sources_async({
+                'database_result': (asyncio.to_thread(checker.check_interaction, drug1, drug2), DB_LOOKUP_DEADLINE),
+                'ai_result': (get_ai_drug_interaction_async(drug1, drug2), AI_ANALYSIS_DEADLINE),
+            })
+            for name, error in sources['errors'].items():
+                print(f"Drug interaction source '{name}' error: {error}")
+
+            result = {
+                'database_result': sources['results'].get('database_result'),
+                'ai_result': sources['results'].get('ai_result'),
+                'partial': sources['timed_out'],
+                'did_you_mean': checker.spelling_suggestions([drug1, drug2])
+            }
+
+            if not result['database_result'] and not result['ai_result']:
+                return jsonify({
+                    'error': 'Unable to check interactions at this time. Please try again later.'
+                }), 500
+
+            return jsonify(result)
+
+        except Exception as e:
+            print(f"Error in drug interaction check: {str(e)}")
+            return jsonify({
+                'error': f'An error occurred: {str(e)}'
+            }), 500
+
+    return await render_template('drug_interaction.html')
+
+@app.route('/drug-interaction/batch', methods=['POST'])
+async def drug_interaction_batch():
+    """Check every pair in a medication list against the local interaction database."""
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 400
+
+    data = await request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    medications = data.get('medications')
+    if not isinstance(medications, list) or not all(isinstance(m, str) for m in medications):
+        return jsonify({'error': 'medications must be a list of drug names'}), 400
+
+    medications = [m.strip() for m in medications if m.strip()]
+    if len(medications) < 2:
+        return jsonify({'error': 'At least two medications are required'}), 400
+    if len(medications) > MAX_BATCH_MEDICATIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_MEDICATIONS} medications can be checked at once'}), 400
+
+    try:
+        interactions = get_interaction_checker().check_interactions_among(medications)
+    except Exception as e:
+        print(f"Error in batch drug interaction check: {str(e)}")
+        return jsonify({'error': 'Unable to check interactions at this time. Please try again later.'}), 500
+
+    return jsonify({
+        'medications': medications,
+        'interactions': interactions,
+        'count': len(interactions),
+        'did_you_mean': get_interaction_checker().spelling_suggestions(medications)
+    })
+
+@app.route('/drug-interaction/suggest')
+async def drug_interaction_suggest():
+    """Autocomplete drug names (generic and brand) for a partly typed query."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'suggestions': []})
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_SUGGESTIONS)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    return jsonify({'suggestions': get_interaction_checker().suggest_drug_names(query, limit)})
+
+@app.route('/personalized-medication', methods=['GET', 'POST'])
+async def personalized_medication():
+    if request.method == 'GET':
+        return await render_template('personalized_medication.html')
+
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'Invalid request format', 'details': 'No JSON data in request'}), 400
+
+        condition = data.get('condition', '').strip()
+        if not condition:
+            return jsonify({'error': 'Medical condition is required', 'field': 'condition'}), 400
+
+        recommendations = await get_personalized_medication_async(
+            condition=condition,
+            patient_allergies=data.get('allergies', []),
+            current_medications=data.get('current_medications', [])
+        )
+        if not recommendations:
+            raise ValueError("No recommendations were generated")
+        if not isinstance(recommendations, str):
+            recommendations = str(recommendations)
+        if 'error' in recommendations.lower() or 'sorry' in recommendations.lower():
+            # Only the size: the text is medical advice for the patient's condition and would reach the logs
+            raise ValueError(f"API returned an error-like response ({len(recommendations)} chars)")
+
+        return jsonify({
+            'recommendations': recommendations,
+            'status': 'success'
+        })
+
+    except Exception as e:
+        event(log, "Personalized medication request failed", logging.ERROR, error=str(e))
+        return jsonify({
+            'error': 'Failed to generate recommendations',
+            'details': str(e),
+            'recommendations': 'We encountered an issue generating recommendations. Please try again or consult with a healthcare provider.'
+        }), 500
+
+@app.route('/hospital-locator')
+async def hospital_locator():
+    mapbox_token = os.getenv('MAPBOX_ACCESS_TOKEN')
+    if not mapbox_token:
+        print("Warning: MAPBOX_ACCESS_TOKEN environment variable is not set")
+    return await render_template('hospital_locator.html', mapbox_token=mapbox_token)
+
+@app.route('/hospital-locator', methods=['POST'])
+async def find_hospitals():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'})
+
+        address = data.get('address')
+        if not address:
+            return jsonify({'error': 'Please provide an address'})
+
+        radius = int(data.get('radius', 5000))
+        if radius < 1000 or radius > 10000:
+            radius = 5000
+
+        limit = int(data.get('limit', DEFAULT_FACILITY_LIMIT))
+        limit = max(1, min(limit, MAX_FACILITY_LIMIT))
+
+        try:
+            location = await geocode_address_async(address)
+            if not location:
+                return jsonify({'error': 'Could not find the specified location. Please try a more specific address in India.'})
+            user_location = (location['lat'], location['lon'])
+        except Exception as e:
+            # Geocoder messages can quote the address, so only the error type is logged
+            event(log, "Geocoding failed", logging.WARNING, error_type=type(e).__name__)
+            return jsonify({'error': 'Failed to find the location. Please try a more specific address.'})
+
+        try:
+            facilities, counts, partial = await find_facilities_async(user_location, radius, limit)
+            return jsonify({
+                'user_location': {
+                    'lat': float(user_location[0]),
+                    'lon': float(user_location[1]),
+                    'address': location['address']
+                },
+                'facilities': facilities,
+                'stats': {
+                    'hospitals': counts['hospital'],
+                    'pharmacies': counts['pharmacy'],
+                    'clinics': counts['clinic']
+                },
+                'partial': partial
+            })
+
+        except overpy.exception.OverpassTooManyRequests:
+            event(log, "Overpass rate limit exceeded", logging.WARNING)
+            return jsonify({'error': 'Too many requests. Please try again later.'})
+        except (overpy.exception.OverpassGatewayTimeout, DeadlineExceeded, httpx.TimeoutException) as e:
+            event(log, "Overpass timeout", logging.WARNING, error=str(e))
+            return jsonify({'error': 'The search took too long. Please try with a smaller radius.'})
+        except Exception as e:
+            event(log, "Overpass query failed", logging.ERROR, error=str(e))
+            return jsonify({'error': 'Failed to fetch medical facilities. Please try again.'})
+
+    except ValueError as e:
+        event(log, "Invalid facility search request", logging.WARNING, error=str(e))
+        return jsonify({'error': f'Invalid input: {str(e)}'})
+    except Exception as e:
+        event(log, "Facility search failed", logging.ERROR, error_type=type(e).__name__)
+        return jsonify({'error': 'An error occurred while searching for medical facilities. Please try again.'})
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,40 @@
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+
+# Shared connection pool for async calls to Nominatim and Overpass
+POOL_SIZE = int(os.getenv('ASYNC_HTTP_POOL_SIZE', '100'))
+CONNECT_TIMEOUT = float(os.getenv('ASYNC_HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('ASYNC_HTTP_READ_TIMEOUT', '30'))
+
+USER_AGENT = "chiron_healthcare_assistant"
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the httpx.AsyncClient for the running event loop, building it on first use."""
+    global _client, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            headers={'User-Agent': USER_AGENT},
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_async_http_client() -> None:
+    """Close the shared client and its connection pool."""
+    global _client, _client_loop
+
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+    _client_loop = None
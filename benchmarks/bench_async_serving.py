@@ -0,0 +1,111 @@
+"""
+Load test: sync gunicorn deployment (app.py) vs. async deployment (async_app.py).
+
+Starts the local Groq stub from stubs.py, answering each call after
+--llm-delay seconds, runs each server against it, and fires
+--requests symptom-checker requests with --concurrency of them in flight.
+Reports throughput and latency percentiles for each mode.
+
+    python benchmarks/bench_async_serving.py --concurrency 200 --requests 800 --llm-delay 2
+
+Needs gunicorn (sync mode) and hypercorn (async mode) on PATH.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+import stubs
+from stubs import free_port, percentile, start_server
+
+
+async def drive(url, total, concurrency, timeout):
+    latencies = []
+    errors = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}/symptom-checker",
+                                                 json={"symptoms": f"headache and fever, request {i}"})
+                    if response.status_code != 200:
+                        errors[f"HTTP {response.status_code}"] = errors.get(f"HTTP {response.status_code}", 0) + 1
+                        return
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=800)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--llm-delay", type=float, default=2.0, help="stub model latency in seconds")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # No jitter and no per-token delay, so every call takes exactly --llm-delay
+    stub = stubs.start(stubs.make_groq_handler(args.llm_delay, jitter=0.0, tokens=64, token_interval=0.0))
+    env = dict(os.environ,
+               GROQ_API_KEY="bench",
+               GROQ_BASE_URL=stub.url,
+               CHIRON_CACHE_DIR=tempfile.mkdtemp(prefix="chiron-bench-"),
+               # Measure serving capacity, not the Groq budget or load shedding
+               GROQ_RPM="1000000",
+               GROQ_TPM="1000000000",
+               ADMISSION_SYMPTOM_CHECKER_CONCURRENCY=os.getenv("ADMISSION_SYMPTOM_CHECKER_CONCURRENCY", "1000"),
+               ADMISSION_RESERVED_THREADS=os.getenv("ADMISSION_RESERVED_THREADS", "0"))
+
+    print(f"{args.requests} requests, {args.concurrency} in flight, {args.llm_delay}s model latency, "
+          f"{args.workers} workers")
+    results = {}
+    for mode in args.modes.split(","):
+        port = free_port()
+        process = start_server(mode, port, args.workers, env)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                drive(f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.timeout))
+        finally:
+            process.terminate()
+            process.wait()
+
+        results[mode] = {
+            "completed": len(latencies),
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_s": round(statistics.median(latencies), 3) if latencies else None,
+            "p99_s": round(percentile(latencies, 0.99), 3),
+        }
+        r = results[mode]
+        print(f"{mode:>5}: {r['throughput_rps']:7.1f} req/s  p50 {r['p50_s']:7.3f}s  p99 {r['p99_s']:7.3f}s  "
+              f"errors {sum(errors.values())} {errors or ''}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
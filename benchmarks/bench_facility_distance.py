@@ -0,0 +1,72 @@
+"""
+Benchmark: per-facility geodesic loop + full sort vs. NumPy haversine + top-K.
+
+Generates random facilities around a point and times the facility ranking
+used by /hospital-locator.
+
+    python benchmarks/bench_facility_distance.py --facilities 2000 --limit 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geopy.distance import geodesic
+
+import hospital_locator
+
+CENTRE = (19.0760, 72.8777)  # Mumbai
+
+
+def make_records(count, radius_km):
+    spread = radius_km / 111.0
+    return [{
+        'lat': CENTRE[0] + random.uniform(-spread, spread),
+        'lon': CENTRE[1] + random.uniform(-spread, spread),
+        'tags': {'amenity': random.choice(['hospital', 'pharmacy']), 'name': f"Facility {i}"},
+    } for i in range(count)]
+
+
+def geodesic_loop(records, radius_km):
+    # The original approach: one geodesic per facility, then sort everything
+    facilities = []
+    for record in records:
+        distance = geodesic(CENTRE, (record['lat'], record['lon'])).kilometers
+        if distance <= radius_km:
+            facilities.append({'record': record, 'distance': round(distance, 2)})
+    facilities.sort(key=lambda x: x['distance'])
+    return facilities
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--facilities", type=int, default=2000)
+    parser.add_argument("--radius", type=int, default=10000, help="search radius in metres")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    records = make_records(args.facilities, args.radius / 1000.0)
+    radius_km = args.radius / 1000.0
+
+    loop_ms = timed(lambda: geodesic_loop(records, radius_km), args.repeat)
+    vector_ms = timed(lambda: hospital_locator.facilities_from_records(records, CENTRE, args.radius, args.limit),
+                      args.repeat)
+
+    print(f"{args.facilities} facilities, radius {args.radius} m, limit {args.limit}")
+    print(f"geodesic loop + sort:        {loop_ms:8.2f} ms/request")
+    print(f"haversine + top-K + refine:  {vector_ms:8.2f} ms/request ({loop_ms / vector_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: per-call Groq client construction vs. the shared pooled client.
+
+By default the benchmark runs against a local stub of the chat completions
+endpoint so it measures client construction and connection setup without
+spending API quota. Use --live to run against the real Groq API instead
+(this uses the free models endpoint, so no tokens are consumed).
+
+    python benchmarks/bench_groq_client.py --calls 200 --threads 4
+    python benchmarks/bench_groq_client.py --live --calls 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "llama3-70b-8192",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "ok"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(COMPLETION)
+
+    def do_GET(self):
+        self._reply({"object": "list", "data": [{"id": "llama3-70b-8192", "object": "model"}]})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def call(client, live):
+    if live:
+        client.models.list()
+    else:
+        client.chat.completions.create(
+            model="llama3-70b-8192",
+            messages=[{"role": "user", "content": "test"}],
+            max_tokens=1,
+        )
+
+
+def run(label, make_client, calls, threads, live):
+    def one(_):
+        start = time.perf_counter()
+        call(make_client(), live)
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - started
+
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(f"{label:<22} calls={calls:<5} total={elapsed:7.2f}s  "
+          f"mean={statistics.mean(latencies):8.2f}ms  p50={statistics.median(latencies):8.2f}ms  "
+          f"p95={p95:8.2f}ms")
+    return statistics.mean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="number of calls per mode")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent threads (gunicorn threads per worker)")
+    parser.add_argument("--live", action="store_true", help="benchmark against the real Groq API")
+    args = parser.parse_args()
+
+    if not args.live:
+        server = start_stub_server()
+        os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+        os.environ.setdefault("GROQ_API_KEY", "bench-key")
+
+    import groq
+    from dotenv import load_dotenv
+    from groq_client import get_groq_client
+
+    def per_call_client():
+        # What every request did before: reload .env and build a fresh client
+        load_dotenv()
+        return groq.Client(api_key=os.getenv("GROQ_API_KEY"))
+
+    print(f"Target: {'Groq API' if args.live else os.environ['GROQ_BASE_URL'] + ' (local stub)'}")
+    baseline = run("new client per call", per_call_client, args.calls, args.threads, args.live)
+    pooled = run("shared pooled client", get_groq_client, args.calls, args.threads, args.live)
+    print(f"\nConnection setup overhead removed: {baseline - pooled:.2f}ms per call "
+          f"({baseline / pooled:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
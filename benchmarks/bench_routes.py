@@ -0,0 +1,221 @@
+"""
+Load test of the four POST routes of app.py under gunicorn, against local
+stand-ins for Groq, Nominatim and Overpass (see stubs.py), so runs are free,
+repeatable and unaffected by upstream rate limits.
+
+Each route gets --requests requests with --concurrency of them in flight.
+Every request uses a new symptom description, drug pair, condition or address,
+so the AI and geocoding caches miss (facility tiles are cached after the first
+fetch of each city, as in production). Reports throughput, p50/p95/p99 and the
+per-stage times from /metrics for each route, and saves everything as JSON:
+
+    python benchmarks/bench_routes.py --concurrency 16 --requests 200 --llm-delay 1
+    python benchmarks/bench_routes.py --baseline benchmarks/results/routes-20250101-120000.json
+
+Needs gunicorn on PATH. Load shedding is disabled unless --admission is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+import stubs
+from stubs import free_port, percentile, start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Route -> request body for the i-th request
+ROUTES = {
+    "/symptom-checker": lambda i: {"symptoms": f"headache and fever, case {i}"},
+    "/drug-interaction": lambda i: {"drug1": "warfarin", "drug2": f"benchdrug{i}"},
+    "/personalized-medication": lambda i: {"condition": f"migraine episode {i}", "allergies": ["penicillin"],
+                                           "current_medications": ["metformin"]},
+    "/hospital-locator": lambda i: {"address": f"{i} MG Road", "radius": 5000, "limit": 50},
+}
+
+# Histograms from metrics.py reported per route, as (metric, label that names the series)
+BREAKDOWN = [
+    ("chiron_stage_duration_seconds", "stage"),
+    ("chiron_llm_time_to_first_token_seconds", None),
+    ("chiron_llm_duration_seconds", None),
+]
+
+
+async def drive(url, route, total, concurrency, timeout, offset=0):
+    latencies = []
+    errors = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    def fail(reason):
+        errors[reason] = errors.get(reason, 0) + 1
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"{url}{route}", json=ROUTES[route](offset + i))
+                except httpx.HTTPError as e:
+                    fail(type(e).__name__)
+                    return
+                if response.status_code != 200:
+                    fail(f"HTTP {response.status_code}")
+                    return
+                # The hospital search reports failures as 200 with an 'error' field
+                if "error" in response.json():
+                    fail("error response")
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def scrape(url):
+    """Return {(metric, series): (sum, count)} for the BREAKDOWN histograms."""
+    totals = {}
+    text = httpx.get(f"{url}/metrics", timeout=10).text
+    for family in text_string_to_metric_families(text):
+        for metric, label in BREAKDOWN:
+            if family.name != metric:
+                continue
+            for sample in family.samples:
+                if not sample.name.endswith(("_sum", "_count")):
+                    continue
+                series = (metric, sample.labels[label] if label else metric)
+                total, count = totals.get(series, (0.0, 0.0))
+                if sample.name.endswith("_sum"):
+                    total += sample.value
+                else:
+                    count += sample.value
+                totals[series] = (total, count)
+    return totals
+
+
+def breakdown(before, after):
+    """Mean time and count of each stage between two scrapes."""
+    stages = {}
+    for series, (total, count) in after.items():
+        prev_total, prev_count = before.get(series, (0.0, 0.0))
+        if count > prev_count:
+            name = series[1].replace("chiron_", "").replace("_seconds", "")
+            stages[name] = {"count": int(count - prev_count),
+                            "mean_ms": round(1000 * (total - prev_total) / (count - prev_count), 2)}
+    return stages
+
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "completed": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(percentile(latencies, 0.50), 3),
+        "p95_s": round(percentile(latencies, 0.95), 3),
+        "p99_s": round(percentile(latencies, 0.99), 3),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nChange against {baseline_path}:")
+    for route, result in results.items():
+        old = baseline.get(route)
+        if not old:
+            continue
+        changes = []
+        for key in ("throughput_rps", "p50_s", "p95_s", "p99_s"):
+            if old.get(key):
+                changes.append(f"{key} {100 * (result[key] - old[key]) / old[key]:+.1f}%")
+        print(f"{route:>26}: {'  '.join(changes)}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests per route first")
+    parser.add_argument("--routes", default=",".join(ROUTES))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--admission", action="store_true", help="keep the app's load shedding limits")
+    parser.add_argument("--output", help="results file (default benchmarks/results/routes-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    stubs.add_arguments(parser)
+    args = parser.parse_args()
+
+    servers = stubs.from_arguments(args)
+    env = dict(os.environ,
+               **stubs.upstream_env(servers),
+               CHIRON_CACHE_DIR=tempfile.mkdtemp(prefix="chiron-bench-"),
+               PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="chiron-bench-metrics-"),
+               GUNICORN_THREADS=str(args.threads),
+               # Measure the routes, not the Groq budget or Nominatim's one-request-per-second policy
+               GROQ_RPM="1000000",
+               GROQ_TPM="1000000000",
+               NOMINATIM_MIN_INTERVAL="0")
+    if not args.admission:
+        env["ADMISSION_RESERVED_THREADS"] = "0"
+        for route in ("SYMPTOM_CHECKER", "DRUG_INTERACTION", "PERSONALIZED_MEDICATION", "FIND_HOSPITALS"):
+            env[f"ADMISSION_{route}_CONCURRENCY"] = "1000"
+
+    routes = args.routes.split(",")
+    print(f"{args.requests} requests per route, {args.concurrency} in flight, {args.workers} workers x "
+          f"{args.threads} threads, {args.llm_delay}s time to first token")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = start_server("sync", port, args.workers, env)
+    results = {}
+    try:
+        for route in routes:
+            if args.warmup:
+                # Numbered apart from the measured requests, so they do not warm the caches for them
+                asyncio.run(drive(url, route, args.warmup, args.concurrency, args.timeout, offset=10 ** 6))
+            before = scrape(url)
+            latencies, errors, elapsed = asyncio.run(
+                drive(url, route, args.requests, args.concurrency, args.timeout))
+            results[route] = summarize(latencies, errors, elapsed)
+            results[route]["stages"] = breakdown(before, scrape(url))
+            r = results[route]
+            print(f"{route:>26}: {r['throughput_rps']:7.1f} req/s  p50 {r['p50_s']:6.3f}s  p95 {r['p95_s']:6.3f}s  "
+                  f"p99 {r['p99_s']:6.3f}s  errors {sum(errors.values())} {errors or ''}")
+    finally:
+        process.terminate()
+        process.wait()
+        for server in servers.values():
+            server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("routes-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": git_commit(), "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "config": vars(args), "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
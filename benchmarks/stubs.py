@@ -0,0 +1,283 @@
+"""
+Local stand-ins for Groq, Nominatim and Overpass, so load tests cost nothing
+and do not depend on upstream rate limits or latency.
+
+- Groq: OpenAI-compatible chat completions. Each call takes --llm-delay seconds
+  (+/- --llm-jitter) to its first token, then --token-interval per token for
+  --llm-tokens tokens, streamed as SSE chunks when the request asks for a stream.
+- Nominatim: /search answers every query with a place from fixtures/nominatim_places.json.
+- Overpass: /api/interpreter returns the facilities from fixtures/overpass_facilities.json
+  that fall inside the query's bounding box.
+
+Also holds the helpers the load-test scripts share: start_server() runs the
+app under gunicorn or hypercorn on a free_port(), and percentile() summarises
+the latencies.
+
+Run standalone and point a development server at the printed URLs:
+
+    python benchmarks/stubs.py --llm-delay 1.5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+# Parsed by the personalized medication route, so keep the section layout
+COMPLETION_TEXT = (
+    "RECOMMENDED MEDICATIONS:\n"
+    "- Paracetamol: Relieves pain and fever; 500 mg every 6 hours as needed\n"
+    "- Ibuprofen: Anti-inflammatory; 200-400 mg with food\n"
+    "\n"
+    "USAGE GUIDELINES:\n"
+    "- Do not exceed the stated doses and stop if symptoms worsen\n"
+    "\n"
+    "PRECAUTIONS:\n"
+    "- Consult a healthcare provider before starting any medication\n"
+)
+
+# Query bounding boxes look like (south,west,north,east)
+_BBOX = re.compile(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 would make the stub itself the bottleneck
+    request_queue_size = 1024
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _tokens(count: int) -> List[str]:
+    """Split the canned completion into about count pieces (one word each, padded or grouped to fit)."""
+    words = re.findall(r"\S+\s*", COMPLETION_TEXT)
+    if count >= len(words):
+        return words + ["Rest well. "] * (count - len(words))
+    size = -(-len(words) // max(count, 1))
+    return ["".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+def make_groq_handler(delay: float, jitter: float, tokens: int, token_interval: float):
+    pieces = _tokens(tokens)
+
+    class GroqHandler(_Handler):
+        def do_GET(self):
+            self._reply({"object": "list", "data": [
+                {"id": model, "object": "model"}
+                for model in ("llama3-70b-8192", "llama3-8b-8192", "mixtral-8x7b-32768", "gemma-7b-it")]})
+
+        def do_POST(self):
+            request = json.loads(self._body())
+            prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                     "total_tokens": prompt_tokens + len(pieces)}
+            time.sleep(max(0.0, delay * random.uniform(1 - jitter, 1 + jitter)))  # Time to first token
+
+            if not request.get("stream"):
+                time.sleep(token_interval * len(pieces))
+                self._reply({
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(token_interval)
+                last = i == len(pieces) - 1
+                chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": request["model"],
+                         "choices": [{"index": 0, "delta": {"content": piece},
+                                      "finish_reason": "stop" if last else None}]}
+                if last:
+                    chunk["x_groq"] = {"id": "req-stub", "usage": usage}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, text: str):
+            data = text.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return GroqHandler
+
+
+def make_nominatim_handler(delay: float):
+    with open(os.path.join(FIXTURES, "nominatim_places.json")) as f:
+        places = json.load(f)
+
+    class NominatimHandler(_Handler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/search":
+                self._reply({"error": "not found"}, status=404)
+                return
+            query = parse_qs(url.query).get("q", [""])[0]
+            time.sleep(delay)
+            # The same address always resolves to the same city
+            self._reply([places[zlib.crc32(query.encode()) % len(places)]])
+
+    return NominatimHandler
+
+
+def make_overpass_handler(delay: float):
+    with open(os.path.join(FIXTURES, "overpass_facilities.json")) as f:
+        elements = json.load(f)["elements"]
+
+    def position(element: Dict):
+        point = element.get("center", element)
+        return point["lat"], point["lon"]
+
+    class OverpassHandler(_Handler):
+        def do_POST(self):
+            query = self._body().decode()
+            if query.startswith("data="):
+                query = parse_qs(query)["data"][0]
+            match = _BBOX.search(query)
+            if not match:
+                self._reply({"remark": "no bounding box in query"}, status=400)
+                return
+            south, west, north, east = map(float, match.groups())
+            time.sleep(delay)
+            self._reply({
+                "version": 0.6,
+                "generator": "chiron benchmark stub",
+                "elements": [e for e in elements
+                             if south <= position(e)[0] <= north and west <= position(e)[1] <= east],
+            })
+
+    return OverpassHandler
+
+
+def start(handler) -> StubServer:
+    server = StubServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_all(llm_delay: float = 1.0, llm_jitter: float = 0.2, llm_tokens: int = 64,
+              token_interval: float = 0.01, geocode_delay: float = 0.1,
+              overpass_delay: float = 0.5) -> Dict[str, StubServer]:
+    """Start the three stubs on free ports; returns them by name (groq, nominatim, overpass)."""
+    return {
+        "groq": start(make_groq_handler(llm_delay, llm_jitter, llm_tokens, token_interval)),
+        "nominatim": start(make_nominatim_handler(geocode_delay)),
+        "overpass": start(make_overpass_handler(overpass_delay)),
+    }
+
+
+def upstream_env(servers: Dict[str, StubServer]) -> Dict[str, str]:
+    """Environment variables pointing the app at the stubs."""
+    return {
+        "GROQ_API_KEY": "stub",
+        "GROQ_BASE_URL": servers["groq"].url,
+        "NOMINATIM_URL": servers["nominatim"].url,
+        "OVERPASS_URL": f"{servers['overpass'].url}/api/interpreter",
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str, port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    """Run app.py under gunicorn (mode "sync") or async_app.py under hypercorn, and wait for /health."""
+    bind = f"127.0.0.1:{port}"
+    if mode == "sync":
+        command = ["gunicorn", "-c", "gunicorn_config.py", "--bind", bind, "--workers", str(workers), "app:app"]
+    else:
+        command = ["hypercorn", "--bind", bind, "--workers", str(workers), "async_app:app"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://{bind}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not start on {bind}")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--llm-delay", type=float, default=1.0, help="stub time to first token in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="+/- fraction of --llm-delay")
+    parser.add_argument("--llm-tokens", type=int, default=64, help="tokens per completion")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--geocode-delay", type=float, default=0.1, help="stub Nominatim latency in seconds")
+    parser.add_argument("--overpass-delay", type=float, default=0.5, help="stub Overpass latency in seconds")
+
+
+def from_arguments(args: argparse.Namespace) -> Dict[str, StubServer]:
+    return start_all(args.llm_delay, args.llm_jitter, args.llm_tokens, args.token_interval,
+                     args.geocode_delay, args.overpass_delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    servers = from_arguments(parser.parse_args())
+    for name, value in upstream_env(servers).items():
+        print(f"export {name}={value}")
+    print("export NOMINATIM_MIN_INTERVAL=0")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
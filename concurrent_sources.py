@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from deadlines import cap
+
+# Threads shared by all requests in a worker for fanning out to data sources
+POOL_SIZE = int(os.getenv('SOURCE_POOL_SIZE', '8'))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return this worker's thread pool, creating it after fork if needed."""
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='source')
+                _executor_pid = pid
+    return _executor
+
+
+def gather_sources(sources: Dict[str, Tuple[Callable[[], Any], float]]) -> Dict[str, Any]:
+    """
+    Run several independent data sources concurrently, each with its own deadline.
+
+    sources maps a name to (callable, deadline_seconds). Every callable starts
+    immediately; deadlines are measured from the same start time. Returns a dict with:
+      - 'results':   name -> value for sources that finished in time
+      - 'timed_out': names of sources still running when their deadline passed
+      - 'errors':    name -> error message for sources that raised
+
+    A source that times out keeps running in the background, so work such as
+    filling a cache is not lost, but its result is not included. No deadline
+    runs past the request's own deadline, which the sources also see.
+    """
+    executor = _get_executor()
+    start = time.monotonic()
+    futures = {name: (executor.submit(contextvars.copy_context().run, fn), cap(deadline))
+               for name, (fn, deadline) in sources.items()}
+
+    results: Dict[str, Any] = {}
+    timed_out = []
+    errors: Dict[str, str] = {}
+
+    # Wait in deadline order so one slow source never delays reading a faster one
+    for name, (future, deadline) in sorted(futures.items(), key=lambda item: item[1][1]):
+        remaining = max(0.0, start + deadline - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            timed_out.append(name)
+        except Exception as e:
+            errors[name] = str(e)
+
+    return {'results': results, 'timed_out': timed_out, 'errors': errors}
+
+
+async def gather_sources_async(sources: Dict[str, Tuple[Awaitable, float]]) -> Dict[str, Any]:
+    """
+    Async version of gather_sources(): sources maps a name to (awaitable, deadline_seconds)
+    and the result has the same 'results', 'timed_out' and 'errors' keys.
+    A source that times out keeps running as a task, so cache fills still complete.
+    """
+    start = time.monotonic()
+    tasks = {name: (asyncio.ensure_future(awaitable), cap(deadline)) for name, (awaitable, deadline) in sources.items()}
+
+    results: Dict[str, Any] = {}
+    timed_out = []
+    errors: Dict[str, str] = {}
+
+    for name, (task, deadline) in sorted(tasks.items(), key=lambda item: item[1][1]):
+        remaining = max(0.0, start + deadline - time.monotonic())
+        try:
+            # shield() keeps the task running after its deadline passes
+            results[name] = await asyncio.wait_for(asyncio.shield(task), timeout=remaining)
+        except asyncio.TimeoutError:
+            timed_out.append(name)
+        except Exception as e:
+            errors[name] = str(e)
+
+    return {'results': results, 'timed_out': timed_out, 'errors': errors}
+
+
+def run_in_background(fn: Callable, *args, **kwargs) -> None:
+    """Run fn on the shared pool without waiting for it; errors are logged, not raised."""
+    def run():
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Background task {getattr(fn, '__name__', fn)} failed: {str(e)}")
+
+    _get_executor().submit(run)
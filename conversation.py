@@ -0,0 +1,135 @@
+"""
+Bounded-context conversation for the follow-up questioning loop.
+
+Sending the whole history on every turn makes prompt tokens grow with the
+square of the session length. A Conversation instead sends the system prompt,
+a compact summary of the earlier turns and a sliding window of the most recent
+turns, trimmed until the estimated prompt fits CONVERSATION_TOKEN_BUDGET.
+
+The summary is built locally as turns leave the window (no extra Groq call):
+the patient's opening description, then one line per earlier question and
+answer. Tokens are estimated like the rate-limit scheduler does, and each
+prompt records what the full history would have cost, so a session can
+report the tokens it saved.
+
+    CONVERSATION_TOKEN_BUDGET=1500     estimated prompt tokens per call, system prompt included
+    CONVERSATION_RECENT_TURNS=6        messages always sent verbatim (budget permitting)
+    CONVERSATION_SUMMARY_TOKENS=500    longest summary; its oldest lines are dropped beyond this
+"""
+import os
+from typing import Dict, List, Optional
+
+from groq_scheduler import estimate_tokens
+
+TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', '1500'))
+RECENT_TURNS = int(os.getenv('CONVERSATION_RECENT_TURNS', '6'))
+SUMMARY_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', '500'))
+
+# Characters kept of each part of a summary line
+_QUESTION_CHARS = 120
+_ANSWER_CHARS = 240
+_OPENING_CHARS = 600
+
+
+def _clip(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+
+class Conversation:
+    """Turns of one patient session, sent to Groq as a summary plus a window of recent turns."""
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET, recent_turns: int = RECENT_TURNS,
+                 summary_tokens: int = SUMMARY_TOKENS):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.summary_tokens = summary_tokens
+        self.turns: List[Dict[str, str]] = []
+        # Turns before this index are in the summary
+        self._summarized = 0
+        self._opening: Optional[str] = None
+        self._lines: List[str] = []
+        self._pending_question: Optional[str] = None
+        self._dropped = 0
+        self.calls = 0
+        self.full_tokens = 0
+        self.sent_tokens = 0
+
+    @classmethod
+    def from_history(cls, history: List[Dict[str, str]], **kwargs) -> 'Conversation':
+        conversation = cls(**kwargs)
+        for turn in history:
+            conversation.add(turn['role'], turn['content'])
+        return conversation
+
+    def add(self, role: str, content: str) -> None:
+        self.turns.append({'role': role, 'content': content})
+
+    def _fold(self, turn: Dict[str, str]) -> None:
+        """Move one turn from the window into the summary."""
+        if turn['role'] == 'assistant':
+            if self._pending_question:
+                self._lines.append(f"- Asked: {self._pending_question} (no answer)")
+            self._pending_question = _clip(turn['content'], _QUESTION_CHARS)
+        elif self._opening is None and not self._lines and self._pending_question is None:
+            self._opening = _clip(turn['content'], _OPENING_CHARS)
+        elif self._pending_question:
+            self._lines.append(f"- Asked: {self._pending_question} Patient: {_clip(turn['content'], _ANSWER_CHARS)}")
+            self._pending_question = None
+        else:
+            self._lines.append(f"- Patient: {_clip(turn['content'], _ANSWER_CHARS)}")
+        # Past the cap, the oldest exchanges go; the opening description is always kept
+        while self._lines and estimate_tokens([{'content': self._render()}]) > self.summary_tokens:
+            self._lines.pop(0)
+            self._dropped += 1
+
+    def _render(self) -> str:
+        parts = ["Summary of the earlier conversation:"]
+        if self._opening:
+            parts.append(f"Patient's initial description: {self._opening}")
+        if self._dropped:
+            parts.append(f"({self._dropped} earlier exchanges omitted)")
+        parts.extend(self._lines)
+        if self._pending_question:
+            parts.append(f"- Asked: {self._pending_question}")
+        return '\n'.join(parts)
+
+    def messages(self, system_prompt: str) -> List[Dict[str, str]]:
+        """The prompt for the next call: system prompt, summary of older turns and recent turns within the budget."""
+        system = {'role': 'system', 'content': system_prompt}
+        while len(self.turns) - self._summarized > self.recent_turns:
+            self._fold(self.turns[self._summarized])
+            self._summarized += 1
+
+        def build() -> List[Dict[str, str]]:
+            prompt = [system]
+            if self._summarized:
+                prompt.append({'role': 'system', 'content': self._render()})
+            return prompt + self.turns[self._summarized:]
+
+        prompt = build()
+        # Shrink the window further for long answers, keeping at least the latest turn
+        while estimate_tokens(prompt) > self.token_budget and len(self.turns) - self._summarized > 1:
+            self._fold(self.turns[self._summarized])
+            self._summarized += 1
+            prompt = build()
+
+        self.calls += 1
+        self.full_tokens += estimate_tokens([system] + self.turns)
+        self.sent_tokens += estimate_tokens(prompt)
+        return prompt
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_tokens - self.sent_tokens
+
+    def stats(self) -> Dict[str, int]:
+        """Estimated prompt tokens sent this session against resending the full history each call."""
+        return {
+            'calls': self.calls,
+            'turns': len(self.turns),
+            'summarized_turns': self._summarized,
+            'full_history_tokens': self.full_tokens,
+            'sent_tokens': self.sent_tokens,
+            'tokens_saved': self.tokens_saved,
+        }
@@ -0,0 +1,71 @@
+"""
+Request-scoped deadlines for upstream calls.
+
+A request sets one deadline when it starts; every upstream call (Groq,
+Nominatim, Overpass) sizes its own timeout from the time left instead of
+using a fixed timeout, and work that can no longer finish in time is not
+started. The deadline lives in a context variable, so it follows the request
+into asyncio tasks and into pool threads started with a copied context.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Whole-request budget; kept below gunicorn's 120s worker timeout
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '100'))
+# An upstream call is not started with less time than this left
+MIN_UPSTREAM_TIMEOUT = float(os.getenv('MIN_UPSTREAM_TIMEOUT', '1'))
+
+_deadline: ContextVar[Optional[float]] = ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the request's deadline leaves too little time for the next step."""
+
+
+def start_deadline(seconds: float = REQUEST_DEADLINE) -> None:
+    """Set the deadline for the request being handled in the current context."""
+    _deadline.set(time.monotonic() + seconds)
+
+
+def clear_deadline() -> None:
+    """Remove the deadline once the request is done (server threads are reused)."""
+    _deadline.set(None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Run a block under a deadline of at most seconds (an earlier enclosing deadline still applies)."""
+    current = _deadline.get()
+    token = _deadline.set(min(time.monotonic() + seconds, current if current is not None else float('inf')))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None outside a request."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def upstream_timeout(default: float, what: str = 'upstream call') -> float:
+    """
+    Timeout for the next upstream call: its usual timeout capped by the time left.
+    Raises DeadlineExceeded if less than MIN_UPSTREAM_TIMEOUT is left.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left < MIN_UPSTREAM_TIMEOUT:
+        raise DeadlineExceeded(f"Not enough time left for the {what} ({max(0.0, left):.1f}s)")
+    return min(default, left)
+
+
+def cap(seconds: float) -> float:
+    """The smaller of seconds and the time left (never negative); for waits that must not outlive the request."""
+    left = remaining()
+    return seconds if left is None else max(0.0, min(seconds, left))
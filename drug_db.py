@@ -0,0 +1,228 @@
+"""
+File-backed drug interaction database.
+
+Build an indexed SQLite database once from a CSV, JSON or JSONL dataset:
+
+    python drug_db.py build interactions.csv --output data/drug_interactions.sqlite3
+
+CSV files need a header with drug1, drug2, severity, effect and recommendation
+columns (drug_a/drug_b are accepted too); .json files need an array of objects
+with the same keys and .jsonl files one such object per line. Set
+DRUG_INTERACTION_DB to the output path and DrugInteractionChecker will look
+pairs up in it. The file is opened read-only and memory-mapped, so all
+gunicorn workers share its pages through the OS page cache.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Bytes of the database file SQLite may memory-map (default 1 GiB)
+MMAP_SIZE = int(os.getenv('DRUG_INTERACTION_DB_MMAP_SIZE', str(1024 ** 3)))
+
+_FIELDS = ('severity', 'effect', 'recommendation')
+
+
+def normalize_pair(drug1: str, drug2: str) -> Tuple[str, str]:
+    """Lowercase, strip and sort a drug pair so (a, b) and (b, a) share one key."""
+    drugs = sorted([drug1.lower().strip(), drug2.lower().strip()])
+    return drugs[0], drugs[1]
+
+
+class DictInteractionStore:
+    """In-memory store for small, built-in interaction tables."""
+
+    def __init__(self, interactions: Dict[Tuple[str, str], Dict]):
+        self._interactions = {normalize_pair(*pair): details for pair, details in interactions.items()}
+        # Adjacency index: drug -> {interacting drug -> details}
+        self._adjacency: Dict[str, Dict[str, Dict]] = {}
+        for (drug_a, drug_b), details in self._interactions.items():
+            self._adjacency.setdefault(drug_a, {})[drug_b] = details
+            self._adjacency.setdefault(drug_b, {})[drug_a] = details
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        return self._interactions.get(key)
+
+    def interactions_among(self, drugs: Iterable[str]) -> List[Tuple[str, str, Dict]]:
+        """Return every known (drug_a, drug_b, details) pair within a set of normalized drug names."""
+        drugs = set(drugs)
+        found = []
+        for drug in drugs:
+            for other, details in self._adjacency.get(drug, {}).items():
+                if drug < other and other in drugs:
+                    found.append((drug, other, details))
+        return found
+
+    def all_drugs(self) -> List[str]:
+        drugs = set()
+        for pair in self._interactions:
+            drugs.update(pair)
+        return sorted(drugs)
+
+    def __len__(self) -> int:
+        return len(self._interactions)
+
+
+class SQLiteInteractionStore:
+    """
+    Read-only store backed by an SQLite file built with build_database().
+    Lookups use the (drug_a, drug_b) primary key, so they are O(log n).
+    """
+
+    def __init__(self, db_path: str):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Drug interaction database not found: {db_path}")
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        row = self._connection().execute(
+            'SELECT severity, effect, recommendation FROM interactions WHERE drug_a = ? AND drug_b = ?', key
+        ).fetchone()
+        return dict(zip(_FIELDS, row)) if row else None
+
+    def interactions_among(self, drugs: Iterable[str]) -> List[Tuple[str, str, Dict]]:
+        """
+        Return every known (drug_a, drug_b, details) pair within a set of normalized drug names.
+        One query over the primary key and the drug_b index answers the whole set.
+        """
+        drugs = sorted(set(drugs))
+        if len(drugs) < 2:
+            return []
+        placeholders = ','.join('?' * len(drugs))
+        rows = self._connection().execute(
+            f'SELECT drug_a, drug_b, severity, effect, recommendation FROM interactions '
+            f'WHERE drug_a IN ({placeholders}) AND drug_b IN ({placeholders})', drugs + drugs
+        ).fetchall()
+        return [(row[0], row[1], dict(zip(_FIELDS, row[2:]))) for row in rows]
+
+    def all_drugs(self) -> List[str]:
+        rows = self._connection().execute(
+            'SELECT drug_a FROM interactions UNION SELECT drug_b FROM interactions ORDER BY 1'
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+
+
+def _read_csv(path: str) -> Iterator[Dict]:
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def _read_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_json(path: str) -> Iterator[Dict]:
+    with open(path, encoding='utf-8') as f:
+        records = json.load(f)
+    if not isinstance(records, list):
+        raise ValueError(f"{path} must contain a JSON array of interaction objects")
+    yield from records
+
+
+def _rows(records: Iterable[Dict]) -> Iterator[Tuple[str, str, str, str, str]]:
+    for record in records:
+        drug1 = record.get('drug1') or record.get('drug_a') or ''
+        drug2 = record.get('drug2') or record.get('drug_b') or ''
+        if not drug1.strip() or not drug2.strip():
+            continue
+        drug_a, drug_b = normalize_pair(drug1, drug2)
+        yield (drug_a, drug_b, record.get('severity') or 'Unknown',
+               record.get('effect') or '', record.get('recommendation') or '')
+
+
+def build_database(source: str, db_path: str) -> int:
+    """
+    Load a CSV, JSON (array) or JSONL dataset into a new SQLite database at db_path.
+    The file is written next to the target and renamed into place, so running
+    workers never see a half-built database. Returns the number of pairs.
+    """
+    if source.endswith('.jsonl'):
+        records = _read_jsonl(source)
+    elif source.endswith('.json'):
+        records = _read_json(source)
+    else:
+        records = _read_csv(source)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute(
+            'CREATE TABLE interactions ('
+            'drug_a TEXT NOT NULL, drug_b TEXT NOT NULL, '
+            'severity TEXT, effect TEXT, recommendation TEXT, '
+            'PRIMARY KEY (drug_a, drug_b)) WITHOUT ROWID'
+        )
+        # Later rows for the same pair replace earlier ones
+        conn.executemany('INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?)', _rows(records))
+        conn.execute('CREATE INDEX interactions_drug_b ON interactions (drug_b)')
+        conn.commit()
+        count = conn.execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='build the database from a CSV, JSON or JSONL file')
+    build.add_argument('source', help='path to a .csv, .json (array of objects) or .jsonl dataset')
+    build.add_argument('--output', default='data/drug_interactions.sqlite3', help='database file to write')
+
+    lookup = subparsers.add_parser('lookup', help='look up one drug pair')
+    lookup.add_argument('db_path')
+    lookup.add_argument('drug1')
+    lookup.add_argument('drug2')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            start = time.time()
+            count = build_database(args.source, args.output)
+            print(f"Loaded {count} interaction pairs into {args.output} in {time.time() - start:.1f}s")
+        else:
+            store = SQLiteInteractionStore(args.db_path)
+            start = time.perf_counter()
+            result = store.get(normalize_pair(args.drug1, args.drug2))
+            elapsed = (time.perf_counter() - start) * 1e6
+            print(json.dumps(result, indent=2) if result else "No known interaction")
+            print(f"Lookup took {elapsed:.0f} µs")
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import bisect
+import csv
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+# Brand names and common alternative names mapped to the canonical generic name
+BUILTIN_SYNONYMS = {
+    'coumadin': 'warfarin',
+    'jantoven': 'warfarin',
+    'ecotrin': 'aspirin',
+    'disprin': 'aspirin',
+    'ecosprin': 'aspirin',
+    'acetylsalicylic acid': 'aspirin',
+    'advil': 'ibuprofen',
+    'motrin': 'ibuprofen',
+    'brufen': 'ibuprofen',
+    'nurofen': 'ibuprofen',
+    'prilosec': 'omeprazole',
+    'omez': 'omeprazole',
+    'losec': 'omeprazole',
+    'plavix': 'clopidogrel',
+    'clopilet': 'clopidogrel',
+    'zocor': 'simvastatin',
+    'erythrocin': 'erythromycin',
+    'tylenol': 'paracetamol',
+    'crocin': 'paracetamol',
+    'calpol': 'paracetamol',
+    'dolo': 'paracetamol',
+    'acetaminophen': 'paracetamol',
+    'lipitor': 'atorvastatin',
+    'glucophage': 'metformin',
+    'glycomet': 'metformin',
+    'nexium': 'esomeprazole',
+    'zithromax': 'azithromycin',
+    'azithral': 'azithromycin',
+    'norvasc': 'amlodipine',
+    'amlong': 'amlodipine',
+    'zantac': 'ranitidine',
+    'lasix': 'furosemide',
+    'synthroid': 'levothyroxine',
+    'thyronorm': 'levothyroxine',
+    'eltroxin': 'levothyroxine',
+}
+
+# Salt and ester suffixes that do not change which drug interacts
+SALT_WORDS = {
+    'sodium', 'potassium', 'calcium', 'magnesium', 'hydrochloride', 'hcl', 'hydrobromide',
+    'sulfate', 'sulphate', 'bisulfate', 'maleate', 'besylate', 'besilate', 'mesylate',
+    'tartrate', 'succinate', 'citrate', 'phosphate', 'acetate', 'bromide', 'fumarate',
+    'dihydrate', 'monohydrate', 'trihydrate', 'anhydrous',
+}
+
+# Strength and dosage form words ("500 mg", "tablets", "xr") stripped before lookup
+_DOSE_RE = re.compile(r'\b\d+(\.\d+)?\s*(mg|mcg|µg|g|ml|iu|%)?\b')
+FORM_WORDS = {'tablet', 'tablets', 'tab', 'tabs', 'capsule', 'capsules', 'cap', 'caps',
+              'syrup', 'injection', 'er', 'sr', 'xr', 'xl', 'cr', 'dr', 'od'}
+
+_NORMALIZE_CACHE_SIZE = 4096
+
+
+def clean_name(name: str) -> str:
+    """Lowercase a drug name and collapse punctuation and whitespace."""
+    name = re.sub(r'[^\w\s]', ' ', name.lower())
+    return re.sub(r'\s+', ' ', name).strip()
+
+
+def strip_modifiers(name: str) -> str:
+    """Remove strengths, dosage forms and salt words from a cleaned drug name."""
+    name = _DOSE_RE.sub(' ', name)
+    words = [w for w in name.split() if w not in SALT_WORDS and w not in FORM_WORDS]
+    return ' '.join(words)
+
+
+def _trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (adjacent transpositions) distance, stopping early above limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = 0 if char_a == char_b else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and char_a == b[j - 2] and a[i - 2] == char_b):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def load_synonyms(path: Optional[str]) -> Dict[str, str]:
+    """Load extra synonym,generic rows from a CSV file, if one is configured."""
+    if not path or not os.path.exists(path):
+        return {}
+    synonyms = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0].strip() and row[1].strip() and row[0].strip().lower() != 'synonym':
+                synonyms[clean_name(row[0])] = clean_name(row[1])
+    return synonyms
+
+
+class DrugNameIndex:
+    """
+    Maps brand names and salt forms to canonical generic names.
+
+    Exact names and synonyms are dict lookups. Misspellings are never resolved:
+    many different drugs are one or two letters apart (quinine and quinidine,
+    digoxin and digitoxin), so close matches found through a trigram index and a
+    bounded edit distance are only offered as "did you mean" suggestions. A sorted
+    term list answers prefix queries for autocomplete with a binary search.
+    """
+
+    def __init__(self, generics: Iterable[str], synonyms: Optional[Dict[str, str]] = None):
+        synonyms = synonyms if synonyms is not None else BUILTIN_SYNONYMS
+        # term -> canonical generic, for every generic and synonym we know. Terms are cleaned
+        # names; the generics stay the store's own keys ('co-trimoxazole', not 'co trimoxazole')
+        self._canonical: Dict[str, str] = {}
+        # term -> name to show in suggestions
+        self._names: Dict[str, str] = {}
+        for generic in generics:
+            term = clean_name(generic)
+            if term:
+                self._canonical.setdefault(term, generic)
+                self._names.setdefault(term, generic)
+        for synonym, generic in synonyms.items():
+            term, target = clean_name(synonym), clean_name(generic)
+            target_name = self._canonical.get(target, target)
+            self._canonical[term] = target_name
+            self._names.setdefault(term, term)
+            self._canonical.setdefault(target, target_name)
+            self._names.setdefault(target, target_name)
+
+        self._terms = sorted(self._canonical)
+        self._trigram_index: Dict[str, List[str]] = {}
+        for term in self._terms:
+            for trigram in _trigrams(term):
+                self._trigram_index.setdefault(trigram, []).append(term)
+
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def fuzzy_match(self, name: str) -> Optional[str]:
+        """Return the known term closest to name, if it is within a small edit distance."""
+        if len(name) < 5:
+            return None
+        limit = 1 if len(name) <= 8 else 2
+        query = _trigrams(name)
+        counts: Dict[str, int] = {}
+        for trigram in query:
+            for term in self._trigram_index.get(trigram, ()):
+                counts[term] = counts.get(term, 0) + 1
+
+        best, best_distance = None, limit + 1
+        # Check the candidates sharing the most trigrams first
+        for term, _ in sorted(counts.items(), key=lambda item: -item[1])[:20]:
+            distance = _edit_distance(name, term, limit)
+            if distance < best_distance:
+                best, best_distance = term, distance
+        return best
+
+    def _lookup(self, name: str) -> Optional[str]:
+        """Canonical generic for an exact name, synonym or salt form; None for unknown names."""
+        cleaned = clean_name(name)
+        if cleaned in self._canonical:
+            return self._canonical[cleaned]
+        return self._canonical.get(strip_modifiers(cleaned))
+
+    def _resolve(self, name: str) -> str:
+        canonical = self._lookup(name)
+        if canonical is not None:
+            return canonical
+        cleaned = clean_name(name)
+        return strip_modifiers(cleaned) or cleaned
+
+    def did_you_mean(self, name: str) -> Optional[str]:
+        """For a name that is not known, the known name closest to it (a suggestion, never a substitute)."""
+        if self._lookup(name) is not None:
+            return None
+        cleaned = clean_name(name)
+        match = self.fuzzy_match(strip_modifiers(cleaned) or cleaned)
+        return self._names[match] if match else None
+
+    def normalize(self, name: str) -> str:
+        """Return the canonical generic name for a drug name (or the cleaned, stripped name if unknown)."""
+        with self._cache_lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                return self._cache[name]
+
+        canonical = self._resolve(name)
+        with self._cache_lock:
+            self._cache[name] = canonical
+            if len(self._cache) > _NORMALIZE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return canonical
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict[str, str]]:
+        """Autocomplete suggestions: prefix matches first, then close misspellings."""
+        prefix = clean_name(prefix)
+        if not prefix:
+            return []
+
+        suggestions = []
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            suggestions.append({'name': self._names[term], 'generic': self._canonical[term]})
+
+        if len(suggestions) < limit:
+            match = self.fuzzy_match(prefix)
+            if match and all(s['name'] != self._names[match] for s in suggestions):
+                suggestions.append({'name': self._names[match], 'generic': self._canonical[match]})
+        return suggestions
@@ -0,0 +1,295 @@
+"""
+Offline index of medical facilities built from an OpenStreetMap extract.
+
+Build an index once from a local .osm.pbf or .osm file:
+
+    python facility_index.py build india-latest.osm.pbf --output data/facility_index
+
+The index directory holds latitude-sorted coordinate arrays that are
+memory-mapped at startup, so every gunicorn worker shares the same pages,
+plus the facility records and their byte offsets. Point it at the app with
+FACILITY_INDEX_DIR and /hospital-locator will answer from it without calling
+Overpass for any point inside the index's bounding box.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from geo_distance import haversine_km
+
+# amenity values pulled out of the extract; hospital_locator serves the same types
+INDEXED_AMENITIES = ('hospital', 'pharmacy', 'clinic')
+
+# Tags kept for each facility, both in the index and in the Overpass tile cache
+INDEXED_TAGS = (
+    'amenity', 'name', 'phone', 'emergency', 'healthcare', 'opening_hours',
+    'website', 'wheelchair', 'addr:full', 'addr:street',
+)
+
+_KM_PER_DEGREE_LAT = 111.32
+
+
+def _keep_tags(tags: Dict[str, str]) -> Dict[str, str]:
+    return {tag: tags[tag] for tag in INDEXED_TAGS if tag in tags}
+
+
+def _is_facility(tags: Dict[str, str]) -> bool:
+    return tags.get('amenity') in INDEXED_AMENITIES
+
+
+def _iter_xml(path: str, tag_names: Tuple[str, ...]) -> Iterator[ET.Element]:
+    """Stream top-level elements of the given types from an .osm XML file, freeing memory as we go."""
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event == 'end' and element.tag in ('node', 'way', 'relation'):
+            if element.tag in tag_names:
+                yield element
+            root.clear()
+
+
+def _xml_tags(element: ET.Element) -> Dict[str, str]:
+    return {child.get('k'): child.get('v') for child in element.iter('tag')}
+
+
+def extract_from_xml(path: str) -> List[Dict]:
+    """
+    Extract facilities from an .osm XML file.
+
+    OSM files list nodes before ways before relations, so centroids are
+    resolved in three streaming passes instead of holding every node in memory.
+    """
+    facilities = []
+    facility_ways: Dict[int, Dict] = {}
+    facility_relations: List[Tuple[Dict, List[int]]] = []
+
+    # Pass 1: facility nodes, facility ways and facility relations with their member ways
+    for element in _iter_xml(path, ('node', 'way', 'relation')):
+        tags = _xml_tags(element)
+        if not _is_facility(tags):
+            continue
+        if element.tag == 'node':
+            facilities.append({'lat': float(element.get('lat')), 'lon': float(element.get('lon')),
+                               'tags': _keep_tags(tags)})
+        elif element.tag == 'way':
+            facility_ways[int(element.get('id'))] = {'tags': _keep_tags(tags),
+                                                     'nodes': [int(nd.get('ref')) for nd in element.iter('nd')]}
+        else:
+            members = [int(m.get('ref')) for m in element.iter('member') if m.get('type') == 'way']
+            facility_relations.append(({'tags': _keep_tags(tags)}, members))
+
+    # Pass 2: node lists of ways that are members of facility relations
+    member_ways = {way_id for _, members in facility_relations for way_id in members}
+    way_nodes = {way_id: way['nodes'] for way_id, way in facility_ways.items()}
+    if member_ways - set(way_nodes):
+        for element in _iter_xml(path, ('way',)):
+            way_id = int(element.get('id'))
+            if way_id in member_ways and way_id not in way_nodes:
+                way_nodes[way_id] = [int(nd.get('ref')) for nd in element.iter('nd')]
+
+    # Pass 3: coordinates of every node we need for a centroid
+    needed = {node_id for nodes in way_nodes.values() for node_id in nodes}
+    coords: Dict[int, Tuple[float, float]] = {}
+    for element in _iter_xml(path, ('node',)):
+        node_id = int(element.get('id'))
+        if node_id in needed:
+            coords[node_id] = (float(element.get('lat')), float(element.get('lon')))
+
+    def centroid(node_ids: List[int]) -> Optional[Tuple[float, float]]:
+        # Closed ways repeat their first node; count each node once
+        points = [coords[node_id] for node_id in dict.fromkeys(node_ids) if node_id in coords]
+        if not points:
+            return None
+        return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+    for way in facility_ways.values():
+        center = centroid(way['nodes'])
+        if center:
+            facilities.append({'lat': center[0], 'lon': center[1], 'tags': way['tags']})
+
+    for relation, members in facility_relations:
+        center = centroid([node_id for way_id in members for node_id in way_nodes.get(way_id, [])])
+        if center:
+            facilities.append({'lat': center[0], 'lon': center[1], 'tags': relation['tags']})
+
+    return facilities
+
+
+def extract_from_pbf(path: str) -> List[Dict]:
+    """Extract facilities from an .osm.pbf file (requires the 'osmium' package)."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Reading .osm.pbf files requires pyosmium: pip install osmium") from e
+
+    facilities = []
+
+    class FacilityHandler(osmium.SimpleHandler):
+        def node(self, node):
+            tags = dict(node.tags)
+            if _is_facility(tags):
+                facilities.append({'lat': node.location.lat, 'lon': node.location.lon, 'tags': _keep_tags(tags)})
+
+        def area(self, area):
+            # Called for closed ways and multipolygon relations, with node locations resolved
+            tags = dict(area.tags)
+            if not _is_facility(tags):
+                return
+            points = [(node.lat, node.lon) for ring in area.outer_rings() for node in ring]
+            if points:
+                facilities.append({'lat': sum(p[0] for p in points) / len(points),
+                                   'lon': sum(p[1] for p in points) / len(points),
+                                   'tags': _keep_tags(tags)})
+
+    FacilityHandler().apply_file(path, locations=True)
+    return facilities
+
+
+def build_index(source: str, output_dir: str) -> Dict:
+    """Extract facilities from an OSM file and write the index to output_dir."""
+    start = time.time()
+    if source.endswith('.pbf'):
+        facilities = extract_from_pbf(source)
+    else:
+        facilities = extract_from_xml(source)
+    if not facilities:
+        raise ValueError(f"No hospitals, pharmacies or clinics found in {source}")
+
+    facilities.sort(key=lambda f: f['lat'])
+    os.makedirs(output_dir, exist_ok=True)
+
+    np.save(os.path.join(output_dir, 'lats.npy'), np.array([f['lat'] for f in facilities], dtype=np.float64))
+    np.save(os.path.join(output_dir, 'lons.npy'), np.array([f['lon'] for f in facilities], dtype=np.float64))
+
+    offsets = [0]
+    with open(os.path.join(output_dir, 'records.jsonl'), 'wb') as f:
+        for facility in facilities:
+            line = (json.dumps(facility, separators=(',', ':')) + '\n').encode('utf-8')
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(output_dir, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+
+    lats = [f['lat'] for f in facilities]
+    lons = [f['lon'] for f in facilities]
+    meta = {
+        'source': os.path.basename(source),
+        'built_at': time.time(),
+        'count': len(facilities),
+        'bbox': [min(lats), min(lons), max(lats), max(lons)],
+        'amenities': {a: sum(1 for f in facilities if f['tags']['amenity'] == a) for a in INDEXED_AMENITIES},
+    }
+    with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    meta['build_seconds'] = round(time.time() - start, 1)
+    return meta
+
+
+class FacilityIndex:
+    """Read-only, memory-mapped spatial index over latitude-sorted facilities."""
+
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.bbox = tuple(self.meta['bbox'])
+        self.lats = np.load(os.path.join(index_dir, 'lats.npy'), mmap_mode='r')
+        self.lons = np.load(os.path.join(index_dir, 'lons.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(index_dir, 'offsets.npy'), mmap_mode='r')
+        with open(os.path.join(index_dir, 'records.jsonl'), 'rb') as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        south, west, north, east = self.bbox
+        return south <= lat <= north and west <= lon <= east
+
+    def _record(self, position: int) -> Dict:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self._records[start:end])
+
+    def query(self, lat: float, lon: float, radius: int) -> List[Dict]:
+        """Return the facility records within radius metres of (lat, lon)."""
+        radius_km = radius / 1000.0
+        dlat = radius_km / _KM_PER_DEGREE_LAT
+        dlon = radius_km / (_KM_PER_DEGREE_LAT * max(np.cos(np.radians(lat)), 0.01))
+
+        # Binary search the latitude band, then filter it with vectorized arithmetic
+        lo = int(np.searchsorted(self.lats, lat - dlat, side='left'))
+        hi = int(np.searchsorted(self.lats, lat + dlat, side='right'))
+        if lo >= hi:
+            return []
+        band_lons = self.lons[lo:hi]
+        candidates = np.flatnonzero(np.abs(band_lons - lon) <= dlon)
+        if candidates.size == 0:
+            return []
+
+        distances = haversine_km((lat, lon), self.lats[lo:hi][candidates], band_lons[candidates])
+        return [self._record(lo + int(i)) for i in candidates[distances <= radius_km]]
+
+
+_index: Optional[FacilityIndex] = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_facility_index() -> Optional[FacilityIndex]:
+    """Return the index configured by FACILITY_INDEX_DIR, or None if there is none."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                index_dir = os.getenv('FACILITY_INDEX_DIR')
+                if index_dir and os.path.exists(os.path.join(index_dir, 'meta.json')):
+                    try:
+                        _index = FacilityIndex(index_dir)
+                        print(f"Loaded facility index with {_index.meta['count']} facilities from {index_dir}")
+                    except Exception as e:
+                        print(f"Error loading facility index from {index_dir}: {str(e)}")
+                _index_loaded = True
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='build an index from an OSM extract')
+    build.add_argument('source', help='path to a .osm.pbf or .osm file')
+    build.add_argument('--output', default='data/facility_index', help='index directory to write')
+
+    query = subparsers.add_parser('query', help='look up facilities around a point')
+    query.add_argument('index_dir')
+    query.add_argument('lat', type=float)
+    query.add_argument('lon', type=float)
+    query.add_argument('--radius', type=int, default=5000, help='radius in metres')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            meta = build_index(args.source, args.output)
+            print(f"Indexed {meta['count']} facilities {meta['amenities']} in {meta['build_seconds']}s")
+            print(f"Bounding box: {meta['bbox']}")
+            print(f"Written to {args.output}")
+        else:
+            index = FacilityIndex(args.index_dir)
+            start = time.perf_counter()
+            records = index.query(args.lat, args.lon, args.radius)
+            elapsed = (time.perf_counter() - start) * 1e6
+            for record in records:
+                print(f"{record['tags']['amenity']:<9} {record['tags'].get('name', '(unnamed)')}")
+            print(f"\n{len(records)} facilities in {elapsed:.0f} µs")
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+from typing import Tuple
+
+import numpy as np
+
+# Mean Earth radius used by the haversine formula
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(origin: Tuple[float, float], lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from origin to every (lat, lon) pair, computed in one pass."""
+    lat0 = np.radians(origin[0])
+    lon0 = np.radians(origin[1])
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+
+    a = (np.sin((lats - lat0) / 2) ** 2
+         + np.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def nearest_indices(distances: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Indices of the `limit` smallest distances in ascending order.
+    Uses a partial selection, so the cost is O(n + limit log limit) instead of a full sort.
+    """
+    if limit <= 0 or distances.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if limit < distances.size:
+        candidates = np.argpartition(distances, limit - 1)[:limit]
+    else:
+        candidates = np.arange(distances.size)
+    return candidates[np.argsort(distances[candidates], kind='stable')]
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from geopy.geocoders import Nominatim
+
+from async_http import get_async_http_client
+from deadlines import cap, upstream_timeout
+from metrics import timed
+from rate_limit import IntervalRateLimiter
+from ttl_cache import TieredCache
+
+# Nominatim's usage policy allows at most one request per second per application
+NOMINATIM_MIN_INTERVAL = float(os.getenv('NOMINATIM_MIN_INTERVAL', '1.0'))
+NOMINATIM_MAX_WAIT = float(os.getenv('NOMINATIM_MAX_WAIT', '15'))
+NOMINATIM_TIMEOUT = float(os.getenv('NOMINATIM_TIMEOUT', '10'))
+# Nominatim server for both geocoders (e.g. a local stand-in for benchmarks)
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org').rstrip('/')
+# Search endpoint used by the async geocoder (the sync path goes through geopy)
+NOMINATIM_SEARCH_URL = f"{NOMINATIM_URL}/search"
+
+geocode_cache = TieredCache(
+    'geocode',
+    ttl=float(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600))),
+    max_memory_entries=int(os.getenv('GEOCODE_CACHE_MEMORY_SIZE', '2048')),
+    max_disk_entries=int(os.getenv('GEOCODE_CACHE_DISK_SIZE', '100000')),
+)
+# Addresses that were not found are remembered for a shorter time
+GEOCODE_NEGATIVE_TTL = float(os.getenv('GEOCODE_NEGATIVE_TTL', str(24 * 3600)))
+
+nominatim_limiter = IntervalRateLimiter('nominatim', NOMINATIM_MIN_INTERVAL)
+
+_geolocator: Optional[Nominatim] = None
+_geolocator_lock = threading.Lock()
+
+
+def _get_geolocator() -> Nominatim:
+    """Return the shared Nominatim client, building it on first use."""
+    global _geolocator
+    if _geolocator is None:
+        with _geolocator_lock:
+            if _geolocator is None:
+                url = urlsplit(NOMINATIM_URL)
+                _geolocator = Nominatim(
+                    user_agent="chiron_healthcare_assistant",
+                    timeout=NOMINATIM_TIMEOUT,
+                    domain=url.netloc + url.path,
+                    scheme=url.scheme
+                )
+    return _geolocator
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address for cache lookups: lowercase, single spaces, no stray punctuation."""
+    address = re.sub(r'[^\w\s]', ' ', address.lower())
+    return re.sub(r'\s+', ' ', address).strip()
+
+
+@timed('geocode', upstream='nominatim')
+def geocode_address(address: str) -> Optional[Dict]:
+    """
+    Geocode an address in India, returning {'lat', 'lon', 'address'} or None if not found.
+    Results and misses are cached; live lookups are rate limited across all workers
+    and time out with the request deadline.
+    Raises on network, rate limiter or deadline errors, which are not cached.
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    cached = geocode_cache.get(key)
+    if cached is not None:
+        return cached if cached.get('found') else None
+
+    nominatim_limiter.acquire(max_wait=cap(NOMINATIM_MAX_WAIT))
+    location = _get_geolocator().geocode(
+        address,
+        exactly_one=True,
+        language="en",
+        country_codes="in",  # Limit to India
+        timeout=upstream_timeout(NOMINATIM_TIMEOUT, 'Nominatim lookup')
+    )
+
+    if not location:
+        return _store_result(key, None)
+    return _store_result(key, (float(location.latitude), float(location.longitude), location.address))
+
+
+def _store_result(key: str, found: Optional[Tuple[float, float, str]]) -> Optional[Dict]:
+    """Cache a lookup result ((lat, lon, address) or None for a miss) and return it."""
+    if found is None:
+        geocode_cache.set(key, {'found': False}, ttl=GEOCODE_NEGATIVE_TTL)
+        return None
+
+    result = {
+        'found': True,
+        'lat': found[0],
+        'lon': found[1],
+        'address': found[2],
+    }
+    geocode_cache.set(key, result)
+    return result
+
+
+@timed('geocode', upstream='nominatim')
+async def geocode_address_async(address: str) -> Optional[Dict]:
+    """
+    Async version of geocode_address() sharing the same cache and rate limiter.
+    Queries Nominatim over the shared httpx.AsyncClient instead of geopy.
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    cached = geocode_cache.get(key)
+    if cached is not None:
+        return cached if cached.get('found') else None
+
+    # The limiter blocks while it waits for a slot, so wait in a worker thread
+    await asyncio.to_thread(nominatim_limiter.acquire, cap(NOMINATIM_MAX_WAIT))
+    response = await get_async_http_client().get(
+        NOMINATIM_SEARCH_URL,
+        params={'q': address, 'format': 'json', 'limit': 1,
+                'accept-language': 'en', 'countrycodes': 'in'},
+        timeout=upstream_timeout(NOMINATIM_TIMEOUT, 'Nominatim lookup'),
+    )
+    response.raise_for_status()
+    places = response.json()
+
+    if not places:
+        return _store_result(key, None)
+    return _store_result(key, (float(places[0]['lat']), float(places[0]['lon']), places[0]['display_name']))
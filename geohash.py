@@ -0,0 +1,83 @@
+import math
+from typing import List, Tuple
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    """Encode a coordinate as a geohash of the given length."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return the (south, west, north, east) bounding box of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            target[1 - bit] = mid
+            even = not even
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (lat, lon) size in degrees of a geohash cell."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def covering(south: float, west: float, north: float, east: float, precision: int) -> List[str]:
+    """Return every geohash cell of the given precision that intersects the bounding box."""
+    lat_step, lon_step = cell_size(precision)
+    cells = []
+
+    # Snap to the cell grid so each row and column is visited exactly once
+    lat = math.floor((south + 90.0) / lat_step) * lat_step - 90.0
+    while lat < north:
+        lon = math.floor((west + 180.0) / lon_step) * lon_step - 180.0
+        while lon < east:
+            cells.append(encode(lat + lat_step / 2, lon + lon_step / 2, precision))
+            lon += lon_step
+        lat += lat_step
+
+    return cells
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+from typing import Optional
+
+import groq
+import httpx
+from dotenv import load_dotenv
+
+# Load environment variables once per process instead of on every call
+load_dotenv()
+
+# Connection pool and timeout settings (override through environment variables)
+POOL_SIZE = int(os.getenv('GROQ_POOL_SIZE', '16'))
+KEEPALIVE_EXPIRY = float(os.getenv('GROQ_KEEPALIVE_EXPIRY', '60'))
+CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('GROQ_READ_TIMEOUT', '60'))
+# The SDK's own retries would bypass groq_scheduler's shared budget and backoff; llm.py retries instead
+MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '0'))
+
+_client: Optional[groq.Client] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+_async_client: Optional[groq.AsyncGroq] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _pool_limits(pool_size: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _build_http_client() -> httpx.Client:
+    """Build the keep-alive HTTP connection pool shared by all Groq calls."""
+    return httpx.Client(
+        limits=_pool_limits(POOL_SIZE),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def get_groq_client() -> Optional[groq.Client]:
+    """
+    Return the process-wide Groq client, building it on first use.
+    The client is safe to share between threads; a forked gunicorn worker
+    gets its own client so connection pools are never shared across processes.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is not None and _client_pid == pid:
+            return _client
+
+        api_key = os.getenv('GROQ_API_KEY')
+        if not api_key:
+            print("\nError: GROQ_API_KEY not found in environment variables")
+            return None
+
+        _client = groq.Client(
+            api_key=api_key,
+            max_retries=MAX_RETRIES,
+            http_client=_build_http_client(),
+        )
+        _client_pid = pid
+        return _client
+
+
+def close_groq_client() -> None:
+    """Close the shared client and its connection pool."""
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+# Connections for the async client; one event loop can keep many more requests in flight than threads
+ASYNC_POOL_SIZE = int(os.getenv('GROQ_ASYNC_POOL_SIZE', '200'))
+
+
+def get_async_groq_client() -> Optional[groq.AsyncGroq]:
+    """
+    Return the AsyncGroq client for the running event loop, building it on first use.
+    Must be called from inside the loop; each loop (one per async worker) gets its own pool.
+    """
+    global _async_client, _async_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_client is not None and _async_client_loop is loop:
+        return _async_client
+
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        print("\nError: GROQ_API_KEY not found in environment variables")
+        return None
+
+    _async_client = groq.AsyncGroq(
+        api_key=api_key,
+        max_retries=MAX_RETRIES,
+        http_client=httpx.AsyncClient(
+            limits=_pool_limits(ASYNC_POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        ),
+    )
+    _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_groq_client() -> None:
+    """Close the async client and its connection pool."""
+    global _async_client, _async_client_loop
+
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.close()
+    _async_client = None
+    _async_client_loop = None
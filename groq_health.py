@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import groq
+
+from groq_client import get_groq_client
+
+# Seconds between background probes (one probe per gunicorn worker per interval)
+HEALTH_CHECK_INTERVAL = float(os.getenv('GROQ_HEALTH_INTERVAL', '60'))
+
+# Models we care about, in order of preference (as of August 2024)
+KNOWN_MODELS = [
+    "llama3-70b-8192",     # Most capable model
+    "llama3-8b-8192",      # Faster but less capable
+    "mixtral-8x7b-32768",  # Some users report this still works
+    "gemma-7b-it",         # Alternative model
+]
+
+_state: Dict = {
+    'status': 'unknown',
+    'latency_ms': None,
+    'checked_at': None,
+    'error': None,
+    'auth_failed': False,
+    'models': [],
+}
+_state_lock = threading.Lock()
+_monitor_thread: Optional[threading.Thread] = None
+_monitor_pid: Optional[int] = None
+_monitor_lock = threading.Lock()
+
+
+def probe_groq() -> Dict:
+    """
+    Run a single health probe and update the cached state.
+    Lists models instead of sending a completion, so the probe costs no tokens.
+    """
+    client = get_groq_client()
+    start = time.perf_counter()
+    result = {'checked_at': time.time()}
+
+    if not client:
+        result.update(status='down', latency_ms=None, error='GROQ_API_KEY not configured',
+                      auth_failed=True, models=[])
+    else:
+        try:
+            response = client.models.list()
+            result.update(
+                status='ok',
+                latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                error=None,
+                auth_failed=False,
+                models=sorted(model.id for model in response.data),
+            )
+        except groq.AuthenticationError as e:
+            result.update(status='down', latency_ms=None, error=f"Authentication failed: {str(e)}",
+                          auth_failed=True, models=[])
+        except Exception as e:
+            # Keep the last known model list; a transient failure does not remove models
+            result.update(status='down', latency_ms=None, error=str(e), auth_failed=False)
+
+    with _state_lock:
+        _state.update(result)
+    return get_cached_status()
+
+
+def _monitor_loop() -> None:
+    while True:
+        try:
+            probe_groq()
+        except Exception as e:
+            print(f"Groq health probe failed: {str(e)}")
+        time.sleep(HEALTH_CHECK_INTERVAL)
+
+
+def start_health_monitor() -> None:
+    """Start the background monitor for this worker process if it is not running."""
+    global _monitor_thread, _monitor_pid
+
+    pid = os.getpid()
+    if _monitor_thread is not None and _monitor_pid == pid and _monitor_thread.is_alive():
+        return
+
+    with _monitor_lock:
+        if _monitor_thread is not None and _monitor_pid == pid and _monitor_thread.is_alive():
+            return
+        _monitor_thread = threading.Thread(target=_monitor_loop, name='groq-health-monitor', daemon=True)
+        _monitor_pid = pid
+        _monitor_thread.start()
+
+
+def get_cached_status() -> Dict:
+    """Return a copy of the last known Groq status without touching the network."""
+    with _state_lock:
+        status = dict(_state)
+        status['models'] = list(_state['models'])
+    return status
+
+
+def get_health_status() -> Dict:
+    """Return the cached Groq status, making sure the monitor is running."""
+    start_health_monitor()
+    status = get_cached_status()
+    status['interval_seconds'] = HEALTH_CHECK_INTERVAL
+    return status
+
+
+def get_available_known_models() -> List[str]:
+    """Return the known models that the last probe reported as available."""
+    available = set(get_health_status()['models'])
+    return [model for model in KNOWN_MODELS if model in available]
+
+
+def pick_model(preferred: str) -> str:
+    """
+    Return the preferred model unless the last probe showed it is unavailable,
+    in which case the first available known model is used instead.
+    """
+    status = get_health_status()
+    if status['status'] != 'ok' or preferred in status['models']:
+        return preferred
+    for model in KNOWN_MODELS:
+        if model in status['models']:
+            return model
+    return preferred
@@ -0,0 +1,330 @@
+"""
+Client-side scheduling of Groq calls within the account's rate limits.
+
+Each model has a requests-per-minute and a tokens-per-minute bucket. A call
+reserves one request and its estimated tokens (prompt estimate plus
+max_tokens) before it is sent; unused tokens are returned once the response
+reports its usage, and Groq's x-ratelimit-* headers correct the buckets. The
+bucket state lives in a lock file per model so every worker on the host
+draws from the same budget.
+
+Waiting calls queue per model by priority: interactive requests go before
+batch jobs, and batch jobs may not dip into the last BATCH_RESERVE share of
+either bucket, so they also yield to interactive calls in other workers.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: budget within the process only
+    fcntl = None
+
+from deadlines import cap
+from rate_limit import RateLimitTimeout
+from ttl_cache import CACHE_DIR
+
+# Budgets assumed until Groq's response headers say otherwise
+DEFAULT_RPM = int(os.getenv('GROQ_RPM', '30'))
+DEFAULT_TPM = int(os.getenv('GROQ_TPM', '6000'))
+
+PRIORITIES = {'interactive': 0, 'batch': 1}
+# Longest a call queues for budget before failing over to another model
+MAX_QUEUE_WAIT = {
+    'interactive': float(os.getenv('GROQ_QUEUE_MAX_WAIT', '10')),
+    'batch': float(os.getenv('GROQ_BATCH_QUEUE_MAX_WAIT', '120')),
+}
+# Share of each bucket that only interactive calls may use
+BATCH_RESERVE = float(os.getenv('GROQ_BATCH_RESERVE', '0.2'))
+
+# Retries of a 429 on the same model, with full-jitter exponential backoff
+RATE_LIMIT_RETRIES = int(os.getenv('GROQ_RATE_LIMIT_RETRIES', '2'))
+BACKOFF_BASE = float(os.getenv('GROQ_BACKOFF_BASE', '0.5'))
+BACKOFF_MAX = float(os.getenv('GROQ_BACKOFF_MAX', '8'))
+
+# Waiting calls re-check the budget at least this often
+_POLL_INTERVAL = 0.05
+# Rough characters per token for English prompts, plus per-message framing
+_CHARS_PER_TOKEN = 4
+_TOKENS_PER_MESSAGE = 4
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate prompt tokens without a tokenizer (about four characters per token)."""
+    return sum(len(message.get('content') or '') // _CHARS_PER_TOKEN + _TOKENS_PER_MESSAGE
+               for message in messages)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse Groq's reset durations ('7.66s', '2m59.56s', '120ms') or plain seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(retry: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, never shorter than Groq's retry-after."""
+    jitter = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** retry))
+    return (retry_after or 0.0) + jitter
+
+
+class _Buckets:
+    """RPM and TPM buckets per model, kept in a lock file shared by every worker."""
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = state_dir or os.path.join(CACHE_DIR, 'groq_budget')
+        self._local: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_state(now: float) -> Dict[str, float]:
+        return {'rpm': DEFAULT_RPM, 'tpm': DEFAULT_TPM, 'requests': DEFAULT_RPM, 'tokens': DEFAULT_TPM,
+                'updated': now, 'blocked_until': 0.0}
+
+    @staticmethod
+    def _refill(state: Dict[str, float], now: float) -> None:
+        elapsed = max(0.0, now - state['updated'])
+        state['requests'] = min(state['rpm'], state['requests'] + elapsed * state['rpm'] / 60.0)
+        state['tokens'] = min(state['tpm'], state['tokens'] + elapsed * state['tpm'] / 60.0)
+        state['updated'] = now
+
+    @contextmanager
+    def _state(self, model: str) -> Iterator[Dict[str, float]]:
+        """Yield the model's refilled bucket state under an exclusive lock, saving changes afterwards."""
+        now = time.time()
+        with self._lock:
+            if fcntl is None:
+                state = self._local.setdefault(model, self._new_state(now))
+                self._refill(state, now)
+                yield state
+                return
+
+            os.makedirs(self.state_dir, exist_ok=True)
+            path = os.path.join(self.state_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model)}.json")
+            with open(path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = {**self._new_state(now), **json.loads(f.read())}
+                    except ValueError:
+                        state = self._new_state(now)
+                    self._refill(state, now)
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_take(self, model: str, tokens: int, reserve: float) -> float:
+        """Take one request and tokens from the buckets; return 0, or the seconds to wait before retrying."""
+        with self._state(model) as state:
+            now = state['updated']
+            if state['blocked_until'] > now:
+                return state['blocked_until'] - now
+            # A call larger than the whole bucket only waits for a full bucket
+            tokens = min(tokens, state['tpm'])
+            request_floor = reserve * state['rpm']
+            token_floor = reserve * state['tpm']
+            if state['requests'] - 1 >= request_floor and state['tokens'] - tokens >= token_floor:
+                state['requests'] -= 1
+                state['tokens'] -= tokens
+                return 0.0
+            return max((request_floor + 1 - state['requests']) * 60.0 / state['rpm'],
+                       (token_floor + tokens - state['tokens']) * 60.0 / state['tpm'],
+                       _POLL_INTERVAL)
+
+    def refund(self, model: str, tokens: int) -> None:
+        with self._state(model) as state:
+            state['tokens'] = min(state['tpm'], state['tokens'] + tokens)
+
+    def update(self, model: str, headers: Mapping[str, str], retry_after: Optional[float] = None) -> None:
+        """Correct the buckets from Groq's x-ratelimit-* headers (and block the model after a 429)."""
+        limit_tokens = _header_int(headers, 'x-ratelimit-limit-tokens')
+        remaining_tokens = _header_int(headers, 'x-ratelimit-remaining-tokens')
+        # Groq reports requests per day here; only an exhausted daily quota matters for scheduling
+        remaining_requests = _header_int(headers, 'x-ratelimit-remaining-requests')
+        with self._state(model) as state:
+            now = state['updated']
+            if limit_tokens:
+                state['tpm'] = limit_tokens
+            if remaining_tokens is not None:
+                state['tokens'] = min(state['tokens'], remaining_tokens)
+            if remaining_requests == 0:
+                reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+                if reset:
+                    state['blocked_until'] = max(state['blocked_until'], now + reset)
+            if retry_after is not None:
+                state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+                state['tokens'] = min(state['tokens'], 0.0)
+
+    def snapshot(self, model: str) -> Dict[str, float]:
+        with self._state(model) as state:
+            return {
+                'rpm': state['rpm'],
+                'tpm': state['tpm'],
+                'requests_available': round(state['requests'], 1),
+                'tokens_available': round(state['tokens']),
+                'blocked_for_s': max(0.0, round(state['blocked_until'] - state['updated'], 1)),
+            }
+
+
+class GroqScheduler:
+    """Queue Groq calls per model by priority and admit them within the shared RPM/TPM budget."""
+
+    def __init__(self, buckets: Optional[_Buckets] = None):
+        self._buckets = buckets or _Buckets()
+        self._queues: Dict[str, List[Tuple[int, int]]] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._stats = {'admitted': 0, 'queued': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+                       'rate_limited': 0, 'tokens_refunded': 0}
+
+    def _enqueue(self, model: str, priority: str) -> Tuple[int, int]:
+        ticket = (PRIORITIES[priority], next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queues.setdefault(model, []), ticket)
+        return ticket
+
+    def _dequeue(self, model: str, ticket: Tuple[int, int]) -> None:
+        with self._cond:
+            queue = self._queues[model]
+            queue.remove(ticket)
+            heapq.heapify(queue)
+            self._cond.notify_all()
+
+    def _is_next(self, model: str, ticket: Tuple[int, int]) -> bool:
+        return self._queues[model][0] == ticket
+
+    def _admitted(self, start: float, queued: bool) -> None:
+        with self._cond:
+            self._stats['admitted'] += 1
+            if queued:
+                self._stats['queued'] += 1
+                self._stats['wait_seconds'] += time.monotonic() - start
+
+    def _timeout(self, model: str) -> RateLimitTimeout:
+        with self._cond:
+            self._stats['timeouts'] += 1
+        return RateLimitTimeout(f"Timed out waiting for Groq rate limit budget for {model}")
+
+    def acquire(self, model: str, tokens: int, priority: str = 'interactive',
+                max_wait: Optional[float] = None) -> None:
+        """
+        Block until the call may be sent; raises RateLimitTimeout if that would take
+        longer than max_wait or the request deadline allows.
+        """
+        start = time.monotonic()
+        deadline = start + cap(MAX_QUEUE_WAIT[priority] if max_wait is None else max_wait)
+        reserve = BATCH_RESERVE if priority == 'batch' else 0.0
+        ticket = self._enqueue(model, priority)
+        queued = False
+        try:
+            while True:
+                with self._cond:
+                    while not self._is_next(model, ticket):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._timeout(model)
+                        # Async waiters do not notify, so poll as well
+                        queued = True
+                        self._cond.wait(min(remaining, _POLL_INTERVAL))
+                wait = self._buckets.try_take(model, tokens, reserve)
+                if wait == 0:
+                    self._admitted(start, queued)
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise self._timeout(model)
+                # Jitter so workers do not all retry the shared budget at the same moment
+                queued = True
+                time.sleep(min(wait, 1.0) * random.uniform(1.0, 1.2))
+        finally:
+            self._dequeue(model, ticket)
+
+    async def acquire_async(self, model: str, tokens: int, priority: str = 'interactive',
+                            max_wait: Optional[float] = None) -> None:
+        """Async version of acquire(); waits with asyncio.sleep instead of blocking the loop."""
+        start = time.monotonic()
+        deadline = start + cap(MAX_QUEUE_WAIT[priority] if max_wait is None else max_wait)
+        reserve = BATCH_RESERVE if priority == 'batch' else 0.0
+        ticket = self._enqueue(model, priority)
+        queued = False
+        try:
+            while True:
+                while True:
+                    with self._cond:
+                        if self._is_next(model, ticket):
+                            break
+                    if time.monotonic() >= deadline:
+                        raise self._timeout(model)
+                    queued = True
+                    await asyncio.sleep(_POLL_INTERVAL)
+                wait = self._buckets.try_take(model, tokens, reserve)
+                if wait == 0:
+                    self._admitted(start, queued)
+                    return
+                if time.monotonic() + wait > deadline:
+                    raise self._timeout(model)
+                queued = True
+                await asyncio.sleep(min(wait, 1.0) * random.uniform(1.0, 1.2))
+        finally:
+            self._dequeue(model, ticket)
+
+    def record_response(self, model: str, headers: Mapping[str, str], reserved_tokens: int,
+                        used_tokens: Optional[int]) -> None:
+        """Return unused reserved tokens and apply the response's rate-limit headers."""
+        self.refund_unused(model, reserved_tokens, used_tokens)
+        self._buckets.update(model, headers)
+
+    def refund_unused(self, model: str, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """Return the part of a reservation a call did not use (streams report usage in their last chunk)."""
+        if used_tokens is not None and used_tokens < reserved_tokens:
+            self._buckets.refund(model, reserved_tokens - used_tokens)
+            with self._cond:
+                self._stats['tokens_refunded'] += reserved_tokens - used_tokens
+
+    def record_rate_limited(self, model: str, headers: Mapping[str, str], retry_after: Optional[float]) -> None:
+        """Pause the model for every worker after a 429."""
+        with self._cond:
+            self._stats['rate_limited'] += 1
+        self._buckets.update(model, headers, retry_after=retry_after if retry_after is not None else BACKOFF_BASE)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+            models = {model: len(queue) for model, queue in self._queues.items()}
+        stats['models'] = {model: {'waiting': waiting, **self._buckets.snapshot(model)}
+                           for model, waiting in models.items()}
+        return stats
+
+
+scheduler = GroqScheduler()
@@ -1,4 +1,25 @@
+import os
+import shutil
+import tempfile
+
 bind = "0.0.0.0:10000"
 workers = 4
-threads = 4
+# admission.py sizes its reserved thread lane from the same variable
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
 timeout = 120
+
+# Workers write their metrics here and /metrics adds them up (see metrics.py).
+# Set before the app is imported so prometheus_client picks it up in every worker.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'chiron-metrics'))
+
+
+def on_starting(server):
+    # Files left by a previous run would be added to this run's totals
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,359 @@
+import html
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import overpy
+from geopy.distance import geodesic
+
+import geohash
+from async_http import USER_AGENT, get_async_http_client
+from deadlines import DeadlineExceeded, upstream_timeout
+from geo_distance import haversine_km, nearest_indices
+from metrics import timed
+from concurrent_sources import run_in_background
+from facility_index import INDEXED_TAGS, get_facility_index
+from ttl_cache import TieredCache
+
+# OSM amenity values we return, mapped to the default name shown for unnamed facilities
+FACILITY_TYPES = {
+    'hospital': 'Hospital',
+    'pharmacy': 'Pharmacy',
+    'clinic': 'Clinic',
+}
+
+# Tags kept for each facility; everything else from OSM is dropped before caching
+FACILITY_TAGS = INDEXED_TAGS
+
+# Geohash precision 5 gives cells of roughly 4.9 km x 4.9 km
+TILE_PRECISION = int(os.getenv('FACILITY_TILE_PRECISION', '5'))
+# Tiles older than this are still served but refreshed in the background
+TILE_REFRESH_AGE = float(os.getenv('FACILITY_TILE_REFRESH_AGE', str(24 * 3600)))
+
+facility_tile_cache = TieredCache(
+    'facility_tiles',
+    ttl=float(os.getenv('FACILITY_TILE_TTL', str(7 * 24 * 3600))),
+    max_memory_entries=int(os.getenv('FACILITY_TILE_MEMORY_SIZE', '4096')),
+    max_disk_entries=int(os.getenv('FACILITY_TILE_DISK_SIZE', '200000')),
+)
+
+# Number of facilities returned when the caller does not pass a limit, and the maximum allowed
+DEFAULT_LIMIT = int(os.getenv('FACILITY_DEFAULT_LIMIT', '100'))
+MAX_LIMIT = int(os.getenv('FACILITY_MAX_LIMIT', '500'))
+# Overpass API endpoint (e.g. a local stand-in for benchmarks)
+OVERPASS_URL = os.getenv('OVERPASS_URL', overpy.Overpass.default_url)
+# Longest an Overpass query may run (server-side [timeout:] and client timeout), before the request deadline
+OVERPASS_TIMEOUT = float(os.getenv('OVERPASS_TIMEOUT', '25'))
+# Recompute the returned facilities' distances with an exact geodesic (only `limit` of them)
+GEODESIC_REFINE = os.getenv('FACILITY_GEODESIC_REFINE', '1') == '1'
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def build_tile_query(south: float, west: float, north: float, east: float,
+                     timeout: int = int(OVERPASS_TIMEOUT)) -> str:
+    """
+    Build one Overpass query for every facility type inside a bounding box,
+    asking the server to give up after timeout seconds.
+
+    Nodes are returned with their coordinates; ways and relations (hospital
+    campuses, buildings) are returned with tags and their centre only, so no
+    member nodes are downloaded.
+    """
+    amenities = '|'.join(FACILITY_TYPES)
+    area = f'["amenity"~"^({amenities})$"]({south},{west},{north},{east})'
+    return f"""
+    [out:json][timeout:{timeout}];
+    node{area}->.points;
+    (
+      way{area};
+      relation{area};
+    )->.areas;
+    .points out body qt;
+    .areas out tags center qt;
+    """
+
+
+def _element_coordinates(element) -> Optional[Tuple[float, float]]:
+    """Return (lat, lon) for a node, or the centre of a way or relation."""
+    if isinstance(element, overpy.Node):
+        return float(element.lat), float(element.lon)
+    if element.center_lat is None or element.center_lon is None:
+        return None
+    return float(element.center_lat), float(element.center_lon)
+
+
+def records_from_result(result: overpy.Result) -> List[Dict]:
+    """Convert an Overpass result into compact, cacheable facility records."""
+    records = []
+    for element in list(result.nodes) + list(result.ways) + list(result.relations):
+        if element.tags.get('amenity') not in FACILITY_TYPES:
+            continue
+        coords = _element_coordinates(element)
+        if coords is None:
+            continue
+        records.append({
+            'lat': coords[0],
+            'lon': coords[1],
+            'tags': {tag: element.tags[tag] for tag in FACILITY_TAGS if tag in element.tags},
+        })
+    return records
+
+
+def _facility_details(facility_type: str, tags: Dict[str, str]) -> Dict[str, str]:
+    details = {
+        'phone': tags.get('phone', 'Not available'),
+    }
+    if facility_type in ('hospital', 'clinic'):
+        details['emergency'] = tags.get('emergency', 'Unknown')
+        details['healthcare'] = tags.get('healthcare', 'General')
+    details.update({
+        'opening_hours': tags.get('opening_hours', 'Not specified'),
+        'website': tags.get('website', ''),
+        'wheelchair': tags.get('wheelchair', 'Unknown'),
+        'address': tags.get('addr:full', tags.get('addr:street', 'Address not available'))
+    })
+    return details
+
+
+def _build_facility(record: Dict, user_location: Tuple[float, float], distance: float) -> Dict:
+    tags = record['tags']
+    facility_type = tags['amenity']
+    name = tags.get('name', FACILITY_TYPES[facility_type])
+    return {
+        'type': facility_type,
+        'name': html.escape(name),
+        'lat': record['lat'],
+        'lon': record['lon'],
+        'distance': round(distance, 2),
+        'details': _facility_details(facility_type, tags),
+        'directions_url': f"https://www.google.com/maps/dir/?api=1&origin={user_location[0]},{user_location[1]}&destination={record['lat']},{record['lon']}&travelmode=driving"
+    }
+
+
+@timed('distance')
+def facilities_from_records(records: List[Dict], user_location: Tuple[float, float], radius: int,
+                            limit: int = DEFAULT_LIMIT) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Return the `limit` nearest facilities within radius metres, sorted by distance,
+    and the number of facilities of each type within the radius.
+
+    Distances are computed for all records at once with NumPy haversine and only
+    the nearest `limit` are selected; those are optionally refined with an exact
+    geodesic distance.
+    """
+    counts = {amenity: 0 for amenity in FACILITY_TYPES}
+    if not records:
+        return [], counts
+
+    lats = np.fromiter((record['lat'] for record in records), dtype=np.float64, count=len(records))
+    lons = np.fromiter((record['lon'] for record in records), dtype=np.float64, count=len(records))
+    distances = haversine_km(user_location, lats, lons)
+
+    within = np.flatnonzero(distances <= radius / 1000.0)
+    for index in within:
+        counts[records[index]['tags']['amenity']] += 1
+
+    nearest = within[nearest_indices(distances[within], limit)]
+    facilities = []
+    for index in nearest:
+        distance = float(distances[index])
+        if GEODESIC_REFINE:
+            distance = geodesic(user_location, (records[index]['lat'], records[index]['lon'])).kilometers
+        facilities.append(_build_facility(records[index], user_location, distance))
+
+    if GEODESIC_REFINE:
+        facilities.sort(key=lambda x: x['distance'])
+    return facilities, counts
+
+
+def _tile_key(tile: str, amenity: str) -> str:
+    return f"{tile}:{amenity}"
+
+
+def _tiles_for_radius(lat: float, lon: float, radius: int) -> List[str]:
+    """Return the geohash tiles covering a circle of radius metres."""
+    dlat = radius / 111320.0
+    dlon = radius / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+    return geohash.covering(lat - dlat, lon - dlon, lat + dlat, lon + dlon, TILE_PRECISION)
+
+
+def _tiles_bbox(tiles: List[str]) -> Tuple[float, float, float, float]:
+    """Return the (south, west, north, east) bounding box of a set of tiles."""
+    cells = [geohash.bounds(tile) for tile in tiles]
+    return (min(cell[0] for cell in cells), min(cell[1] for cell in cells),
+            max(cell[2] for cell in cells), max(cell[3] for cell in cells))
+
+
+def _store_tiles(tiles: List[str], result: overpy.Result) -> Dict[str, List[Dict]]:
+    """Split an Overpass result into tiles, cache every tile and return the records for each."""
+    print(f"Fetched {len(tiles)} facility tiles: {len(result.nodes)} nodes, "
+          f"{len(result.ways)} ways and {len(result.relations)} relations")
+
+    wanted = set(tiles)
+    by_tile = {tile: {amenity: [] for amenity in FACILITY_TYPES} for tile in tiles}
+    for record in records_from_result(result):
+        tile = geohash.encode(record['lat'], record['lon'], TILE_PRECISION)
+        if tile in wanted:
+            by_tile[tile][record['tags']['amenity']].append(record)
+
+    fetched_at = time.time()
+    for tile, amenities in by_tile.items():
+        for amenity, records in amenities.items():
+            facility_tile_cache.set(_tile_key(tile, amenity), {'fetched_at': fetched_at, 'records': records})
+
+    return {tile: [r for records in amenities.values() for r in records] for tile, amenities in by_tile.items()}
+
+
+def _overpass_request(tiles: List[str]) -> Tuple[bytes, float]:
+    """Return the query body for the tiles and the client timeout, both sized to the request deadline."""
+    timeout = upstream_timeout(OVERPASS_TIMEOUT, 'Overpass query')
+    query = build_tile_query(*_tiles_bbox(tiles), timeout=max(1, int(timeout)))
+    return query.encode('utf-8'), timeout
+
+
+def _parse_overpass_response(response: httpx.Response) -> overpy.Result:
+    # Raise the same errors overpy does, so callers handle the sync and async paths alike
+    if response.status_code == 429:
+        raise overpy.exception.OverpassTooManyRequests()
+    if response.status_code == 504:
+        raise overpy.exception.OverpassGatewayTimeout()
+    response.raise_for_status()
+    return overpy.Overpass().parse_json(response.content)
+
+
+@timed('overpass', upstream='overpass')
+def fetch_tiles(tiles: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Fetch facilities for the given tiles with one Overpass query over their
+    combined bounding box and store every tile (even empty ones) in the cache.
+    Returns the records for each tile.
+    """
+    body, timeout = _overpass_request(tiles)
+    # overpy's own query() has no client-side timeout, so post the query directly
+    response = httpx.post(OVERPASS_URL, content=body, timeout=timeout,
+                          headers={'User-Agent': USER_AGENT})
+    return _store_tiles(tiles, _parse_overpass_response(response))
+
+
+@timed('overpass', upstream='overpass')
+async def fetch_tiles_async(tiles: List[str]) -> Dict[str, List[Dict]]:
+    """Async version of fetch_tiles() using the shared httpx.AsyncClient."""
+    body, timeout = _overpass_request(tiles)
+    response = await get_async_http_client().post(OVERPASS_URL, content=body, timeout=timeout)
+    return _store_tiles(tiles, _parse_overpass_response(response))
+
+
+def _refresh_tiles(tiles: List[str]) -> None:
+    try:
+        fetch_tiles(tiles)
+    finally:
+        with _refreshing_lock:
+            _refreshing.difference_update(tiles)
+
+
+def _schedule_refresh(tiles: List[str]) -> None:
+    """Refresh stale tiles in the background, skipping tiles already being refreshed."""
+    with _refreshing_lock:
+        tiles = [tile for tile in tiles if tile not in _refreshing]
+        _refreshing.update(tiles)
+    if tiles:
+        run_in_background(_refresh_tiles, tiles)
+
+
+def _cached_tiles(tiles: List[str]) -> Tuple[List[Dict], List[str], List[str]]:
+    """Return (records from cached tiles, missing tiles, stale tiles)."""
+    now = time.time()
+    records = []
+    missing = []
+    stale = []
+
+    for tile in tiles:
+        entries = [facility_tile_cache.get(_tile_key(tile, amenity)) for amenity in FACILITY_TYPES]
+        if any(entry is None for entry in entries):
+            missing.append(tile)
+            continue
+        for entry in entries:
+            records.extend(entry['records'])
+            if now - entry['fetched_at'] > TILE_REFRESH_AGE and tile not in stale:
+                stale.append(tile)
+    return records, missing, stale
+
+
+# Overpass failures after which cached tiles alone are returned as a partial result
+_PARTIAL_ERRORS = (DeadlineExceeded, httpx.TimeoutException, overpy.exception.OverpassGatewayTimeout,
+                   overpy.exception.OverpassTooManyRequests)
+
+
+def _partial_or_raise(error: Exception, records: List[Dict], missing: List[str]) -> None:
+    """Keep going with the cached tiles if there are any; otherwise re-raise the fetch error."""
+    if not records:
+        raise error
+    print(f"Overpass fetch of {len(missing)} tiles failed ({type(error).__name__}); returning cached tiles only")
+
+
+def find_facilities(user_location: Tuple[float, float], radius: int,
+                    limit: int = DEFAULT_LIMIT) -> Tuple[List[Dict], Dict[str, int], bool]:
+    """
+    Return the nearest `limit` hospitals, pharmacies and clinics within radius
+    metres of the user, the count of each type within the radius, and whether
+    the result is partial.
+
+    Points inside the offline index (FACILITY_INDEX_DIR) are answered from it.
+    Cached geohash tiles are combined and filtered by distance; only missing
+    tiles are fetched from Overpass, and stale tiles refresh in the background.
+    If the fetch runs out of time or Overpass is rate limiting, the cached
+    tiles alone are returned as a partial result.
+    """
+    index = get_facility_index()
+    if index is not None and index.contains(user_location[0], user_location[1]):
+        records = index.query(user_location[0], user_location[1], radius)
+        return (*facilities_from_records(records, user_location, radius, limit), False)
+
+    tiles = _tiles_for_radius(user_location[0], user_location[1], radius)
+    records, missing, stale = _cached_tiles(tiles)
+
+    partial = False
+    if missing:
+        try:
+            for tile_records in fetch_tiles(missing).values():
+                records.extend(tile_records)
+        except _PARTIAL_ERRORS as e:
+            _partial_or_raise(e, records, missing)
+            partial = True
+    if stale:
+        _schedule_refresh(stale)
+
+    print(f"Facility tiles: {len(tiles) - len(missing)} cached, {len(missing)} fetched, {len(stale)} stale")
+    return (*facilities_from_records(records, user_location, radius, limit), partial)
+
+
+async def find_facilities_async(user_location: Tuple[float, float], radius: int,
+                                limit: int = DEFAULT_LIMIT) -> Tuple[List[Dict], Dict[str, int], bool]:
+    """Async version of find_facilities(); only the Overpass fetch for missing tiles awaits."""
+    index = get_facility_index()
+    if index is not None and index.contains(user_location[0], user_location[1]):
+        records = index.query(user_location[0], user_location[1], radius)
+        return (*facilities_from_records(records, user_location, radius, limit), False)
+
+    tiles = _tiles_for_radius(user_location[0], user_location[1], radius)
+    records, missing, stale = _cached_tiles(tiles)
+
+    partial = False
+    if missing:
+        try:
+            for tile_records in (await fetch_tiles_async(missing)).values():
+                records.extend(tile_records)
+        except _PARTIAL_ERRORS as e:
+            _partial_or_raise(e, records, missing)
+            partial = True
+    if stale:
+        _schedule_refresh(stale)
+
+    print(f"Facility tiles: {len(tiles) - len(missing)} cached, {len(missing)} fetched, {len(stale)} stale")
+    return (*facilities_from_records(records, user_location, radius, limit), partial)
@@ -0,0 +1,320 @@
+"""
+Single entry point for Groq chat completions.
+
+Call sites pass their name (see model_router.SITES) instead of a model and
+sampling parameters; the router picks the model, and calls that fail with a
+rate limit, timeout, connection error or server error fail over to the next
+model on the route. Every call first waits for the model's shared rate-limit
+budget (see groq_scheduler).
+
+Non-streaming calls that run past the model's observed p95 latency are hedged
+with a duplicate request, and each model has a circuit breaker: once every
+model on a route is failing, calls raise CircuitOpenError at once instead of
+waiting for timeouts.
+"""
+import asyncio
+import functools
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import groq
+
+from deadlines import DeadlineExceeded, cap, remaining, upstream_timeout
+from groq_client import READ_TIMEOUT, get_async_groq_client, get_groq_client
+from groq_scheduler import BACKOFF_MAX, RATE_LIMIT_RETRIES, backoff_delay, estimate_tokens, scheduler
+from metrics import record_llm_call, record_tokens, record_upstream_error
+from model_router import get_site_config, router
+from rate_limit import RateLimitTimeout
+from resilience import (CircuitOpenError, HedgeBudget, breaker_stats, get_breaker,
+                        hedged_call, hedged_call_async)
+
+# Extra models tried after the first one fails with a retryable error
+MAX_FAILOVERS = int(os.getenv('LLM_MAX_FAILOVERS', '2'))
+
+# Hedge calls that outlast the model's rolling p95 latency (but never before LLM_HEDGE_MIN_DELAY seconds)
+HEDGE_ENABLED = os.getenv('LLM_HEDGE', '1') == '1'
+HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '1.0'))
+# Send the hedge to the next model on the route instead of repeating the same model
+HEDGE_OTHER_MODEL = os.getenv('LLM_HEDGE_OTHER_MODEL', '0') == '1'
+
+# Errors that say nothing about the request itself, so another model may succeed
+FAILOVER_ERRORS = (
+    groq.RateLimitError,
+    groq.APITimeoutError,
+    groq.APIConnectionError,
+    groq.InternalServerError,
+    groq.NotFoundError,  # Model decommissioned or not enabled for this key
+)
+
+hedge_budget = HedgeBudget()
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when no Groq client could be created (e.g. GROQ_API_KEY is missing)."""
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _breaker(model: str):
+    return get_breaker(f"groq:{model}")
+
+
+def _record_failure(site: str, model: str, start: float, error: Exception) -> None:
+    rate_limited = isinstance(error, groq.RateLimitError)
+    router.record(model, time.perf_counter() - start, ok=False,
+                  rate_limited=rate_limited, retry_after=_retry_after(error))
+    # A rate limit means the model is up; the router's cooldown already covers it
+    if not rate_limited:
+        _breaker(model).record_failure()
+    record_upstream_error('groq', error)
+    print(f"LLM call for {site} failed on {model}: {str(error)}")
+
+
+def _record_success(model: str, start: float, stream: bool) -> None:
+    # Opening a stream only measures time to first byte, which would skew the latency window
+    router.record(model, None if stream else time.perf_counter() - start, ok=True)
+    _breaker(model).record_success()
+
+
+def _used_tokens(response: Any) -> Optional[int]:
+    """Total tokens reported by a completion (streams report usage in their last chunk instead)."""
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+
+def _chunk_usage(chunk: Any) -> Any:
+    """Token usage carried by a stream chunk (Groq sends it in the last chunk's x_groq field)."""
+    return getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+
+
+def _stream_usage(model: str, chunk: Any, reserved: int) -> None:
+    """Count a chunk's token usage and return the unused part of the call's rate-limit reservation."""
+    usage = _chunk_usage(chunk)
+    if usage is not None:
+        record_tokens(model, usage)
+        scheduler.refund_unused(model, reserved, getattr(usage, 'total_tokens', None))
+
+
+def _timed_stream(stream: Any, site: str, model: str, start: float, reserved: int) -> Iterator[Any]:
+    """Pass a stream's chunks through, recording time to first token, total time and tokens."""
+    first_token = None
+    for chunk in stream:
+        if first_token is None and chunk.choices and chunk.choices[0].delta.content:
+            first_token = time.perf_counter() - start
+        _stream_usage(model, chunk, reserved)
+        yield chunk
+    record_llm_call(site, model, True, time.perf_counter() - start, first_token)
+
+
+async def _timed_stream_async(stream: Any, site: str, model: str, start: float, reserved: int) -> AsyncIterator[Any]:
+    """Async version of _timed_stream()."""
+    first_token = None
+    async for chunk in stream:
+        if first_token is None and chunk.choices and chunk.choices[0].delta.content:
+            first_token = time.perf_counter() - start
+        _stream_usage(model, chunk, reserved)
+        yield chunk
+    record_llm_call(site, model, True, time.perf_counter() - start, first_token)
+
+
+def _request(site: str, messages: List[Dict[str, str]], stream: bool, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    config = get_site_config(site)
+    params = {'messages': messages, 'temperature': config['temperature'], 'max_tokens': config['max_tokens']}
+    if stream:
+        params['stream'] = True
+    params.update(overrides)
+    return params
+
+
+def _hedge_plan(models: List[str], index: int, stream: bool):
+    """Return (hedge model, delay) for the call to models[index], or (None, None) to not hedge."""
+    if not HEDGE_ENABLED or stream:
+        return None, None
+    model = models[index]
+    p95 = router.p95(model)
+    if p95 is None:
+        return None, None
+    delay = max(p95, HEDGE_MIN_DELAY)
+    left = remaining()
+    if left is not None and delay >= left:
+        return None, None
+    hedge_model = model
+    if HEDGE_OTHER_MODEL:
+        hedge_model = next((m for m in models[index + 1:] if _breaker(m).state == 'closed'), model)
+    return hedge_model, delay
+
+
+def _circuit_open(site: str, models: List[str]) -> CircuitOpenError:
+    retry_after = min((_breaker(m).retry_after() for m in models), default=0.0)
+    return CircuitOpenError(f"The AI service for {site} is failing; try again in {int(retry_after) + 1}s",
+                            retry_after=retry_after)
+
+
+def _attempt(client, site: str, model: str, params: Dict[str, Any], priority: str,
+             max_wait: Optional[float] = None) -> Any:
+    """
+    One call to one model: wait for rate-limit budget, send with a timeout sized to
+    the request deadline, and retry short 429s with jittered backoff.
+    """
+    reserved = estimate_tokens(params['messages']) + params.get('max_tokens', 0)
+    for retry in range(RATE_LIMIT_RETRIES + 1):
+        scheduler.acquire(model, reserved, priority, max_wait)
+        timeout = upstream_timeout(READ_TIMEOUT, f"Groq call to {model}")
+        start = time.perf_counter()
+        try:
+            raw = client.chat.completions.with_raw_response.create(model=model, timeout=timeout, **params)
+        except groq.APITimeoutError as e:
+            if timeout < READ_TIMEOUT:
+                # Cut short by the request deadline, not the model's fault
+                raise DeadlineExceeded(f"Groq call to {model} ran past the request deadline") from e
+            _record_failure(site, model, start, e)
+            raise
+        except groq.RateLimitError as e:
+            retry_after = _retry_after(e)
+            scheduler.record_rate_limited(model, e.response.headers, retry_after)
+            if retry < RATE_LIMIT_RETRIES and (retry_after or 0) <= BACKOFF_MAX:
+                record_upstream_error('groq', e)
+                time.sleep(cap(backoff_delay(retry, retry_after)))
+                continue
+            _record_failure(site, model, start, e)
+            raise
+        except FAILOVER_ERRORS as e:
+            _record_failure(site, model, start, e)
+            raise
+        response = raw.parse()
+        scheduler.record_response(model, raw.headers, reserved, _used_tokens(response))
+        _record_success(model, start, params.get('stream', False))
+        if params.get('stream'):
+            return _timed_stream(response, site, model, start, reserved)
+        record_llm_call(site, model, False, time.perf_counter() - start)
+        record_tokens(model, getattr(response, 'usage', None))
+        return response
+
+
+async def _attempt_async(client, site: str, model: str, params: Dict[str, Any], priority: str,
+                         max_wait: Optional[float] = None) -> Any:
+    """Async version of _attempt()."""
+    reserved = estimate_tokens(params['messages']) + params.get('max_tokens', 0)
+    for retry in range(RATE_LIMIT_RETRIES + 1):
+        await scheduler.acquire_async(model, reserved, priority, max_wait)
+        timeout = upstream_timeout(READ_TIMEOUT, f"Groq call to {model}")
+        start = time.perf_counter()
+        try:
+            raw = await client.chat.completions.with_raw_response.create(model=model, timeout=timeout, **params)
+        except groq.APITimeoutError as e:
+            if timeout < READ_TIMEOUT:
+                # Cut short by the request deadline, not the model's fault
+                raise DeadlineExceeded(f"Groq call to {model} ran past the request deadline") from e
+            _record_failure(site, model, start, e)
+            raise
+        except groq.RateLimitError as e:
+            retry_after = _retry_after(e)
+            scheduler.record_rate_limited(model, e.response.headers, retry_after)
+            if retry < RATE_LIMIT_RETRIES and (retry_after or 0) <= BACKOFF_MAX:
+                record_upstream_error('groq', e)
+                await asyncio.sleep(cap(backoff_delay(retry, retry_after)))
+                continue
+            _record_failure(site, model, start, e)
+            raise
+        except FAILOVER_ERRORS as e:
+            _record_failure(site, model, start, e)
+            raise
+        response = await raw.parse()
+        scheduler.record_response(model, raw.headers, reserved, _used_tokens(response))
+        _record_success(model, start, params.get('stream', False))
+        if params.get('stream'):
+            return _timed_stream_async(response, site, model, start, reserved)
+        record_llm_call(site, model, False, time.perf_counter() - start)
+        record_tokens(model, getattr(response, 'usage', None))
+        return response
+
+
+def chat_completion(site: str, messages: List[Dict[str, str]], stream: bool = False, **overrides) -> Any:
+    """
+    Create a chat completion for a call site, returning the Groq response (or stream).
+    Raises LLMUnavailable without a client, CircuitOpenError if every model's
+    breaker is open, DeadlineExceeded once the request deadline is too close,
+    or the last error if every model failed.
+    """
+    client = get_groq_client()
+    if not client:
+        raise LLMUnavailable("Failed to initialize the AI service. Please check your API key.")
+
+    params = _request(site, messages, stream, overrides)
+    priority = get_site_config(site)['priority']
+    models = router.route(site)
+    attempts = 0
+    last_error: Optional[Exception] = None
+    for index, model in enumerate(models):
+        if attempts > MAX_FAILOVERS:
+            break
+        if not _breaker(model).allow():
+            continue
+        attempts += 1
+        hedge_model, delay = _hedge_plan(models, index, stream)
+        try:
+            return hedged_call(
+                functools.partial(_attempt, client, site, model, params, priority),
+                # A hedge is only worth sending if the budget allows it right away
+                functools.partial(_attempt, client, site, hedge_model, params, priority, 0) if hedge_model else None,
+                delay, hedge_budget,
+            )
+        except FAILOVER_ERRORS + (RateLimitTimeout,) as e:
+            # Out of budget on this model: its rate limits are separate from the next one's
+            last_error = e
+    if last_error is None:
+        raise _circuit_open(site, models)
+    raise last_error
+
+
+async def chat_completion_async(site: str, messages: List[Dict[str, str]], stream: bool = False,
+                                **overrides) -> Any:
+    """Async version of chat_completion() using the AsyncGroq client."""
+    client = get_async_groq_client()
+    if not client:
+        raise LLMUnavailable("Failed to initialize the AI service. Please check your API key.")
+
+    params = _request(site, messages, stream, overrides)
+    priority = get_site_config(site)['priority']
+    models = router.route(site)
+    attempts = 0
+    last_error: Optional[Exception] = None
+    for index, model in enumerate(models):
+        if attempts > MAX_FAILOVERS:
+            break
+        if not _breaker(model).allow():
+            continue
+        attempts += 1
+        hedge_model, delay = _hedge_plan(models, index, stream)
+        try:
+            return await hedged_call_async(
+                functools.partial(_attempt_async, client, site, model, params, priority),
+                # A hedge is only worth sending if the budget allows it right away
+                functools.partial(_attempt_async, client, site, hedge_model, params, priority, 0) if hedge_model else None,
+                delay, hedge_budget,
+            )
+        except FAILOVER_ERRORS + (RateLimitTimeout,) as e:
+            # Out of budget on this model: its rate limits are separate from the next one's
+            last_error = e
+    if last_error is None:
+        raise _circuit_open(site, models)
+    raise last_error
+
+
+def stats() -> Dict[str, Any]:
+    """Routing, circuit breaker, hedging and rate-limit budget state for /health."""
+    return {
+        **router.stats(),
+        'breakers': breaker_stats(),
+        'hedging': hedge_budget.stats(),
+        'rate_limits': scheduler.stats(),
+    }
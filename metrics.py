@@ -0,0 +1,140 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Latency histograms per route and per stage of request handling (geocode,
+Overpass query, distance computation, drug database lookup, JSON
+serialization), Groq time to first token and total time per model, and
+counters for cache lookups, upstream errors and tokens used per model.
+
+Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(gunicorn_config.py sets it up) and /metrics adds up the files of all
+workers, so whichever worker answers the scrape reports the whole server.
+Without that variable each process serves its own metrics.
+"""
+import asyncio
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# Seconds; from cache hits up to the longest allowed Groq call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+REQUEST_LATENCY = Histogram(
+    'chiron_request_duration_seconds', 'Time from receiving a request until its response has been sent',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+STAGE_LATENCY = Histogram(
+    'chiron_stage_duration_seconds', 'Time spent in one stage of handling a request',
+    ['stage'], buckets=LATENCY_BUCKETS)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    'chiron_llm_time_to_first_token_seconds', 'Time until the first token of a streamed Groq completion',
+    ['site', 'model'], buckets=LATENCY_BUCKETS)
+LLM_LATENCY = Histogram(
+    'chiron_llm_duration_seconds', 'Time until a Groq completion has been fully received',
+    ['site', 'model', 'stream'], buckets=LATENCY_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    'chiron_cache_lookups_total', 'Cache lookups by cache and result (memory_hit, disk_hit, miss, ...)',
+    ['cache', 'result'])
+UPSTREAM_ERRORS = Counter(
+    'chiron_upstream_errors_total', 'Failed calls to Groq, Nominatim and Overpass by error type',
+    ['upstream', 'error'])
+LLM_TOKENS = Counter(
+    'chiron_llm_tokens_total', 'Tokens used by Groq completions',
+    ['model', 'kind'])
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_LATENCY.labels(stage=name).observe(seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as one stage (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def timed(name: str, upstream: Optional[str] = None) -> Callable:
+    """
+    Decorator timing every call of a function (sync or async) as a stage;
+    with upstream, exceptions it raises are also counted as that upstream's errors.
+    """
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        if upstream:
+                            record_upstream_error(upstream, e)
+                        raise
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if upstream:
+                        record_upstream_error(upstream, e)
+                    raise
+        return wrapper
+    return decorator
+
+
+def observe_request(route: str, method: str, status: int, start: float) -> None:
+    REQUEST_LATENCY.labels(route=route, method=method, status=str(status)).observe(time.perf_counter() - start)
+
+
+def record_cache_lookup(cache: str, result: str) -> None:
+    CACHE_LOOKUPS.labels(cache=cache, result=result).inc()
+
+
+def record_upstream_error(upstream: str, error: BaseException) -> None:
+    UPSTREAM_ERRORS.labels(upstream=upstream, error=type(error).__name__).inc()
+
+
+def record_llm_call(site: str, model: str, stream: bool, total: float, first_token: Optional[float] = None) -> None:
+    """Record a completed Groq call; first_token is only measured for streams."""
+    LLM_LATENCY.labels(site=site, model=model, stream=str(stream).lower()).observe(total)
+    if first_token is not None:
+        LLM_TIME_TO_FIRST_TOKEN.labels(site=site, model=model).observe(first_token)
+
+
+def record_tokens(model: str, usage: Any) -> None:
+    """Count prompt and completion tokens from a Groq usage object (ignored if None)."""
+    if usage is None:
+        return
+    for kind in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{kind}_tokens', None)
+        if tokens:
+            LLM_TOKENS.labels(model=model, kind=kind).inc(tokens)
+
+
+def timed_json_provider(base: type) -> type:
+    """Subclass of a Flask or Quart JSON provider class that times dumps() as the json_serialization stage."""
+    class TimedJSONProvider(base):
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            with stage('json_serialization'):
+                return super().dumps(obj, **kwargs)
+    return TimedJSONProvider
+
+
+def render() -> Tuple[bytes, str]:
+    """Return the metrics page and its content type, aggregated across workers in multiprocess mode."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,207 @@
+"""
+Model tiers, per-endpoint model settings and latency-aware routing.
+
+Every LLM call names its call site (e.g. 'followup_question'); the site's
+configuration gives its tier, temperature and max_tokens. The router orders the
+tier's models by health, using a rolling window of latency and errors per
+model, and falls back to the other tier when a whole tier is slow or
+rate limited.
+
+Override per site with environment variables, e.g.
+
+    LLM_TIER_FOLLOWUP_QUESTION=capable
+    LLM_MODEL_SYMPTOM_ANALYSIS=llama3-8b-8192
+    LLM_MAX_TOKENS_PERSONALIZED_MEDICATION=2000
+    GROQ_MODELS_FAST=llama3-8b-8192,gemma-7b-it
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from groq_health import get_cached_status
+
+
+def _models_from_env(name: str, default: str) -> List[str]:
+    return [model.strip() for model in os.getenv(name, default).split(',') if model.strip()]
+
+
+# Models in each tier, most preferred first
+TIERS: Dict[str, List[str]] = {
+    'fast': _models_from_env('GROQ_MODELS_FAST', 'llama3-8b-8192,gemma-7b-it'),
+    'capable': _models_from_env('GROQ_MODELS_CAPABLE', 'llama3-70b-8192,mixtral-8x7b-32768'),
+}
+
+# Tier tried when every model of a call site's own tier is unhealthy
+FALLBACK_TIER = {'capable': 'fast', 'fast': 'capable'}
+
+# A model is considered slow when its rolling p95 latency exceeds this many seconds
+SLOW_P95_SECONDS = {
+    'fast': float(os.getenv('LLM_SLOW_P95_FAST', '8')),
+    'capable': float(os.getenv('LLM_SLOW_P95_CAPABLE', '25')),
+}
+# ...and failing when more than this fraction of its recent calls failed
+MAX_ERROR_RATE = float(os.getenv('LLM_MAX_ERROR_RATE', '0.5'))
+# Calls in the window before latency and error rate are trusted
+MIN_SAMPLES = int(os.getenv('LLM_MIN_SAMPLES', '5'))
+# Rolling window: the last WINDOW_SIZE calls within WINDOW_SECONDS
+WINDOW_SIZE = int(os.getenv('LLM_STATS_WINDOW', '200'))
+WINDOW_SECONDS = float(os.getenv('LLM_STATS_WINDOW_SECONDS', '300'))
+# How long a rate-limited model is skipped when Groq does not say
+DEFAULT_RATE_LIMIT_COOLDOWN = float(os.getenv('LLM_RATE_LIMIT_COOLDOWN', '20'))
+
+# Call sites: tier, sampling parameters, whether the router may move the site to the fallback tier,
+# and the site's queueing priority for the rate-limit scheduler ('interactive' or 'batch')
+_SITE_DEFAULTS: Dict[str, Dict] = {
+    'symptom_analysis': {'tier': 'capable', 'temperature': 0.5, 'max_tokens': 1000,
+                         'allow_fallback_tier': True, 'priority': 'interactive'},
+    'drug_interaction': {'tier': 'capable', 'temperature': 0.3, 'max_tokens': 1000,
+                         'allow_fallback_tier': True, 'priority': 'interactive'},
+    'personalized_medication': {'tier': 'capable', 'temperature': 0.3, 'max_tokens': 1500,
+                                'allow_fallback_tier': True, 'priority': 'interactive'},
+    'health_assessment': {'tier': 'capable', 'temperature': 0.3, 'max_tokens': 800,
+                          'allow_fallback_tier': True, 'priority': 'interactive'},
+    'followup_question': {'tier': 'fast', 'temperature': 0.4, 'max_tokens': 150,
+                          'allow_fallback_tier': True, 'priority': 'interactive'},
+}
+
+
+def _site_config(site: str) -> Dict:
+    config = dict(_SITE_DEFAULTS[site])
+    env = site.upper()
+    config['tier'] = os.getenv(f'LLM_TIER_{env}', config['tier'])
+    if config['tier'] not in TIERS:
+        raise ValueError(f"Unknown model tier '{config['tier']}' for {site}")
+    config['model'] = os.getenv(f'LLM_MODEL_{env}') or None
+    config['priority'] = os.getenv(f'LLM_PRIORITY_{env}', config['priority'])
+    if config['priority'] not in ('interactive', 'batch'):
+        raise ValueError(f"Unknown priority '{config['priority']}' for {site}")
+    config['temperature'] = float(os.getenv(f'LLM_TEMPERATURE_{env}', str(config['temperature'])))
+    config['max_tokens'] = int(os.getenv(f'LLM_MAX_TOKENS_{env}', str(config['max_tokens'])))
+    return config
+
+
+SITES: Dict[str, Dict] = {site: _site_config(site) for site in _SITE_DEFAULTS}
+
+
+def get_site_config(site: str) -> Dict:
+    """Return the tier, model pin, temperature, max_tokens and priority for a call site."""
+    return SITES[site]
+
+
+def primary_model(site: str) -> str:
+    """The configured first-choice model for a site (used in cache keys, not for routing)."""
+    config = SITES[site]
+    return config['model'] or TIERS[config['tier']][0]
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 3)
+
+
+class ModelStats:
+    """Rolling latency and error window for one model."""
+
+    def __init__(self):
+        self.calls = deque(maxlen=WINDOW_SIZE)  # (finished_at, latency_seconds or None, ok)
+        self.rate_limited_until = 0.0
+
+    def _recent(self, now: float):
+        return [call for call in self.calls if now - call[0] <= WINDOW_SECONDS]
+
+    def summary(self, now: float) -> Dict:
+        recent = self._recent(now)
+        latencies = [call[1] for call in recent if call[2] and call[1] is not None]
+        errors = sum(1 for call in recent if not call[2])
+        return {
+            'calls': len(recent),
+            'timed_calls': len(latencies),
+            'p50_s': _percentile(latencies, 0.5),
+            'p95_s': _percentile(latencies, 0.95),
+            'error_rate': round(errors / len(recent), 3) if recent else None,
+            'rate_limited_for_s': max(0.0, round(self.rate_limited_until - now, 1)),
+        }
+
+
+class ModelRouter:
+    def __init__(self):
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _model_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def record(self, model: str, latency: Optional[float], ok: bool, rate_limited: bool = False,
+               retry_after: Optional[float] = None) -> None:
+        """Record the outcome of one call to model (latency None: not comparable, e.g. a stream opening)."""
+        now = time.time()
+        with self._lock:
+            stats = self._model_stats(model)
+            stats.calls.append((now, latency, ok))
+            if rate_limited:
+                stats.rate_limited_until = now + (retry_after or DEFAULT_RATE_LIMIT_COOLDOWN)
+
+    def p95(self, model: str) -> Optional[float]:
+        """Rolling p95 latency of successful calls to model, once there are enough samples."""
+        now = time.time()
+        with self._lock:
+            summary = self._model_stats(model).summary(now)
+        return summary['p95_s'] if summary['timed_calls'] >= MIN_SAMPLES else None
+
+    def _is_healthy(self, model: str, tier: str, now: float) -> bool:
+        stats = self._model_stats(model)
+        if stats.rate_limited_until > now:
+            return False
+        summary = stats.summary(now)
+        if summary['calls'] < MIN_SAMPLES:
+            return True
+        if summary['error_rate'] > MAX_ERROR_RATE:
+            return False
+        return summary['p95_s'] is None or summary['p95_s'] <= SLOW_P95_SECONDS[tier]
+
+    def route(self, site: str) -> List[str]:
+        """
+        Return the models to try for a call site, best first.
+
+        Healthy models of the site's tier come first (a pinned model leads), then,
+        if the site allows it, healthy models of the fallback tier, then the
+        unhealthy ones as a last resort. Models the health monitor reports as
+        unavailable are skipped.
+        """
+        config = SITES[site]
+        tier = config['tier']
+        primary = ([config['model']] if config['model'] else []) + [m for m in TIERS[tier] if m != config['model']]
+        fallback_tier = FALLBACK_TIER[tier] if config['allow_fallback_tier'] else None
+        fallback = [m for m in TIERS[fallback_tier] if m not in primary] if fallback_tier else []
+
+        status = get_cached_status()
+        if status['status'] == 'ok' and status['models']:
+            available = set(status['models'])
+            primary = [m for m in primary if m in available] or primary
+            fallback = [m for m in fallback if m in available]
+
+        now = time.time()
+        with self._lock:
+            healthy = [m for m in primary if self._is_healthy(m, tier, now)]
+            healthy_fallback = [m for m in fallback if self._is_healthy(m, fallback_tier, now)]
+        unhealthy = [m for m in primary + fallback if m not in healthy and m not in healthy_fallback]
+        return healthy + healthy_fallback + unhealthy
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            models = {model: stats.summary(now) for model, stats in self._stats.items()}
+        return {
+            'models': models,
+            'sites': {site: {'tier': config['tier'], 'route': self.route(site)} for site, config in SITES.items()},
+        }
+
+
+router = ModelRouter()
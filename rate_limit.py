@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to limiting within the process only
+    fcntl = None
+
+from ttl_cache import CACHE_DIR
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a caller could not get a slot within its maximum wait."""
+
+
+class IntervalRateLimiter:
+    """
+    Enforce a minimum interval between calls across all threads and, where
+    file locking is available, across all worker processes on the host.
+
+    Callers queue up instead of failing: acquire() blocks until a slot is
+    free or max_wait seconds have passed.
+    """
+
+    def __init__(self, name: str, min_interval: float, lock_path: Optional[str] = None):
+        self.name = name
+        self.min_interval = min_interval
+        self.lock_path = lock_path or os.path.join(CACHE_DIR, f"{name}.ratelimit")
+        self._lock = threading.Lock()
+        self._last_call = 0.0
+
+    def _acquire_local(self, deadline: float) -> None:
+        if not self._lock.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise RateLimitTimeout(f"Timed out waiting for the {self.name} rate limiter")
+
+    def acquire(self, max_wait: float = 30.0) -> None:
+        """Block until this process may make the next call."""
+        deadline = time.monotonic() + max_wait
+        self._acquire_local(deadline)
+        try:
+            if fcntl is None:
+                self._wait_for_slot(self._last_call, deadline)
+                self._last_call = time.time()
+                return
+            self._acquire_shared(deadline)
+        finally:
+            self._lock.release()
+
+    def _wait_for_slot(self, last_call: float, deadline: float) -> None:
+        wait = last_call + self.min_interval - time.time()
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimitTimeout(f"Timed out waiting for the {self.name} rate limiter")
+        time.sleep(wait)
+
+    def _acquire_shared(self, deadline: float) -> None:
+        """Use a lock file holding the last call time, shared by every worker."""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a+') as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        raise RateLimitTimeout(f"Timed out waiting for the {self.name} rate limiter")
+                    time.sleep(0.05)
+            try:
+                f.seek(0)
+                content = f.read().strip()
+                last_call = float(content) if content else 0.0
+                self._wait_for_slot(last_call, deadline)
+                f.seek(0)
+                f.truncate()
+                f.write(repr(time.time()))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
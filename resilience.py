@@ -0,0 +1,242 @@
+"""
+Hedged requests and circuit breakers for slow or failing upstreams.
+
+hedged_call() starts a duplicate of a call that is taking longer than usual
+and returns whichever finishes first; CircuitBreaker stops sending calls to an
+upstream after repeated failures so callers fail fast instead of waiting out
+the full timeout. Breaker state is per worker process.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Hedges allowed per call (token bucket), so a slow upstream is not sent twice the load
+HEDGE_RATIO = float(os.getenv('HEDGE_RATIO', '0.1'))
+HEDGE_BURST = float(os.getenv('HEDGE_BURST', '10'))
+# Threads that run calls which may be hedged (per worker)
+HEDGE_THREADS = int(os.getenv('HEDGE_THREADS', '32'))
+
+# Consecutive failures that open a breaker, and how long it stays open before one trial call
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass. After BREAKER_FAILURES consecutive failures the breaker
+    opens and calls are refused for BREAKER_RESET_SECONDS; then one trial call
+    is let through (half open), and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'open' if now - self._opened_at < self.reset_seconds else 'half_open'
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a trial call through (0 when closed)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; in the half-open state only one trial call at a time may."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == 'closed':
+                return True
+            # A trial whose outcome was never recorded (e.g. cancelled) expires after one reset period
+            if state == 'half_open' and (self._trial_started is None or
+                                         now - self._trial_started > self.reset_seconds):
+                self._trial_started = now
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._consecutive_failures += 1
+            # A failed trial re-opens the breaker; calls already in flight when it opened change nothing
+            if self._trial_started is not None or (self._opened_at is None and
+                                                   self._consecutive_failures >= self.failures):
+                print(f"Circuit breaker '{self.name}' opened after {self._consecutive_failures} consecutive failures")
+                self._stats['opened'] += 1
+                self._opened_at = now
+                self._trial_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._state(time.monotonic())
+            stats['consecutive_failures'] = self._consecutive_failures
+        return stats
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for an upstream, creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
+
+
+class HedgeBudget:
+    """Token bucket: each call earns HEDGE_RATIO tokens (up to HEDGE_BURST), each hedge spends one."""
+
+    def __init__(self, ratio: float = HEDGE_RATIO, burst: float = HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'hedged': 0, 'hedge_won': 0, 'over_budget': 0}
+
+    def record_call(self) -> None:
+        with self._lock:
+            self._stats['calls'] += 1
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._stats['hedged'] += 1
+                return True
+            self._stats['over_budget'] += 1
+            return False
+
+    def record_hedge_won(self) -> None:
+        with self._lock:
+            self._stats['hedge_won'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Per-process pool for hedgeable calls (a forked worker builds its own)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix='hedge')
+                _executor_pid = pid
+    return _executor
+
+
+def hedged_call(call: Callable[[], Any], hedge: Optional[Callable[[], Any]], delay: Optional[float],
+                budget: HedgeBudget) -> Any:
+    """
+    Run call(); if it has not finished after delay seconds, also start hedge()
+    and return the first successful result (or raise the original call's error).
+
+    A losing synchronous call cannot be interrupted: it finishes in the
+    background and its result is dropped. Without a hedge or delay, call()
+    simply runs on the caller's thread.
+    """
+    budget.record_call()
+    if hedge is None or delay is None:
+        return call()
+
+    executor = _get_executor()
+    # Each call runs in a copy of the caller's context (request deadlines and the like)
+    first = executor.submit(contextvars.copy_context().run, call)
+    done, _ = wait([first], timeout=delay)
+    if done or not budget.try_acquire():
+        return first.result()
+
+    second = executor.submit(contextvars.copy_context().run, hedge)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                if future is second:
+                    budget.record_hedge_won()
+                return future.result()
+    # Both failed: the original call's error is the meaningful one
+    raise first.exception()
+
+
+async def hedged_call_async(call: Callable[[], Awaitable[Any]], hedge: Optional[Callable[[], Awaitable[Any]]],
+                            delay: Optional[float], budget: HedgeBudget) -> Any:
+    """Async version of hedged_call(); the losing call is cancelled."""
+    budget.record_call()
+    if hedge is None or delay is None:
+        return await call()
+
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not budget.try_acquire():
+            return await first
+
+        second = asyncio.ensure_future(hedge())
+        tasks.append(second)
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        budget.record_hedge_won()
+                    return task.result()
+        raise first.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,18 @@
+"""
+Request limits and deadlines shared by the sync (app.py) and async (async_app.py) apps.
+
+Kept apart from app.py so the async worker can use them without importing the
+Flask app, its health monitor and its thread-based admission controller.
+"""
+import os
+
+# Per-source deadlines (seconds) for the /drug-interaction lookups
+DB_LOOKUP_DEADLINE = float(os.getenv('DB_LOOKUP_DEADLINE', '2'))
+AI_ANALYSIS_DEADLINE = float(os.getenv('AI_ANALYSIS_DEADLINE', '45'))
+
+# Largest medication list accepted by /drug-interaction/batch
+MAX_BATCH_MEDICATIONS = int(os.getenv('MAX_BATCH_MEDICATIONS', '50'))
+
+# Number of drug name suggestions returned by /drug-interaction/suggest by default, and at most
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
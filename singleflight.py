@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the process only
+    fcntl = None
+
+from deadlines import DeadlineExceeded, cap, remaining
+from ttl_cache import CACHE_DIR, TieredCache
+
+# Share in-flight calls between gunicorn workers through lock files (0 = per worker only)
+SHARED = os.getenv('SINGLEFLIGHT_SHARED', '0') == '1'
+# How long a finished result stays available to followers in other workers
+RESULT_TTL = float(os.getenv('SINGLEFLIGHT_RESULT_TTL', '30'))
+# Longest a follower in another worker waits for the leader before calling upstream itself
+MAX_WAIT = float(os.getenv('SINGLEFLIGHT_MAX_WAIT', '90'))
+
+_POLL_INTERVAL = 0.05
+# Remove old per-key lock files once every this many shared calls
+_SWEEP_INTERVAL = 256
+
+
+def make_key(*parts: Any) -> str:
+    """Hash the model, parameters and normalized input of a call into a flight key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class _StreamCall:
+    """Chunks of a streamed call so far, replayed to the identical calls that join it."""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.cond = threading.Condition()
+        # Async calls: set and replaced whenever a chunk arrives or the stream ends
+        self.changed: Optional[asyncio.Event] = None
+
+    def append(self, chunk: Any) -> None:
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            if not self.finished:
+                self.finished = True
+                self.error = error
+            self.cond.notify_all()
+        self._wake()
+
+    def _wake(self) -> None:
+        if self.changed is not None:
+            changed, self.changed = self.changed, asyncio.Event()
+            changed.set()
+
+    def replay(self) -> Iterator[Any]:
+        """Yield every chunk, waiting for new ones until the stream ends (within the request deadline)."""
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.chunks) and not self.finished:
+                    left = remaining()
+                    if not self.cond.wait(None if left is None else max(0.0, left)) and left is not None:
+                        raise DeadlineExceeded("Request deadline passed while waiting for an identical call")
+                chunks = self.chunks[index:]
+                finished, error = self.finished, self.error
+            index += len(chunks)
+            yield from chunks
+            if finished and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+    async def replay_async(self) -> AsyncIterator[Any]:
+        """Async version of replay(), for calls on one event loop."""
+        index = 0
+        while True:
+            changed = self.changed
+            chunks = self.chunks[index:]
+            index += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if self.finished and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+            if index < len(self.chunks):
+                continue
+            left = remaining()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=None if left is None else max(0.0, left))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request deadline passed while waiting for an identical call") from None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls so they share one upstream request.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for and return the leader's result, or
+    re-raise its exception. Nothing is kept once the call finishes; this is
+    not a cache. stream() does the same for streamed responses: followers
+    replay the chunks received so far and then receive new ones as they arrive.
+
+    With SINGLEFLIGHT_SHARED=1 the leader also holds a per-key lock file and
+    publishes successful results for RESULT_TTL seconds, so identical calls in
+    other workers on the host wait for it instead of calling upstream
+    (streams are only shared within a worker).
+    """
+
+    def __init__(self, name: str, shared: Optional[bool] = None):
+        self.name = name
+        self.shared = SHARED if shared is None else shared
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+        self._async_streams: Dict[str, _StreamCall] = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'followers': 0, 'shared_hits': 0}
+        self._results = TieredCache(f'singleflight_{name}', ttl=RESULT_TTL, max_memory_entries=0) if self.shared else None
+        self._lock_dir = os.path.join(CACHE_DIR, 'singleflight', name)
+        self._shared_calls = 0
+
+    def do(self, key: str, fn: Callable[[], Any],
+           share_result: Callable[[Any], bool] = lambda result: result is not None) -> Any:
+        """Run fn(), or wait for an identical call with the same key that is already running."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._stats['followers'] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            # Followers wait no longer than their own request deadline allows
+            left = remaining()
+            if not call.done.wait(None if left is None else max(0.0, left)):
+                raise DeadlineExceeded("Request deadline passed while waiting for an identical call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.shared and fcntl is not None:
+                call.result = self._run_shared(key, fn, share_result)
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_shared(self, key: str, fn: Callable[[], Any], share_result: Callable[[Any], bool]) -> Any:
+        """Coordinate with other workers: one holds the key's lock file while it calls upstream."""
+        os.makedirs(self._lock_dir, exist_ok=True)
+        with self._lock:
+            self._shared_calls += 1
+            sweep = self._shared_calls % _SWEEP_INTERVAL == 0
+        if sweep:
+            self._sweep_lock_files()
+
+        deadline = time.monotonic() + cap(MAX_WAIT)
+        lock_path = os.path.join(self._lock_dir, f"{key}.lock")
+        with open(lock_path, 'a+') as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        # Leader elsewhere is stuck or our deadline is close; call upstream without the lock
+                        return fn()
+                    time.sleep(_POLL_INTERVAL)
+            try:
+                os.utime(lock_path)
+                # Another worker may have finished this call while we waited for the lock
+                published = self._results.get(key)
+                if published is not None:
+                    with self._lock:
+                        self._stats['shared_hits'] += 1
+                    return published['result']
+                result = fn()
+                if share_result(result):
+                    self._results.set(key, {'result': result})
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sweep_lock_files(self) -> None:
+        """
+        Delete lock files nobody has used recently. Deleting one that is still in
+        use can at worst let two workers call upstream once each for that key.
+        """
+        cutoff = time.time() - 2 * max(MAX_WAIT, RESULT_TTL)
+        try:
+            for entry in os.scandir(self._lock_dir):
+                if entry.name.endswith('.lock') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of do(), coalescing calls on the running event loop."""
+        task = self._async_calls.get(key)
+        if task is not None:
+            self._stats['followers'] += 1
+        else:
+            self._stats['leaders'] += 1
+            # The call runs as its own task, so a caller that disconnects does not cancel it for the others
+            task = self._async_calls[key] = asyncio.ensure_future(fn())
+
+            def finished(done: asyncio.Future) -> None:
+                if self._async_calls.get(key) is done:
+                    del self._async_calls[key]
+                if not done.cancelled():
+                    done.exception()  # Mark it retrieved even if every caller went away
+
+            task.add_done_callback(finished)
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=max(0.0, left))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline passed while waiting for an identical call") from None
+
+    def stream(self, key: str, open_stream: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Iterate open_stream(), or replay an identical stream with the same key that is already running.
+        If the leader's client goes away while others are replaying its stream, the leader
+        reads the rest of it for them before returning.
+        """
+        with self._lock:
+            call = self._streams.get(key)
+            if call is not None:
+                call.followers += 1
+                self._stats['followers'] += 1
+                leader = False
+            else:
+                call = self._streams[key] = _StreamCall()
+                self._stats['leaders'] += 1
+                leader = True
+        if not leader:
+            yield from call.replay()
+            return
+
+        upstream = None
+        completed = False
+        try:
+            upstream = iter(open_stream())
+            for chunk in upstream:
+                call.append(chunk)
+                yield chunk
+            completed = True
+        except Exception as e:
+            call.finish(e)
+            raise
+        finally:
+            with self._lock:
+                del self._streams[key]
+                followers = call.followers
+            if not completed and not call.finished:
+                if followers and upstream is not None:
+                    try:
+                        for chunk in upstream:
+                            call.append(chunk)
+                    except Exception as e:
+                        call.finish(e)
+                else:
+                    call.finish(RuntimeError("The shared stream ended early"))
+            call.finish()
+
+    async def stream_async(self, key: str, open_stream: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Async version of stream(). The upstream stream is read by its own task, so it
+        completes for the other callers even if the first one disconnects.
+        """
+        call = self._async_streams.get(key)
+        if call is not None:
+            self._stats['followers'] += 1
+        else:
+            self._stats['leaders'] += 1
+            call = self._async_streams[key] = _StreamCall()
+            call.changed = asyncio.Event()
+
+            async def produce() -> None:
+                try:
+                    async for chunk in open_stream():
+                        call.append(chunk)
+                    call.finish()
+                except BaseException as e:
+                    call.finish(e)
+                finally:
+                    if self._async_streams.get(key) is call:
+                        del self._async_streams[key]
+
+            asyncio.ensure_future(produce())
+        async for chunk in call.replay_async():
+            yield chunk
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls) + len(self._async_calls) + len(self._streams) + len(self._async_streams)
+        stats['shared'] = self.shared
+        return stats
@@ -0,0 +1,40 @@
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+from flask import Response, request, stream_with_context
+
+
+# Sent first so headers and the first byte leave immediately
+STREAM_OPEN = ": stream-open\n\n"
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx, Render)
+}
+
+
+def wants_event_stream(req=None) -> bool:
+    """True if the client asked for a Server-Sent Events response (req defaults to Flask's request)."""
+    if req is None:
+        req = request
+    return (req.args.get('stream') == '1'
+            or req.accept_mimetypes.best == 'text/event-stream')
+
+
+def format_event(data: Any, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event. Data is JSON encoded so newlines survive."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(events: Iterable[str]) -> Response:
+    """Wrap an iterator of formatted events in a streaming, unbuffered response."""
+    def generate() -> Iterator[str]:
+        yield STREAM_OPEN
+        yield from events
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers=STREAM_HEADERS,
+    )
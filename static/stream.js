@@ -0,0 +1,48 @@
+// Read a Server-Sent Events response from fetch() and dispatch each event.
+// handlers maps event names ("token", "done", "error", ...) to callbacks
+// that receive the JSON-decoded data.
+async function readEventStream(response, handlers) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data && handlers[event]) handlers[event](JSON.parse(data));
+        }
+    }
+}
+
+// Re-render accumulated markdown at most once per animation frame.
+function createMarkdownRenderer(element) {
+    let text = '';
+    let scheduled = false;
+    return {
+        append(chunk) {
+            text += chunk;
+            if (scheduled) return;
+            scheduled = true;
+            requestAnimationFrame(() => {
+                scheduled = false;
+                element.innerHTML = marked.parse(text);
+            });
+        },
+        text() {
+            return text;
+        }
+    };
+}
@@ -0,0 +1,182 @@
+"""
+Structured, non-blocking logging.
+
+Request threads only put records on a bounded in-memory queue; a background
+thread formats them as JSON lines and writes them to stdout, so log I/O never
+adds to request latency. When the queue is full, records are dropped (and
+counted) rather than blocking the request.
+
+Fields passed to event() whose names identify patient data (conditions,
+allergies, medications, free-text answers...) are redacted to their size
+before they are queued, and verbose payload events are sampled:
+
+    LOG_LEVEL=INFO                        level for every module not listed below
+    LOG_LEVELS=app=DEBUG,llm=WARNING      per-module levels (logger names are module names)
+    LOG_PAYLOAD_SAMPLE_RATE=0.01          share of payload events that are written
+    LOG_REDACT=0                          keep patient data in logs (local debugging only)
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# HTTP client libraries log every request (at DEBUG with URLs and request bodies that hold patient
+# data), so they stay at WARNING even with LOG_LEVEL=DEBUG; module=level pairs in LOG_LEVELS override these
+DEFAULT_MODULE_LEVELS = 'httpx=WARNING,httpcore=WARNING,urllib3=WARNING,geopy=WARNING,groq=WARNING,overpy=WARNING'
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+REDACT = os.getenv('LOG_REDACT', '1') == '1'
+# Records waiting for the writer thread (per worker); more are dropped
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Field names (at any depth) whose values are patient data
+PHI_FIELDS = frozenset({
+    'condition', 'symptoms', 'allergies', 'patient_allergies', 'medications', 'current_medications',
+    'recommended_medications', 'recommendations', 'drug1', 'drug2', 'address', 'location',
+    'name', 'age', 'email', 'phone', 'content', 'messages', 'prompt', 'response',
+})
+
+
+def redact(value: Any, key: Optional[str] = None) -> Any:
+    """Replace PHI fields in value (a dict, list or scalar under key) with a description of their size."""
+    if key is not None and key.lower() in PHI_FIELDS:
+        if isinstance(value, (str, bytes)):
+            return f"[redacted {len(value)} chars]"
+        if isinstance(value, (list, tuple, set, dict)):
+            return f"[redacted {len(value)} items]"
+        return "[redacted]"
+    if isinstance(value, dict):
+        return {k: redact(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, the event's fields and any traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks or prints on a full queue; it counts the dropped record instead."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here: args and traceback objects must not cross threads
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_configured_pid: Optional[int] = None
+_configure_lock = threading.Lock()
+
+
+def _module_levels() -> Dict[str, str]:
+    levels = {}
+    for spec in f"{DEFAULT_MODULE_LEVELS},{LOG_LEVELS}".split(','):
+        if '=' in spec:
+            name, level = spec.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure() -> None:
+    """Install the queue handler and start the writer thread (again in a forked worker)."""
+    global _handler, _listener, _configured_pid
+    pid = os.getpid()
+    if _configured_pid == pid:
+        return
+    with _configure_lock:
+        if _configured_pid == pid:
+            return
+        root = logging.getLogger()
+        if _handler is not None:
+            # Inherited from the parent: its writer thread does not exist in this process
+            root.removeHandler(_handler)
+
+        log_queue: queue.Queue = queue.Queue(QUEUE_SIZE)
+        writer = logging.StreamHandler(sys.stdout)
+        writer.setFormatter(JSONFormatter())
+        _handler = _DroppingQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, writer)
+        _listener.start()
+        atexit.register(shutdown)
+
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        for name, level in _module_levels().items():
+            logging.getLogger(name).setLevel(level)
+        _configured_pid = pid
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure()
+    return logging.getLogger(name)
+
+
+def event(logger: logging.Logger, message: str, level: int = logging.INFO, sample: bool = False,
+          **fields: Any) -> None:
+    """
+    Log a message with structured fields. PHI fields are redacted (unless LOG_REDACT=0);
+    with sample=True only LOG_PAYLOAD_SAMPLE_RATE of the events are kept, for verbose payloads.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sample and random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    if REDACT:
+        fields = redact(fields)
+    logger.log(level, message, extra={'fields': fields}, stacklevel=2)
+
+
+def stats() -> Dict[str, Any]:
+    """Queue depth and dropped records of this worker's log writer."""
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped}
+
+
+def shutdown() -> None:
+    """Write out the queued records and stop the writer thread (runs at exit)."""
+    if _listener is not None and _configured_pid == os.getpid() and _listener._thread is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass
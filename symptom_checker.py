@@ -1,147 +1,270 @@
+import logging
 import os
-import groq
-from typing import Optional
-from dotenv import load_dotenv
+from typing import AsyncIterator, Iterator, List, Dict, Optional
+from groq_client import get_groq_client
+from groq_health import get_available_known_models, get_health_status
+from llm import chat_completion, chat_completion_async
+from model_router import get_site_config, primary_model
+from resilience import CircuitOpenError
+from singleflight import SingleFlight, make_key
+from structured_logging import event, get_logger
+from symptom_similarity import DEGRADED_SIMILARITY_THRESHOLD, SymptomSimilarityCache, canonicalize
 
-def setup_groq_client() -> Optional[groq.Client]:
-    """Set up and return Groq client with API key."""
-    try:
-        # Load environment variables from .env file
-        load_dotenv()
-        
-        # Try to get API key from environment variables
-        api_key = os.getenv('GROQ_API_KEY')
-        
-        # Debug information
-        print("\n=== Debug Information ===")
-        print(f"Current working directory: {os.getcwd()}")
-        print(f".env file exists: {os.path.exists('.env')}")
-        print(f"GROQ_API_KEY exists: {api_key is not None}")
-        print("========================\n")
-        
-        if not api_key:
-            print("Error: GROQ_API_KEY not found in environment variables")
-            print("Please ensure you have a .env file in the project root with GROQ_API_KEY=your_api_key")
-            return None
-            
-        # Test the API key by creating a client
-        client = groq.Client(api_key=api_key)
-        
-        # Test the connection with a simple request
-        try:
-            test_response = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
-            print("Successfully connected to Groq API")
-            return client
-            
-        except Exception as e:
-            print(f"Error testing Groq API connection: {str(e)}")
-            print("Please check your API key and internet connection")
-            return None
-            
-    except Exception as e:
-        print(f"Unexpected error setting up Groq client: {str(e)}")
+# Bump when SYMPTOM_SYSTEM_PROMPT or canonical_tokens() changes so cached analyses are not reused
+SYMPTOM_PROMPT_VERSION = "2"
+
+log = get_logger(__name__)
+
+# Concurrent requests with the same symptoms share one Groq call
+symptom_flight = SingleFlight('symptoms')
+
+# Analyses reused for the same or near-identical symptom descriptions
+symptom_cache = SymptomSimilarityCache(
+    'symptom_analyses',
+    ttl=float(os.getenv('SYMPTOM_CACHE_TTL', str(24 * 3600))),
+)
+
+SYMPTOM_SYSTEM_PROMPT = ("You are a medical AI assistant that identifies potential conditions based on symptoms. "
+                         "Format your response with clear sections using markdown formatting. For any symptoms described, provide:\n"
+                         "## Possible Conditions\n"
+                         "1. **Condition Name**  \n"
+                         "   *Brief description*  \n"
+                         "   **When to seek help:** *Guidance*  \n"
+                         "   **Self-care:** *Advice*  \n\n"
+                         "2. **Condition Name**  \n"
+                         "   *Brief description*  \n"
+                         "   **When to seek help:** *Guidance*  \n"
+                         "   **Self-care:** *Advice*  \n\n"
+                         "## General Advice\n"
+                         "- *General self-care recommendations*\n"
+                         "- *When to see a doctor*\n\n"
+                         "## Important Note\n"
+                         "*This information is for educational purposes only and is not a substitute for professional medical advice. Always consult with a healthcare provider for proper diagnosis and treatment.*")
+
+def _build_symptom_messages(symptoms: str) -> List[Dict[str, str]]:
+    """Build the chat messages for a symptom analysis request."""
+    return [
+        {"role": "system", "content": SYMPTOM_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Please analyze these symptoms: {symptoms}"}
+    ]
+
+SITE = 'symptom_analysis'
+
+def _symptom_flight_key(model: str, symptoms: str) -> str:
+    """Flight key: model, sampling parameters and canonical symptoms."""
+    config = get_site_config(SITE)
+    return make_key(model, config['temperature'], config['max_tokens'], canonicalize(symptoms))
+
+def _cache_namespace(model: str) -> str:
+    return f"{model}:v{SYMPTOM_PROMPT_VERSION}"
+
+def _cached_analysis(model: str, symptoms: str) -> Optional[str]:
+    hit = symptom_cache.get(_cache_namespace(model), symptoms)
+    if hit is None:
         return None
+    event(log, "Symptom analysis served from cache", similarity=round(hit[1], 3))
+    return hit[0]
+
+def _store_analysis(model: str, symptoms: str, result: Optional[str], answered_by: Optional[str]) -> Optional[str]:
+    """
+    Cache an analysis under the primary model's key, unless another model answered it:
+    an answer from a fallback model is served once but not reused as the primary model's.
+    """
+    if _is_result(result) and answered_by == model:
+        symptom_cache.set(_cache_namespace(model), symptoms, result)
+    return result
+
+def _is_result(text: Optional[str]) -> bool:
+    return bool(text) and not text.startswith("Error:")
+
+DEGRADED_NOTE = ("> *The AI service is temporarily unavailable, so this is the analysis of a similar "
+                 "description of symptoms.*\n\n")
+
+def _degraded_analysis(symptoms: str) -> Optional[str]:
+    """While every model's circuit breaker is open, reuse the analysis of a broadly similar description."""
+    hit = symptom_cache.get(_cache_namespace(primary_model(SITE)), symptoms, threshold=DEGRADED_SIMILARITY_THRESHOLD)
+    if hit is None:
+        return None
+    event(log, "AI service unavailable; serving a similar cached analysis", logging.WARNING,
+          similarity=round(hit[1], 3))
+    return DEGRADED_NOTE + hit[0]
 
 def get_available_models():
-    """Get list of available models from Groq"""
+    """Get list of available models from the cached Groq health status"""
     try:
-        client = setup_groq_client()
-        if not client:
-            return []
-        # List of currently available models from Groq (as of August 2024)
-        test_models = [
-            "llama3-70b-8192",  # Most capable model
-            "llama3-8b-8192",   # Faster but less capable
-            "mixtral-8x7b-32768",  # Some users report this still works
-            "gemma-7b-it"       # Alternative model
-        ]
-        
-        available_models = []
-        for model in test_models:
-            try:
-                client.chat.completions.create(
-                    model=model,
-                    messages=[{"role": "user", "content": "test"}],
-                    max_tokens=1
-                )
-                available_models.append(model)
-            except:
-                continue
-                
-        return available_models
+        return get_available_known_models()
     except Exception as e:
-        print(f"Error checking available models: {e}")
+        event(log, "Checking available models failed", logging.ERROR, error=str(e))
         return []
 
 def get_disease_from_symptoms(symptoms: str) -> Optional[str]:
     """
     Queries Groq API to analyze symptoms and return the most likely disease with a description.
-    Uses the latest stable model from Groq.
+    The model comes from the 'symptom_analysis' route in model_router.
     """
     try:
-        client = setup_groq_client()
+        client = get_groq_client()
         if not client:
-            print("Error: Failed to initialize Groq client")
+            event(log, "Groq client unavailable", logging.ERROR)
+            return "Error: Failed to initialize the AI service. Please check your API key and try again."
+
+        # Fail fast on a known bad API key; the background monitor keeps this state fresh
+        health = get_health_status()
+        if health['auth_failed']:
+            event(log, "Groq health check failed", logging.ERROR, error=health['error'])
             return "Error: Failed to initialize the AI service. Please check your API key and try again."
 
         if not symptoms or not symptoms.strip():
-            print("Error: No symptoms provided")
             return "Error: Please describe your symptoms in the input field."
 
-        print(f"Sending request to Groq API with symptoms: {symptoms[:100]}...")  # Log first 100 chars
+        # Full text for debugging prompts; the symptoms are redacted unless LOG_REDACT=0
+        event(log, "Symptom analysis request", logging.DEBUG, sample=True, symptoms=symptoms)
         
-        # Use the latest stable model from Groq
-        model_to_use = "llama3-70b-8192"  # Most capable model as of August 2024
-        print(f"Using model: {model_to_use}")
+        model_to_use = primary_model(SITE)
+
+        cached = _cached_analysis(model_to_use, symptoms)
+        if cached is not None:
+            return cached
         
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system", 
-                    "content": ("You are a medical AI assistant that identifies potential conditions based on symptoms. "
-                              "Format your response with clear sections using markdown formatting. For any symptoms described, provide:\n"
-                              "## Possible Conditions\n"
-                              "1. **Condition Name**  \n"
-                              "   *Brief description*  \n"
-                              "   **When to seek help:** *Guidance*  \n"
-                              "   **Self-care:** *Advice*  \n\n"
-                              "2. **Condition Name**  \n"
-                              "   *Brief description*  \n"
-                              "   **When to seek help:** *Guidance*  \n"
-                              "   **Self-care:** *Advice*  \n\n"
-                              "## General Advice\n"
-                              "- *General self-care recommendations*\n"
-                              "- *When to see a doctor*\n\n"
-                              "## Important Note\n"
-                              "*This information is for educational purposes only and is not a substitute for professional medical advice. Always consult with a healthcare provider for proper diagnosis and treatment.*")
-                },
-                {
-                    "role": "user", 
-                    "content": f"Please analyze these symptoms: {symptoms}"
-                }
-            ],
-            model=model_to_use,
-            temperature=0.5,  # Balanced temperature for reliable responses
-            max_tokens=1000,  # Increased token limit for detailed responses
+        return symptom_flight.do(
+            _symptom_flight_key(model_to_use, symptoms),
+            lambda: _complete_symptoms(model_to_use, symptoms),
+            share_result=_is_result,
         )
-        
-        if not response or not response.choices or not response.choices[0].message.content:
-            print("Error: Empty or invalid response from API")
-            return "Error: Received an invalid response from the AI service. Please try again."
-            
-        result = response.choices[0].message.content
-        print(f"Received response from Groq API: {result[:200]}...")  # Log first 200 chars
-        return result
 
+    except CircuitOpenError as e:
+        event(log, "Symptom analysis unavailable", logging.WARNING, error=str(e))
+        return _degraded_analysis(symptoms) or f"Error: {str(e)}"
+    except Exception as e:
+        error_msg = f"Error during symptom analysis: {str(e)}"
+        event(log, "Symptom analysis failed", logging.ERROR, error=str(e))
+        return f"Error: {error_msg} Please check your API key and try again."
+
+def _response_text(response) -> str:
+    if not response or not response.choices or not response.choices[0].message.content:
+        event(log, "Empty or invalid response from Groq", logging.ERROR)
+        return "Error: Received an invalid response from the AI service. Please try again."
+    return response.choices[0].message.content
+
+def _complete_symptoms(model: str, symptoms: str) -> str:
+    """Make the Groq call for a symptom analysis and cache it; returns the text or an 'Error: ...' message."""
+    response = chat_completion(SITE, _build_symptom_messages(symptoms))
+    result = _response_text(response)
+    event(log, "Symptom analysis received", response_chars=len(result), model=getattr(response, 'model', None))
+    event(log, "Symptom analysis payload", logging.DEBUG, sample=True, response=result)
+    return _store_analysis(model, symptoms, result, getattr(response, 'model', None))
+
+def stream_disease_from_symptoms(symptoms: str) -> Iterator[str]:
+    """
+    Stream a symptom analysis from the Groq API, yielding text chunks as they arrive.
+    Raises ValueError for bad input and RuntimeError if the AI service is unavailable.
+    """
+    if not symptoms or not symptoms.strip():
+        raise ValueError("Please describe your symptoms in the input field.")
+
+    model = primary_model(SITE)
+    cached = _cached_analysis(model, symptoms)
+    if cached is not None:
+        yield cached
+        return
+
+    if get_health_status()['auth_failed']:
+        raise RuntimeError("Failed to initialize the AI service. Please check your API key and try again.")
+
+    # Identical requests already streaming replay that stream instead of calling Groq again
+    sent = False
+    try:
+        for piece in symptom_flight.stream(_symptom_flight_key(model, symptoms),
+                                           lambda: _stream_symptoms(model, symptoms)):
+            sent = True
+            yield piece
+    except CircuitOpenError:
+        degraded = None if sent else _degraded_analysis(symptoms)
+        if degraded is None:
+            raise
+        yield degraded
+
+def _stream_symptoms(model: str, symptoms: str) -> Iterator[str]:
+    """Stream one symptom analysis from Groq and cache it once complete."""
+    stream = chat_completion(SITE, _build_symptom_messages(symptoms), stream=True)
+    parts = []
+    answered_by = None
+    for chunk in stream:
+        answered_by = answered_by or getattr(chunk, 'model', None)
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    _store_analysis(model, symptoms, ''.join(parts), answered_by)
+
+async def get_disease_from_symptoms_async(symptoms: str) -> Optional[str]:
+    """Async version of get_disease_from_symptoms() using the AsyncGroq client."""
+    try:
+        if get_health_status()['auth_failed']:
+            return "Error: Failed to initialize the AI service. Please check your API key and try again."
+
+        if not symptoms or not symptoms.strip():
+            return "Error: Please describe your symptoms in the input field."
+
+        model_to_use = primary_model(SITE)
+        cached = _cached_analysis(model_to_use, symptoms)
+        if cached is not None:
+            return cached
+
+        return await symptom_flight.do_async(
+            _symptom_flight_key(model_to_use, symptoms),
+            lambda: _complete_symptoms_async(model_to_use, symptoms),
+        )
+
+    except CircuitOpenError as e:
+        event(log, "Symptom analysis unavailable", logging.WARNING, error=str(e))
+        return _degraded_analysis(symptoms) or f"Error: {str(e)}"
     except Exception as e:
         error_msg = f"Error during symptom analysis: {str(e)}"
-        print(error_msg)
+        event(log, "Symptom analysis failed", logging.ERROR, error=str(e))
         return f"Error: {error_msg} Please check your API key and try again."
 
+async def _complete_symptoms_async(model: str, symptoms: str) -> str:
+    response = await chat_completion_async(SITE, _build_symptom_messages(symptoms))
+    return _store_analysis(model, symptoms, _response_text(response), getattr(response, 'model', None))
+
+async def stream_disease_from_symptoms_async(symptoms: str) -> AsyncIterator[str]:
+    """Async version of stream_disease_from_symptoms()."""
+    if not symptoms or not symptoms.strip():
+        raise ValueError("Please describe your symptoms in the input field.")
+
+    model = primary_model(SITE)
+    cached = _cached_analysis(model, symptoms)
+    if cached is not None:
+        yield cached
+        return
+
+    if get_health_status()['auth_failed']:
+        raise RuntimeError("Failed to initialize the AI service. Please check your API key and try again.")
+
+    sent = False
+    try:
+        async for piece in symptom_flight.stream_async(_symptom_flight_key(model, symptoms),
+                                                       lambda: _stream_symptoms_async(model, symptoms)):
+            sent = True
+            yield piece
+    except CircuitOpenError:
+        degraded = None if sent else _degraded_analysis(symptoms)
+        if degraded is None:
+            raise
+        yield degraded
+
+async def _stream_symptoms_async(model: str, symptoms: str) -> AsyncIterator[str]:
+    """Async version of _stream_symptoms()."""
+    stream = await chat_completion_async(SITE, _build_symptom_messages(symptoms), stream=True)
+    parts = []
+    answered_by = None
+    async for chunk in stream:
+        answered_by = answered_by or getattr(chunk, 'model', None)
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    _store_analysis(model, symptoms, ''.join(parts), answered_by)
+
 def main():
     print("Welcome to the Symptom Analyzer!")
     print("Please enter your symptoms (e.g., fever, cough, fatigue):")
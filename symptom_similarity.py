@@ -0,0 +1,254 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from metrics import record_cache_lookup
+from ttl_cache import TieredCache
+
+# Minimum Jaccard similarity of canonical symptom sets for a cached answer to be reused
+SIMILARITY_THRESHOLD = float(os.getenv('SYMPTOM_SIMILARITY_THRESHOLD', '0.8'))
+# Looser threshold used only when the AI service is unavailable and nothing closer is cached
+DEGRADED_SIMILARITY_THRESHOLD = float(os.getenv('SYMPTOM_DEGRADED_SIMILARITY_THRESHOLD', '0.5'))
+# Entries in each worker's near-duplicate index
+MAX_INDEX_ENTRIES = int(os.getenv('SYMPTOM_SIMILARITY_INDEX_SIZE', '20000'))
+
+# MinHash signature of NUM_PERM values split into BANDS bands of ROWS values each;
+# sets with Jaccard similarity above ~(1/BANDS)^(1/ROWS) are likely to share a band
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'but', 'with', 'of', 'in', 'on', 'at', 'to', 'for', 'from', 'since',
+    'i', 'im', 'me', 'my', 'am', 'is', 'are', 'was', 'been', 'be', 'have', 'has', 'had', 'having',
+    'feel', 'feels', 'feeling', 'felt', 'get', 'getting', 'got', 'some', 'bit', 'little', 'very',
+    'really', 'also', 'too', 'lot', 'kind', 'sort', 'like', 'just', 'it', 'its', 'this', 'that',
+    'there', 'please', 'help', 'symptom', 'symptoms', 'experiencing', 'suffering',
+}
+
+# Words that negate the symptoms after them, up to the end of the clause
+# ("no fever or chills, but a cough" negates fever and chills, not cough)
+NEGATIONS = {'no', 'not', 'without', 'never', 'dont', 'didnt', 'doesnt', 'isnt'}
+CLAUSE_BREAKS = {'but', 'however', 'although', 'though', 'except', 'yet'}
+
+# Severity, onset and patient context words that change the answer: a cached analysis is only
+# reused when both descriptions have the same ones ("severe headache" never matches "headache")
+MODIFIERS = {
+    'severe', 'mild', 'sudden', 'worst', 'acute', 'chronic', 'persistent', 'recurrent',
+    'pregnant', 'child', 'infant', 'elderly', 'blood', 'unconscious', 'faint',
+}
+
+# Common lay terms mapped to one canonical symptom word
+SYNONYMS = {
+    'tired': 'fatigue', 'tiredness': 'fatigue', 'exhausted': 'fatigue', 'exhaustion': 'fatigue',
+    'fatigued': 'fatigue', 'weary': 'fatigue', 'lethargic': 'fatigue',
+    'temperature': 'fever', 'feverish': 'fever', 'febrile': 'fever',
+    'vomiting': 'vomit', 'puking': 'vomit', 'throwing': 'vomit',
+    'nauseous': 'nausea', 'queasy': 'nausea',
+    'dizzy': 'dizziness', 'lightheaded': 'dizziness',
+    'breathless': 'breathlessness', 'sob': 'breathlessness',
+    'tummy': 'stomach', 'belly': 'stomach', 'abdominal': 'stomach', 'abdomen': 'stomach',
+    'sore': 'pain', 'ache': 'pain', 'aches': 'pain', 'aching': 'pain', 'hurts': 'pain', 'hurting': 'pain',
+    'intense': 'severe', 'excruciating': 'severe', 'unbearable': 'severe', 'extreme': 'severe',
+    'suddenly': 'sudden', 'abrupt': 'sudden', 'pregnancy': 'pregnant',
+    'kid': 'child', 'kids': 'child', 'children': 'child', 'toddler': 'child',
+    'baby': 'infant', 'babies': 'infant', 'newborn': 'infant',
+    'bloody': 'blood', 'bleeding': 'blood',
+}
+
+_SUFFIXES = ('ness', 'ing', 'ed', 's')
+
+
+def _stem(word: str) -> str:
+    """Strip one common suffix, keeping at least three letters."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            return word[:-len(suffix)]
+    return word
+
+
+def canonical_tokens(text: str) -> FrozenSet[str]:
+    """Tokenize symptom text, map synonyms, stem, drop stopwords and mark negated symptoms."""
+    tokens = set()
+    negate = False
+    for word in re.findall(r"[a-z0-9]+|[,.;:!?]", text.lower().replace("'", "")):
+        if word in NEGATIONS:
+            negate = True
+            continue
+        if not word[0].isalnum() or word in CLAUSE_BREAKS:
+            negate = False
+            continue
+        if word in STOPWORDS:
+            continue
+        token = _stem(SYNONYMS.get(word, word))
+        tokens.add(f"not_{token}" if negate else token)
+    return frozenset(tokens)
+
+
+def modifiers(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    """The severity and context tokens of a canonical set (negated ones included)."""
+    return frozenset(t for t in tokens if (t[4:] if t.startswith('not_') else t) in MODIFIERS)
+
+
+def canonicalize(text: str) -> str:
+    """Order-independent canonical form of symptom text, e.g. 'cough fatigue fever'."""
+    return ' '.join(sorted(canonical_tokens(text)))
+
+
+def _token_hash(token: str, seed: int) -> int:
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8, salt=seed.to_bytes(8, 'little')).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def minhash(tokens: FrozenSet[str]) -> Tuple[int, ...]:
+    """MinHash signature of a token set."""
+    return tuple(min(_token_hash(token, seed) for token in tokens) for seed in range(NUM_PERM))
+
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class SymptomSimilarityCache:
+    """
+    Cache of symptom analyses that also answers near-duplicate descriptions.
+
+    Answers are stored in a TieredCache keyed by model and canonical symptom
+    set, so exact canonical matches are shared by every worker. Each worker
+    also keeps a MinHash/LSH index of the canonical sets it has seen; an LSH
+    candidate is reused when its exact Jaccard similarity is at least the
+    threshold and it has exactly the same severity and context modifiers.
+    Best-match similarities are recorded for tuning the threshold.
+    """
+
+    def __init__(self, name: str, ttl: float, threshold: float = SIMILARITY_THRESHOLD,
+                 max_index_entries: int = MAX_INDEX_ENTRIES):
+        self.name = name
+        self.threshold = threshold
+        self.max_index_entries = max_index_entries
+        self._answers = TieredCache(name, ttl=ttl)
+        # canonical key -> (tokens, signature), in least recently stored order
+        self._entries: "OrderedDict[str, Tuple[FrozenSet[str], Tuple[int, ...]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], set] = {}
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0, 'degraded_hits': 0}
+        # Best similarity found for each lookup, in tenths: bucket 8 holds 0.8 <= s < 0.9
+        self._similarity_histogram = [0] * 11
+        self._similar_hit_total = 0.0
+
+    @staticmethod
+    def _key(namespace: str, tokens: FrozenSet[str]) -> str:
+        return f"{namespace}:{' '.join(sorted(tokens))}"
+
+    def _index(self, key: str, tokens: FrozenSet[str]) -> None:
+        """Add a canonical set to the LSH index. Caller must hold the lock."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        signature = minhash(tokens)
+        self._entries[key] = (tokens, signature)
+        for band in _bands(signature):
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_index_entries:
+            old_key, (_, old_signature) = self._entries.popitem(last=False)
+            for band in _bands(old_signature):
+                bucket = self._buckets.get(band)
+                if bucket is not None:
+                    bucket.discard(old_key)
+                    if not bucket:
+                        del self._buckets[band]
+
+    def _record(self, similarity: float) -> None:
+        self._similarity_histogram[min(int(similarity * 10), 10)] += 1
+
+    def _count(self, stat: str, result: str) -> None:
+        # The answer store's own lookups are counted under self.name; this is the outcome of get()
+        self._stats[stat] += 1
+        record_cache_lookup(f"{self.name}_similarity", result)
+
+    def get(self, namespace: str, text: str, threshold: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Return (cached answer, similarity) for text, or None if nothing is close enough.
+        A threshold other than the cache's own marks a degraded lookup (e.g. while the
+        AI service is down); those are counted separately and left out of the histogram.
+        """
+        degraded = threshold is not None
+        threshold = self.threshold if threshold is None else threshold
+        tokens = canonical_tokens(text)
+        if not tokens:
+            return None
+
+        key = self._key(namespace, tokens)
+        answer = self._answers.get(key)
+        if answer is not None:
+            with self._lock:
+                if degraded:
+                    self._count('degraded_hits', 'degraded_hit')
+                else:
+                    self._count('exact_hits', 'exact_hit')
+                    self._record(1.0)
+                self._index(key, tokens)
+            return answer, 1.0
+
+        signature = minhash(tokens)
+        prefix = f"{namespace}:"
+        with self._lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates.update(k for k in self._buckets.get(band, ()) if k.startswith(prefix))
+            required = modifiers(tokens)
+            # A different severity, onset or patient group is a different question, however similar
+            scored = sorted(((jaccard(tokens, self._entries[k][0]), k) for k in candidates
+                             if modifiers(self._entries[k][0]) == required), reverse=True)
+
+        for similarity, candidate in scored:
+            if similarity < threshold:
+                break
+            answer = self._answers.get(candidate)
+            if answer is not None:
+                with self._lock:
+                    if degraded:
+                        self._count('degraded_hits', 'degraded_hit')
+                    else:
+                        self._count('similar_hits', 'similar_hit')
+                        self._similar_hit_total += similarity
+                        self._record(similarity)
+                return answer, similarity
+
+        if degraded:
+            return None
+        with self._lock:
+            self._count('misses', 'miss')
+            self._record(scored[0][0] if scored else 0.0)
+        return None
+
+    def set(self, namespace: str, text: str, answer: Any) -> None:
+        tokens = canonical_tokens(text)
+        if not tokens:
+            return
+        key = self._key(namespace, tokens)
+        self._answers.set(key, answer)
+        with self._lock:
+            self._stats['stores'] += 1
+            self._index(key, tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['exact_hits'] + stats['similar_hits'] + stats['misses']
+            stats['hit_rate'] = round((stats['exact_hits'] + stats['similar_hits']) / lookups, 3) if lookups else None
+            stats['mean_similar_hit_similarity'] = (round(self._similar_hit_total / stats['similar_hits'], 3)
+                                                    if stats['similar_hits'] else None)
+            stats['best_similarity_histogram'] = {f"{i / 10:.1f}": count
+                                                  for i, count in enumerate(self._similarity_histogram) if count}
+            stats['threshold'] = self.threshold
+            stats['indexed'] = len(self._entries)
+        stats['answers'] = self._answers.stats()
+        return stats
@@ -0,0 +1,41 @@
+import json
+
+from drug_db import build_database
+from drug_names import DrugNameIndex
+from DrugInteraction import DrugInteractionChecker
+
+RECORDS = [
+    {'drug1': 'Co-Trimoxazole', 'drug2': 'methotrexate', 'severity': 'High',
+     'effect': 'Bone marrow suppression', 'recommendation': 'Avoid combination'},
+    {'drug1': 'warfarin', 'drug2': 'aspirin', 'severity': 'High',
+     'effect': 'Increased risk of bleeding', 'recommendation': 'Avoid combination'},
+]
+
+
+def make_checker(tmp_path):
+    source = tmp_path / 'interactions.json'
+    source.write_text(json.dumps(RECORDS))
+    db_path = str(tmp_path / 'interactions.sqlite3')
+    build_database(str(source), db_path)
+    return DrugInteractionChecker(db_path)
+
+
+def test_hyphenated_generic_is_found(tmp_path):
+    checker = make_checker(tmp_path)
+    assert checker.check_interaction('co-trimoxazole', 'methotrexate')['severity'] == 'High'
+    assert checker.check_interaction('Co-Trimoxazole 960 mg', 'Methotrexate')['severity'] == 'High'
+    assert checker.check_interaction('co trimoxazole', 'methotrexate')['severity'] == 'High'
+    assert [i['severity'] for i in checker.check_interactions_among(['co-trimoxazole', 'methotrexate'])] == ['High']
+
+
+def test_brand_name_resolves_to_store_key(tmp_path):
+    checker = make_checker(tmp_path)
+    assert checker.check_interaction('Coumadin', 'aspirin')['severity'] == 'High'
+
+
+def test_misspelling_is_suggested_not_substituted():
+    index = DrugNameIndex(['quinine', 'digoxin', 'co-trimoxazole'])
+    assert index.normalize('quinidine') == 'quinidine'
+    assert index.did_you_mean('quinidine') == 'quinine'
+    assert index.did_you_mean('co-trimoxazol') == 'co-trimoxazole'
+    assert index.did_you_mean('digoxin') is None
@@ -0,0 +1,48 @@
+import httpx
+import pytest
+
+import hospital_locator
+from ttl_cache import TieredCache
+
+USER_LOCATION = (51.5074, -0.1278)
+RADIUS = 5000
+
+
+@pytest.fixture
+def tile_cache(tmp_path, monkeypatch):
+    cache = TieredCache('facility_tiles', ttl=3600, db_path=str(tmp_path / 'tiles.sqlite3'))
+    monkeypatch.setattr(hospital_locator, 'facility_tile_cache', cache)
+    monkeypatch.setattr(hospital_locator, 'get_facility_index', lambda: None)
+    return cache
+
+
+def cache_user_tile(cache):
+    """Cache the tile under the user with one hospital; the surrounding tiles stay missing."""
+    tile = hospital_locator.geohash.encode(*USER_LOCATION, hospital_locator.TILE_PRECISION)
+    record = {'lat': USER_LOCATION[0], 'lon': USER_LOCATION[1], 'tags': {'amenity': 'hospital', 'name': 'St Thomas'}}
+    for amenity in hospital_locator.FACILITY_TYPES:
+        records = [record] if amenity == 'hospital' else []
+        cache.set(hospital_locator._tile_key(tile, amenity), {'fetched_at': 0.0, 'records': records})
+
+
+def rate_limited(*args, **kwargs):
+    return httpx.Response(429, request=httpx.Request('POST', hospital_locator.OVERPASS_URL))
+
+
+def test_rate_limited_fetch_returns_cached_tiles(tile_cache, monkeypatch):
+    cache_user_tile(tile_cache)
+    monkeypatch.setattr(hospital_locator.httpx, 'post', rate_limited)
+    monkeypatch.setattr(hospital_locator, '_schedule_refresh', lambda tiles: None)
+
+    facilities, counts, partial = hospital_locator.find_facilities(USER_LOCATION, RADIUS)
+
+    assert partial
+    assert [facility['name'] for facility in facilities] == ['St Thomas']
+    assert counts['hospital'] == 1
+
+
+def test_rate_limited_fetch_without_cached_tiles_raises(tile_cache, monkeypatch):
+    monkeypatch.setattr(hospital_locator.httpx, 'post', rate_limited)
+
+    with pytest.raises(hospital_locator.overpy.exception.OverpassTooManyRequests):
+        hospital_locator.find_facilities(USER_LOCATION, RADIUS)
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+def slow_stream(calls, pieces=('a', 'b', 'c'), delay=0.05):
+    calls.append(1)
+    for piece in pieces:
+        time.sleep(delay)
+        yield piece
+
+
+def test_identical_streams_share_one_upstream_call():
+    flight = SingleFlight('test_stream')
+    calls, results = [], []
+
+    def consume():
+        results.append(''.join(flight.stream('key', lambda: slow_stream(calls))))
+
+    threads = [threading.Thread(target=consume) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['abc'] * 5
+
+
+def test_leader_finishes_the_stream_for_followers_when_its_client_leaves():
+    flight = SingleFlight('test_stream_leave')
+    calls, follower = [], []
+    leader = flight.stream('key', lambda: slow_stream(calls))
+    assert next(leader) == 'a'
+    thread = threading.Thread(target=lambda: follower.append(''.join(flight.stream('key', lambda: slow_stream(calls)))))
+    thread.start()
+    time.sleep(0.01)
+    leader.close()
+    thread.join()
+    assert len(calls) == 1
+    assert follower == ['abc']
+
+
+def test_async_streams_share_one_upstream_call():
+    flight = SingleFlight('test_stream_async')
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        for piece in ('a', 'b', 'c'):
+            await asyncio.sleep(0.02)
+            yield piece
+
+    async def consume():
+        return ''.join([piece async for piece in flight.stream_async('key', upstream)])
+
+    async def main():
+        return await asyncio.gather(*(consume() for _ in range(5)))
+
+    assert asyncio.run(main()) == ['abc'] * 5
+    assert len(calls) == 1
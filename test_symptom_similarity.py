@@ -0,0 +1,41 @@
+import ttl_cache
+from symptom_similarity import SymptomSimilarityCache, canonical_tokens
+
+
+def make_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ttl_cache, 'CACHE_DIR', str(tmp_path))
+    return SymptomSimilarityCache('symptoms_test', ttl=60)
+
+
+def test_negation_lasts_until_the_clause_ends():
+    assert canonical_tokens("no shortness of breath") == {'not_shortness', 'not_breath'}
+    assert canonical_tokens("no fever or chills, but a cough") == {'not_fever', 'not_chill', 'cough'}
+
+
+def test_negated_description_does_not_match_positive_one(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    cache.set('m', "chest pain and shortness of breath", "cardiac")
+    assert cache.get('m', "chest pain, no shortness of breath") is None
+
+
+def test_severity_is_required_to_match(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    cache.set('m', "headache, stiff neck, fever", "answer")
+    assert cache.get('m', "severe headache, stiff neck, fever") is None
+    assert cache.get('m', "sudden headache, stiff neck, fever") is None
+    # Also for the looser threshold used while the AI service is down
+    assert cache.get('m', "severe headache, stiff neck, fever", threshold=0.5) is None
+
+
+def test_patient_context_is_required_to_match(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    cache.set('m', "fever, cough, runny nose, sore throat", "adult")
+    assert cache.get('m', "my child has fever, cough, runny nose, sore throat") is None
+    assert cache.get('m', "pregnant with fever, cough, runny nose, sore throat") is None
+
+
+def test_reworded_description_still_matches(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    cache.set('m', "severe headache, stiff neck, fever, nausea, vomiting", "answer")
+    hit = cache.get('m', "intense headache with a stiff neck, fever, nausea and vomiting since yesterday")
+    assert hit is not None and hit[0] == "answer"
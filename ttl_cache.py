@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from metrics import record_cache_lookup
+
+# Directory holding the on-disk cache files shared by all gunicorn workers
+CACHE_DIR = os.getenv('CHIRON_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+
+# Run disk eviction once every this many writes instead of on every write
+_EVICTION_INTERVAL = 64
+
+
+class TieredCache:
+    """
+    Two-tier cache with a time-to-live on every entry.
+
+    The first tier is an in-process LRU dict; the second is a SQLite file that
+    all worker processes on the host share. Values must be JSON serializable.
+    """
+
+    def __init__(self, name: str, ttl: float, max_memory_entries: int = 512,
+                 max_disk_entries: int = 50000, db_path: Optional[str] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Return this thread's SQLite connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)')
+        except sqlite3.Error as e:
+            print(f"Cache '{self.name}': disk tier unavailable: {str(e)}")
+            return None
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key: str, value: Any, expires_at: float) -> None:
+        """Store an entry in the in-process LRU tier. Caller must hold the lock."""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    record_cache_lookup(self.name, 'memory_hit')
+                    return entry[1]
+                del self._memory[key]
+
+        conn = self._connection()
+        row = None
+        if conn is not None:
+            try:
+                row = conn.execute(
+                    'SELECT value, expires_at FROM entries WHERE key = ? AND expires_at > ?', (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Cache '{self.name}': read error: {str(e)}")
+
+        with self._lock:
+            if row is None:
+                self._stats['misses'] += 1
+                record_cache_lookup(self.name, 'miss')
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self._stats['disk_hits'] += 1
+        record_cache_lookup(self.name, 'disk_hit')
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value in both tiers; ttl overrides the cache default for this entry."""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._stats['sets'] += 1
+            self._writes += 1
+            evict = self._writes % _EVICTION_INTERVAL == 0
+
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires_at)
+            )
+            if evict:
+                self._evict_disk(conn)
+        except sqlite3.Error as e:
+            print(f"Cache '{self.name}': write error: {str(e)}")
+
+    def _evict_disk(self, conn: sqlite3.Connection) -> None:
+        """Drop expired rows, then the soonest-expiring rows above the size limit."""
+        conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+        excess = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM entries WHERE key IN '
+                '(SELECT key FROM entries ORDER BY expires_at LIMIT ?)', (excess,)
+            )
+            with self._lock:
+                self._stats['evictions'] += excess
+
+    def delete(self, key: str) -> None:
+        """Remove key from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+        conn = self._connection()
+        if conn is not None:
+            try:
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            except sqlite3.Error as e:
+                print(f"Cache '{self.name}': delete error: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this worker process."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else None
+        return stats